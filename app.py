@@ -3,15 +3,22 @@ import pandas as pd
 import json
 import uuid
 from datetime import datetime, time
-from io import BytesIO
-import plotly.express as px
 import plotly.graph_objects as go
-import gspread
-from google.oauth2.service_account import Credentials
+from concurrent.futures import ThreadPoolExecutor
+
+from tradingjournal import analytics, charts, drive, ids, reports, risk, sheets, snapshot
+from tradingjournal.cache import StaleWhileRevalidate, CacheGraph
+from tradingjournal.checklist import get_default_checklist, decode_checklist
+from tradingjournal.drive import get_drive_file_id
+from tradingjournal.parsing import enable_copy_on_write, get_data_version, parse_images, parse_tags
+from tradingjournal.sheets import ConflictError
 
 # --- PAGE CONFIG ---
 st.set_page_config(page_title="Pro Trading Journal", layout="wide", page_icon="📈")
 
+# Alle Sessions teilen sich einen Trades-DataFrame und bekommen nur flache Kopien
+enable_copy_on_write()
+
 # --- PASSWORTSCHUTZ ---
 def check_password():
     """Prüft ob das Passwort korrekt ist"""
@@ -75,159 +82,56 @@ if not check_password():
     st.stop()
 
 # --- GOOGLE SHEETS SETUP ---
-SCOPES = [
-    'https://www.googleapis.com/auth/spreadsheets',
-    'https://www.googleapis.com/auth/drive'
-]
+# Die Datenschicht liegt im Paket tradingjournal (ohne Streamlit), hier nur Caching und Secrets.
 
-@st.cache_resource
-def get_google_client():
-    """Erstellt Google Sheets Client aus Streamlit Secrets oder lokaler Datei"""
+def get_credentials():
+    """Erstellt Credentials aus Streamlit Secrets oder lokaler Datei"""
     try:
         # Versuche zuerst Streamlit Secrets (für Cloud Deployment)
-        creds_dict = st.secrets["gcp_service_account"]
-        creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
+        return sheets.get_credentials(st.secrets["gcp_service_account"])
     except:
         # Fallback: Lokale JSON Datei
-        creds = Credentials.from_service_account_file("credentials.json", scopes=SCOPES)
-    
-    return gspread.authorize(creds)
+        return sheets.get_credentials()
 
-# --- BILD-FUNKTIONEN (Google Drive) ---
-SCREENSHOTS_FOLDER_ID = "1QF7rcbS8cce_f3CwX48lveSP3ZRU7Is_"
+@st.cache_resource
+def get_google_client():
+    """Erstellt Google Sheets Client aus Streamlit Secrets oder lokaler Datei"""
+    return sheets.get_google_client(get_credentials())
+
+@st.cache_resource
+def get_or_create_spreadsheet():
+    """Holt oder erstellt das Trading Journal Spreadsheet"""
+    return sheets.get_or_create_spreadsheet(get_google_client())
 
+@st.cache_resource
+def ensure_trades_headers():
+    """Ergänzt fehlende Spalten im Header des Trades Sheets (einmal pro Prozess)"""
+    return sheets.ensure_trades_headers(get_or_create_spreadsheet())
+
+# --- BILD-FUNKTIONEN (Google Drive) ---
 def get_drive_service():
     """Erstellt Google Drive Service für Datei-Uploads"""
-    from googleapiclient.discovery import build
-    try:
-        creds_dict = st.secrets["gcp_service_account"]
-        creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-    except:
-        creds = Credentials.from_service_account_file("credentials.json", scopes=SCOPES)
-    
-    return build('drive', 'v3', credentials=creds)
+    return drive.build_drive_service(get_credentials())
+
+@st.cache_resource
+def get_upload_index():
+    """Gemeinsamer Index Inhalts-Hash -> Drive-Datei (Duplikate werden nicht erneut hochgeladen)"""
+    return drive.UploadIndex(drive.UPLOAD_INDEX_FILE)
 
 def upload_image_to_drive(uploaded_file, trade_id, image_number):
     """Lädt ein Bild zu Google Drive hoch und gibt die URL zurück"""
-    from googleapiclient.http import MediaIoBaseUpload
-    
-    try:
-        drive_service = get_drive_service()
-        
-        # Dateiname: TradeID_Bildnummer.extension
-        file_extension = uploaded_file.name.split('.')[-1].lower()
-        filename = f"{trade_id}_{image_number:02d}.{file_extension}"
-        
-        # Metadata für die Datei
-        file_metadata = {
-            'name': filename,
-            'parents': [SCREENSHOTS_FOLDER_ID]
-        }
-        
-        # Datei hochladen
-        uploaded_file.seek(0)
-        media = MediaIoBaseUpload(
-            uploaded_file,
-            mimetype=uploaded_file.type or 'image/png',
-            resumable=True
-        )
-        
-        file = drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id',
-            supportsAllDrives=True
-        ).execute()
-        
-        file_id = file['id']
-        
-        # Direkte Bild-URL für öffentliche Ordner
-        image_url = f"https://drive.google.com/uc?export=view&id={file_id}"
-        
-        return {
-            'id': file_id,
-            'name': filename,
-            'url': image_url
-        }
-    except Exception as e:
-        raise Exception(f"Upload fehlgeschlagen: {str(e)}")
-
-def get_images_for_trade(trade_id, df):
-    """Holt alle Bild-URLs für einen Trade aus dem DataFrame"""
-    if df.empty:
-        return []
-    
-    trade_row = df[df['trade_id'] == trade_id]
-    if trade_row.empty:
-        return []
-    
-    images_json = trade_row.iloc[0].get('images', '[]')
-    try:
-        if isinstance(images_json, str) and images_json:
-            return json.loads(images_json)
-        return []
-    except:
-        return []
+    return drive.upload_image_to_drive(get_drive_service(), uploaded_file, trade_id, image_number, index=get_upload_index())
 
 @st.cache_resource
-def get_or_create_spreadsheet():
-    """Holt oder erstellt das Trading Journal Spreadsheet"""
-    client = get_google_client()
-    
-    try:
-        # Versuche existierendes Spreadsheet zu öffnen
-        spreadsheet = client.open("TradingJournal_Data")
-    except gspread.SpreadsheetNotFound:
-        # Erstelle neues Spreadsheet im geteilten Ordner
-        spreadsheet = client.create("TradingJournal_Data")
-        
-        # Erstelle Worksheets
-        # Trades Sheet - mit images Spalte
-        trades_ws = spreadsheet.sheet1
-        trades_ws.update_title("Trades")
-        trades_ws.update('A1:N1', [["id", "trade_id", "date", "time", "account", "asset", "direction", "pnl", "notes", "tags", "checklist", "reviewed", "created_at", "images"]])
-        
-        # Settings Sheet
-        settings_ws = spreadsheet.add_worksheet(title="Settings", rows=100, cols=10)
-        settings_ws.update('A1:B1', [["key", "value"]])
-        default_settings = {
-            "accounts": json.dumps(["-- Kein Konto --", "Privat", "FTMO 12.2025 100K"]),
-            "assets": json.dumps(["-- Kein Asset --", "NQ", "ES", "DAX", "EURUSD", "GOLD", "GBPJPY", "USDCAD", "CADCHF", "YEN BASKET"])
-        }
-        settings_ws.update('A2:B3', [["accounts", default_settings["accounts"]], ["assets", default_settings["assets"]]])
-        
-        # Checklist Schema Sheet
-        checklist_ws = spreadsheet.add_worksheet(title="ChecklistSchema", rows=100, cols=10)
-        checklist_ws.update('A1:B1', [["schema_json", ""]])
-        default_checklist = get_default_checklist()
-        checklist_ws.update('A2', [[json.dumps(default_checklist, ensure_ascii=False)]])
-    
-    return spreadsheet
+def get_image_cache():
+    """Gemeinsamer Bild-Cache für alle Sessions"""
+    return drive.ImageCache(drive.IMAGE_CACHE_DIR, drive.IMAGE_CACHE_MAX_BYTES, get_drive_service)
 
-def get_default_checklist():
-    return {
-        "Markt-Status": {
-            "m_range": {"label": "Range Markt", "description": "Der Markt bewegt sich seitwärts.", "image": None, "order": 0},
-            "m_long": {"label": "Long Trend", "description": "Klarer Aufwärtstrend.", "image": None, "order": 1},
-            "m_short": {"label": "Short Trend", "description": "Klarer Abwärtstrend.", "image": None, "order": 2}
-        },
-        "Setup & Play": {
-            "p_vwap": {"label": "VWAP Play", "description": "Trade basiert auf VWAP.", "image": None, "order": 0},
-            "p_manip": {"label": "Manipulation", "description": "Manipulation Zone erkannt.", "image": None, "order": 1},
-            "p_wol": {"label": "WOL", "description": "Week Open Level.", "image": None, "order": 2},
-            "p_mm": {"label": "Market Maker", "description": "Market Maker Setup.", "image": None, "order": 3}
-        },
-        "Einstieg & Risk": {
-            "e_liq": {"label": "Liquidität", "description": "Einstieg nach Liquiditäts-Sweep.", "image": None, "order": 0},
-            "e_val": {"label": "Value Area", "description": "Einstieg in Value Area.", "image": None, "order": 1},
-            "r_ok": {"label": "Risk Mgmt (1-2%)", "description": "Risikomanagement eingehalten.", "image": None, "order": 2}
-        },
-        "Ergebnis": {
-            "winner": {"label": "Winner", "description": "", "image": None, "order": 0},
-            "looser": {"label": "Looser", "description": "", "image": None, "order": 1},
-            "n_plan": {"label": "Nach Plan", "description": "", "image": None, "order": 2}
-        }
-    }
+def collect_orphaned_screenshots(dry_run=True):
+    """Findet (und löscht) verwaiste Screenshots im Drive-Ordner"""
+    return drive.collect_orphaned_screenshots(
+        get_drive_service(), get_or_create_spreadsheet(), dry_run=dry_run, upload_index=get_upload_index()
+    )
 
 # --- STYLE CSS ---
 st.markdown("""
@@ -249,94 +153,85 @@ st.markdown("""
 
 # --- DATA FUNCTIONS ---
 
-@st.cache_data(ttl=300)  # Cache für 5 Minuten
-def load_settings():
-    """Lädt Settings aus Google Sheets"""
+@st.cache_resource
+def get_loaders():
+    """Prozessweite Loader mit stale-while-revalidate: alter Wert sofort, Refresh im Hintergrund"""
     spreadsheet = get_or_create_spreadsheet()
-    settings_ws = spreadsheet.worksheet("Settings")
-    data = settings_ws.get_all_records()
+    versions = StaleWhileRevalidate(lambda: sheets.load_checklist_versions(spreadsheet), ttl=300, name="checklist-versions")
     
-    settings = {}
-    for row in data:
-        try:
-            settings[row["key"]] = json.loads(row["value"])
-        except:
-            settings[row["key"]] = row["value"]
+    def load_trades():
+        df = sheets.load_trades(spreadsheet, versions())
+        snapshot.update_snapshot(df)
+        return df
     
-    # Defaults falls nicht vorhanden
-    if "accounts" not in settings:
-        settings["accounts"] = ["-- Kein Konto --", "Privat"]
-    if "assets" not in settings:
-        settings["assets"] = ["-- Kein Asset --", "NQ", "ES"]
+    trades = StaleWhileRevalidate(load_trades, ttl=120, copy_value=lambda df: df.copy(deep=False), name="trades")
+    # Snapshot vom letzten Lauf sofort anzeigen, der Abgleich mit dem Sheet läuft im Hintergrund
+    last_snapshot = snapshot.load_snapshot()
+    if last_snapshot is not None:
+        trades.seed(last_snapshot)
     
-    return settings
+    return {
+        "settings": StaleWhileRevalidate(lambda: sheets.load_settings(spreadsheet), ttl=300, name="settings"),
+        "checklist_schema": StaleWhileRevalidate(lambda: sheets.load_checklist_schema(spreadsheet), ttl=300, name="checklist-schema"),
+        "checklist_versions": versions,
+        "trades": trades,
+    }
 
-def save_settings(settings):
-    """Speichert Settings in Google Sheets"""
-    spreadsheet = get_or_create_spreadsheet()
-    settings_ws = spreadsheet.worksheet("Settings")
-    
-    # Clear and rewrite
-    settings_ws.clear()
-    settings_ws.update('A1:B1', [["key", "value"]])
-    
-    rows = []
-    for key, value in settings.items():
-        rows.append([key, json.dumps(value) if isinstance(value, list) else value])
-    
-    if rows:
-        settings_ws.update(f'A2:B{len(rows)+1}', rows)
+@st.cache_resource
+def get_cache_graph():
+    """Welcher Cache aus welchem Sheet geladen wird - Schreibzugriffe verwerfen nur die betroffenen Caches"""
+    loaders = get_loaders()
+    graph = CacheGraph()
+    graph.add("settings", loaders["settings"], depends_on=["Settings"])
+    graph.add("checklist_schema", loaders["checklist_schema"], depends_on=["ChecklistSchema"])
+    graph.add("checklist_versions", loaders["checklist_versions"], depends_on=["ChecklistVersions"])
+    # Unbekannte Checklisten-Versionen lädt sheets.load_trades selbst nach, neue Versionen betreffen keine alten Zeilen
+    graph.add("trades", loaders["trades"], depends_on=["Trades"])
+    # Abgeleitete Caches (Facetten, Würfel, Risiko) hängen an der Datenversion und erneuern sich selbst
+    return graph
+
+def invalidate(*sheet_names):
+    """Verwirft nach einem Schreibzugriff nur die Caches, die von den geänderten Sheets abhängen"""
+    return get_cache_graph().invalidate(*sheet_names)
+
+def lazy_loader(name):
+    """Holt den Loader erst beim Aufruf - Verbindungsfehler landen so im Fehlerblock beim App-Start"""
+    def load():
+        return get_loaders()[name]()
     
-    # Clear cache nach Speichern
-    load_settings.clear()
+    load.clear = lambda: get_loaders()[name].clear()
+    return load
 
-@st.cache_data(ttl=300)  # Cache für 5 Minuten
-def load_checklist_schema():
-    """Lädt Checklist Schema aus Google Sheets"""
-    spreadsheet = get_or_create_spreadsheet()
+# Aufruf liefert eine Kopie, .clear() verwirft den Wert (wie bei st.cache_data)
+load_settings = lazy_loader("settings")  # Refresh alle 5 Minuten
+
+def save_setting(key, value):
+    """Speichert einen einzelnen Setting-Wert (nur dessen Zeile im Settings Sheet)"""
     try:
-        checklist_ws = spreadsheet.worksheet("ChecklistSchema")
-        schema_json = checklist_ws.acell('A2').value
-        if schema_json:
-            return json.loads(schema_json)
-    except:
-        pass
-    return get_default_checklist()
+        sheets.save_setting(get_or_create_spreadsheet(), key, value)
+    finally:
+        invalidate("Settings")
+
+load_checklist_schema = lazy_loader("checklist_schema")  # Refresh alle 5 Minuten
+load_checklist_versions = lazy_loader("checklist_versions")  # {version: [schlüssel, ...]}
 
 def save_checklist_schema(schema):
     """Speichert Checklist Schema in Google Sheets"""
-    spreadsheet = get_or_create_spreadsheet()
-    checklist_ws = spreadsheet.worksheet("ChecklistSchema")
-    checklist_ws.update('A2', [[json.dumps(schema, ensure_ascii=False)]])
-    
-    # Clear cache nach Speichern
-    load_checklist_schema.clear()
+    versions = load_checklist_versions()
+    known = set(versions)
+    try:
+        sheets.save_checklist_schema(get_or_create_spreadsheet(), schema, versions)
+    finally:
+        invalidate("ChecklistSchema", *(["ChecklistVersions"] if set(versions) != known else []))
 
-@st.cache_data(ttl=120)  # Cache für 2 Minuten
-def load_data():
-    """Lädt Trades aus Google Sheets"""
-    spreadsheet = get_or_create_spreadsheet()
-    trades_ws = spreadsheet.worksheet("Trades")
-    
-    data = trades_ws.get_all_records()
-    if not data:
-        return pd.DataFrame(columns=["id", "trade_id", "date", "time", "account", "asset", "direction", "pnl", "notes", "tags", "checklist", "reviewed", "created_at", "images"])
-    
-    df = pd.DataFrame(data)
-    
-    # Konvertierungen
-    if "date" in df.columns and len(df) > 0:
-        df["date"] = pd.to_datetime(df["date"]).dt.date
-    if "reviewed" in df.columns:
-        df["reviewed"] = df["reviewed"].apply(lambda x: x == "True" or x == True)
-    if "pnl" in df.columns:
-        df["pnl"] = pd.to_numeric(df["pnl"], errors='coerce').fillna(0)
-    
-    # Stelle sicher dass images Spalte existiert
-    if "images" not in df.columns:
-        df["images"] = "[]"
-    
-    return df
+def migrate_checklists_to_bitmask():
+    """Konvertiert alle JSON-Checklisten im Trades Sheet zu Bitsets"""
+    try:
+        return sheets.migrate_checklists_to_bitmask(get_or_create_spreadsheet())
+    finally:
+        invalidate("Trades", "ChecklistVersions")
+
+load_data = lazy_loader("trades")  # Refresh alle 2 Minuten
 
 def load_data_cached():
     """Alias für load_data - für Kompatibilität"""
@@ -344,107 +239,166 @@ def load_data_cached():
 
 def get_next_trade_number():
     """Ermittelt die nächste fortlaufende Trade-Nummer"""
-    df = load_data_cached()
-    if df.empty:
-        return 1
-    
-    if "trade_id" not in df.columns:
-        return 1
-    
-    max_num = 0
-    for tid in df["trade_id"]:
-        try:
-            tid_str = str(tid)
-            if len(tid_str) >= 5 and tid_str[:5].isdigit():
-                num = int(tid_str[:5])
-                max_num = max(max_num, num)
-        except:
-            pass
-    
-    return max_num + 1 if max_num > 0 else 1
+    return ids.get_next_trade_number(load_data_cached())
 
 def generate_trade_id(asset, date):
     """Generiert Trade-ID im Format: 00001XAUUSD03012026"""
-    num = get_next_trade_number()
-    asset_clean = asset.replace(" ", "").replace("-", "").replace("--", "").upper()
-    if asset_clean == "KEINASSET":
-        asset_clean = "NONE"
-    if isinstance(date, str):
-        date = datetime.strptime(date, "%Y-%m-%d")
-    date_str = date.strftime("%d%m%Y")
-    return f"{num:05d}{asset_clean}{date_str}"
-
-def save_entry(entry_data, mode="new"):
-    """Speichert einen Trade in Google Sheets"""
-    spreadsheet = get_or_create_spreadsheet()
-    trades_ws = spreadsheet.worksheet("Trades")
-    
-    # Checklist zu JSON konvertieren
-    if isinstance(entry_data.get("checklist"), dict):
-        entry_data["checklist"] = json.dumps(entry_data["checklist"])
-    
-    # Images zu JSON konvertieren
-    if isinstance(entry_data.get("images"), list):
-        entry_data["images"] = json.dumps(entry_data["images"])
-    elif "images" not in entry_data:
-        entry_data["images"] = "[]"
-    
-    # Time zu String
-    if isinstance(entry_data.get("time"), time):
-        entry_data["time"] = entry_data["time"].strftime("%H:%M")
-    
-    # Date zu String
-    if hasattr(entry_data.get("date"), 'strftime'):
-        entry_data["date"] = entry_data["date"].strftime("%Y-%m-%d")
+    return ids.generate_trade_id(asset, date, get_next_trade_number())
+
+def save_entry(entry_data, mode="new", expected_version=None):
+    """Speichert einen Trade in Google Sheets (wirft ConflictError bei parallelen Änderungen)"""
+    versions = load_checklist_versions()
+    known = set(versions)
+    trade = {k: entry_data.get(k) for k in ("id", "account", "date", "time", "pnl")}
+    try:
+        sheets.save_entry(
+            get_or_create_spreadsheet(), entry_data, mode,
+            schema=load_checklist_schema(), versions=versions, headers=ensure_trades_headers(),
+            expected_version=expected_version
+        )
+    finally:
+        # Auch bei ConflictError: der eigene Stand ist veraltet
+        invalidate("Trades", *(["ChecklistVersions"] if set(versions) != known else []))
     
-    # Reviewed zu String
-    entry_data["reviewed"] = str(entry_data.get("reviewed", False))
+    # Risiko-Zustand des Kontos direkt fortschreiben (ohne die Historie neu zu berechnen)
+    if trade["account"] is not None:
+        get_risk_tracker().record(trade["id"], trade["account"], trade["date"], trade["time"], trade["pnl"])
+
+def delete_entry(entry_id, expected_version=None):
+    """Löscht einen Trade aus Google Sheets (wirft ConflictError bei parallelen Änderungen)"""
+    try:
+        sheets.delete_entry(get_or_create_spreadsheet(), entry_id, expected_version, headers=ensure_trades_headers())
+    finally:
+        invalidate("Trades")
+    get_risk_tracker().remove(entry_id)
+
+def update_review_status(trade_id, status, expected_version=None):
+    """Aktualisiert den Review-Status eines Trades (wirft ConflictError bei parallelen Änderungen)"""
+    try:
+        sheets.update_review_status(get_or_create_spreadsheet(), trade_id, status, expected_version, headers=ensure_trades_headers())
+    finally:
+        invalidate("Trades")
+
+def bulk_update_entries(changes, deletions):
+    """Übernimmt Sammeländerungen in einem Batch-Update, gibt (geändert, gelöscht, konflikte) zurück"""
+    try:
+        return sheets.bulk_update_entries(get_or_create_spreadsheet(), changes, deletions, headers=ensure_trades_headers())
+    finally:
+        invalidate("Trades")
+
+# --- RISIKO PRO KONTO (Prop-Firm-Regeln) ---
+
+@st.cache_resource
+def get_risk_tracker():
+    """Prozessweiter Risiko-Zustand pro Konto, wird bei jedem Speichern fortgeschrieben"""
+    return risk.RiskTracker()
+
+def get_risk_status(df, settings):
+    """Abstand zu Tageslimit und Max-Drawdown pro Konto mit Regeln"""
+    tracker = get_risk_tracker()
+    tracker.sync(df, settings.get("risk_rules", {}), get_data_version(df) if not df.empty else None)
+    return tracker.status()
+
+# --- KONFLIKTE (parallele Änderungen) ---
+CONFLICT_FIELDS = {
+    "date": "Datum", "time": "Uhrzeit", "account": "Konto", "asset": "Asset", "direction": "Richtung",
+    "pnl": "PnL", "tags": "Tags", "notes": "Notizen", "reviewed": "Reviewed"
+}
+
+def register_conflict(entry_id, trade_id, action, error, **details):
+    """Merkt sich einen Konflikt, damit der Benutzer ihn im Tagebuch auflösen kann"""
+    st.session_state.setdefault("conflicts", {})[entry_id] = {
+        "trade_id": trade_id, "action": action, "current": error.current, **details
+    }
+
+def describe_conflict(conflict):
+    """Gegenüberstellung eigene vs. aktuelle Version eines Trades (nur abweichende Felder)"""
+    current = conflict["current"] or {}
+    if conflict["action"] == "bulk":
+        # Sammeländerungen enthalten nur die geänderten Felder
+        return pd.DataFrame(
+            [[CONFLICT_FIELDS.get(f, f), str(v), str(current.get(f, ""))] for f, v in conflict["changes"].items()],
+            columns=["Feld", "Deine Version", "Aktuell"]
+        )
+    mine = dict(conflict["entry"])
+    mine_checklist = mine.pop("checklist", {})
+    sheets.prepare_entry(mine)
     
-    # Created timestamp
-    if "created_at" not in entry_data:
-        entry_data["created_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = []
+    for field, label in CONFLICT_FIELDS.items():
+        mine_value, current_value = str(mine.get(field, "")), str(current.get(field, ""))
+        try:
+            same = float(mine_value) == float(current_value)
+        except ValueError:
+            same = mine_value == current_value
+        if not same:
+            rows.append([label, mine_value, current_value])
     
-    if mode == "edit":
-        # Finde und update existierende Zeile
-        all_data = trades_ws.get_all_values()
-        headers = all_data[0]
-        
-        for i, row in enumerate(all_data[1:], start=2):
-            if row[0] == entry_data["id"]:
-                # Update diese Zeile
-                new_row = [str(entry_data.get(h, "")) for h in headers]
-                trades_ws.update(f'A{i}:N{i}', [new_row])
-                return
+    labels = {k: info["label"] for items in load_checklist_schema().values() for k, info in items.items()}
+    current_checklist = decode_checklist(current.get("checklist"), current.get("checklist_version"), load_checklist_versions())
+    mine_checked = sorted(labels.get(k, k) for k, v in mine_checklist.items() if v)
+    current_checked = sorted(labels.get(k, k) for k, v in current_checklist.items() if v)
+    if mine_checked != current_checked:
+        rows.append(["Checkliste", ", ".join(mine_checked), ", ".join(current_checked)])
     
-    # Neue Zeile hinzufügen
-    headers = ["id", "trade_id", "date", "time", "account", "asset", "direction", "pnl", "notes", "tags", "checklist", "reviewed", "created_at", "images"]
-    new_row = [str(entry_data.get(h, "")) for h in headers]
-    trades_ws.append_row(new_row)
+    return pd.DataFrame(rows, columns=["Feld", "Deine Version", "Aktuell"])
 
-def delete_entry(entry_id):
-    """Löscht einen Trade aus Google Sheets"""
-    spreadsheet = get_or_create_spreadsheet()
-    trades_ws = spreadsheet.worksheet("Trades")
-    
-    all_data = trades_ws.get_all_values()
-    for i, row in enumerate(all_data[1:], start=2):
-        if row[0] == entry_id:
-            trades_ws.delete_rows(i)
-            return
-
-def update_review_status(trade_id, status):
-    """Aktualisiert den Review-Status eines Trades"""
-    spreadsheet = get_or_create_spreadsheet()
-    trades_ws = spreadsheet.worksheet("Trades")
+# --- SAMMELBEARBEITUNG ---
+BULK_ACTIONS = {
+    "none": "Keine Sammelaktion (nur geänderte Zellen)", "reviewed": "✅ Als reviewed markieren",
+    "open": "⭕ Als offen markieren", "add_tags": "🏷️ Tags hinzufügen", "set_tags": "🏷️ Tags ersetzen",
+    "account": "🏦 Konto zuweisen", "delete": "🗑️ Löschen"
+}
+# Editierbare Spalten des Daten-Editors -> Spalten im Trades Sheet
+BULK_FIELDS = {"Konto": "account", "Tags": "tags", "Reviewed": "reviewed"}
+
+def collect_bulk_changes(original, edited, action, value=None):
+    """Geänderte Zellen plus Sammelaktion der ausgewählten Zeilen als ({id: {feld: wert}}, [id zum Löschen])"""
+    selected = list(edited.index[edited["Auswahl"]])
+    if action == "delete":
+        return {}, selected
     
-    all_data = trades_ws.get_all_values()
-    headers = all_data[0]
-    reviewed_col = headers.index("reviewed") + 1
+    # Tags normalisiert vergleichen, sonst gelten unveränderte Zeilen mit anderer Schreibweise als geändert
+    original, target = original[list(BULK_FIELDS)].copy(), edited[list(BULK_FIELDS)].copy()
+    original["Tags"] = [", ".join(parse_tags(t)) for t in original["Tags"]]
+    target["Tags"] = [", ".join(parse_tags(t)) for t in target["Tags"]]
+    if action in ("reviewed", "open"):
+        target.loc[selected, "Reviewed"] = action == "reviewed"
+    elif action == "add_tags":
+        target.loc[selected, "Tags"] = [", ".join(parse_tags(f"{t}, {value}")) for t in target.loc[selected, "Tags"]]
+    elif action == "set_tags":
+        target.loc[selected, "Tags"] = ", ".join(parse_tags(value))
+    elif action == "account" and value:
+        target.loc[selected, "Konto"] = value
     
-    for i, row in enumerate(all_data[1:], start=2):
-        if row[0] == trade_id:
-            trades_ws.update_cell(i, reviewed_col, str(status))
-            return
+    changes = {}
+    for column, field in BULK_FIELDS.items():
+        differs = target[column].astype(str) != original[column].astype(str)
+        for entry_id, new_value in target.loc[differs, column].items():
+            changes.setdefault(entry_id, {})[field] = new_value
+    return changes, []
+
+# --- ANALYSEN (gecacht pro Datenversion) ---
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_tag_table(data_version, _df):
+    """Tag-Dimensionstabelle: eine Zeile pro (Trade, Tag)"""
+    return analytics.build_tag_table(_df)
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_tag_stats(data_version, _df):
+    """Statistik pro Tag (Anzahl, Win Rate, PnL)"""
+    return analytics.compute_tag_stats(_df, get_tag_table(data_version, _df))
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_facet_index(data_version, _df):
+    """Facetten-Index pro Datenversion"""
+    return analytics.FacetIndex(_df, get_tag_table(data_version, _df))
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_analytics_cube(data_version, _df):
+    """Analyse-Würfel pro Datenversion"""
+    return analytics.AnalyticsCube(_df, get_tag_table(data_version, _df))
 
 # --- PLOTLY HELPERS ---
 def plot_gauge(value, title, min_val=0, max_val=100):
@@ -455,6 +409,40 @@ def plot_gauge(value, title, min_val=0, max_val=100):
     fig.update_layout(height=150, margin=dict(l=10, r=10, t=30, b=10), paper_bgcolor="rgba(0,0,0,0)")
     return fig
 
+# --- CHART-FUNKTIONEN ---
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def build_daily_pnl_chart(data_version, _df):
+    """Baut das Daily-PnL-Chart, gecacht pro Datenversion"""
+    return charts.build_daily_pnl_chart(_df)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def build_equity_chart(data_version, _df):
+    """Baut die Equity-Kurve (WebGL), gecacht pro Datenversion"""
+    return charts.build_equity_chart(_df)
+
+# --- REVIEW-REPORTS (im Hintergrund, blockiert die UI nicht) ---
+
+@st.cache_resource
+def get_report_executor():
+    """Ein Hintergrund-Thread für Report-Läufe pro Prozess (Läufe mehrerer Sessions werden nacheinander abgearbeitet)"""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="reports")
+
+def start_report_run(df, period, formats):
+    """Startet die Report-Erzeugung im Hintergrund, gibt {"future", "progress"} zurück"""
+    progress = {"done": 0, "total": None}
+    schema = load_checklist_schema()
+    image_cache = get_image_cache()
+    
+    def run():
+        jobs = reports.build_report_jobs(df, period, schema)
+        return reports.generate_reports(
+            jobs, reports.REPORTS_DIR, formats, image_cache=image_cache,
+            on_progress=lambda done, total: progress.update(done=done, total=total)
+        )
+    
+    return {"future": get_report_executor().submit(run), "progress": progress}
+
 # --- APP START ---
 try:
     settings = load_settings()
@@ -489,11 +477,14 @@ st.title("🦅 Trading Journal Command Center")
 if connection_ok:
     st.caption("☁️ Verbunden mit Google Sheets")
 
+JOURNAL_PAGE_SIZE = 25
+
 # --- TABS ---
-tab_input, tab_journal, tab_dash, tab_checklist, tab_settings = st.tabs([
+tab_input, tab_journal, tab_dash, tab_analysis, tab_checklist, tab_settings = st.tabs([
     "➕ Neuer Trade", 
     "🗂️ Tagebuch", 
     "📊 Dashboard", 
+    "🧊 Analyse",
     "✅ Checkliste",
     "⚙️ Einstellungen"
 ])
@@ -576,7 +567,24 @@ with tab_input:
     
     c5, c6 = st.columns(2)
     i_pnl = c5.number_input("PnL ($)", step=10.0, value=0.0, key="input_pnl")
-    i_tags = c6.text_input("Tags", placeholder="Setup A, Fehler B...", key="input_tags")
+    account_risk = get_risk_status(df, settings).get(i_acc)
+    if account_risk:
+        # Tageslimit zählt nur für Trades von heute
+        daily_remaining = account_risk["daily_remaining"] if i_date == datetime.now().date() else None
+        c5.caption(
+            f"🛡️ Max-Drawdown: noch {account_risk['drawdown_remaining']:.2f} $"
+            + (f" · Tageslimit: noch {daily_remaining:.2f} $" if daily_remaining is not None else "")
+        )
+        if i_pnl < 0 and (-i_pnl >= account_risk["drawdown_remaining"] or (daily_remaining is not None and -i_pnl >= daily_remaining)):
+            c5.warning("⚠️ Mit diesem Trade wird ein Limit des Kontos erreicht!")
+    # Tag-Autovervollständigung aus bekannten Tags (häufigste zuerst)
+    known_tags = get_tag_stats(get_data_version(df), df)["tag"].tolist()
+    i_tag_select = c6.multiselect("Tags", known_tags, key="input_tag_select")
+    i_new_tags = c6.text_input("Neue Tags", placeholder="Setup A, Fehler B...", key="input_tags")
+    
+    # Bekannte Schreibweise verwenden, wenn ein neuer Tag schon existiert
+    known_by_key = {t.casefold(): t for t in known_tags}
+    i_tags = ", ".join(parse_tags(", ".join(i_tag_select + [known_by_key.get(t.casefold(), t) for t in parse_tags(i_new_tags)])))
     
     st.markdown("---")
     st.subheader("Checkliste")
@@ -656,7 +664,7 @@ with tab_input:
             # ALLE Form-Felder zurücksetzen für neuen Trade
             keys_to_reset = [
                 "input_date", "input_time", "input_account", "input_asset",
-                "input_direction", "input_pnl", "input_tags", "input_notes", 
+                "input_direction", "input_pnl", "input_tag_select", "input_tags", "input_notes", 
                 "input_files"
             ]
             for key in keys_to_reset:
@@ -668,8 +676,6 @@ with tab_input:
                 if f"new_{k}" in st.session_state:
                     del st.session_state[f"new_{k}"]
             
-            # Cache leeren damit neue Daten geladen werden
-            load_data.clear()
             st.rerun()
 
 # =========================================================
@@ -683,6 +689,53 @@ with tab_journal:
         load_data.clear()
         st.rerun()
     
+    # Konflikte mit Änderungen aus anderen Sessions auflösen
+    for conflict_id, conflict in list(st.session_state.get("conflicts", {}).items()):
+        action_label = {"edit": "Änderungen", "delete": "Löschen", "review": "Review-Status", "bulk": "Sammelbearbeitung"}[conflict["action"]]
+        current_version = None if conflict["current"] is None else sheets.parse_row_version(conflict["current"].get("row_version"))
+        
+        if conflict["current"] is None:
+            st.warning(f"⚠️ Konflikt ({action_label}): Trade {conflict['trade_id']} wurde inzwischen in einer anderen Session gelöscht.")
+        else:
+            st.warning(f"⚠️ Konflikt ({action_label}): Trade {conflict['trade_id']} wurde inzwischen in einer anderen Session geändert.")
+            if conflict["action"] in ("edit", "bulk"):
+                st.dataframe(describe_conflict(conflict), hide_index=True, use_container_width=True)
+        
+        cf1, cf2, cf3 = st.columns([1, 1, 3])
+        resolve_label = {
+            "edit": "💾 Meine Version speichern" if conflict["current"] is not None else "➕ Als neuen Trade speichern",
+            "delete": "🗑️ Trotzdem löschen",
+            "review": "✅ Status trotzdem setzen",
+            "bulk": "💾 Änderungen trotzdem übernehmen"
+        }[conflict["action"]]
+        resolvable = conflict["current"] is not None or conflict["action"] == "edit"
+        
+        if resolvable and cf1.button(resolve_label, key=f"cf_apply_{conflict_id}"):
+            try:
+                if conflict["action"] == "edit" and conflict["current"] is None:
+                    save_entry(dict(conflict["entry"]))
+                elif conflict["action"] == "edit":
+                    save_entry(dict(conflict["entry"]), mode="edit", expected_version=current_version)
+                elif conflict["action"] == "delete":
+                    delete_entry(conflict_id, expected_version=current_version)
+                elif conflict["action"] == "bulk":
+                    _, _, bulk_conflicts = bulk_update_entries({conflict_id: (current_version, conflict["changes"])}, {})
+                    if bulk_conflicts:
+                        raise bulk_conflicts[0]
+                else:
+                    update_review_status(conflict_id, conflict["status"], expected_version=current_version)
+                del st.session_state["conflicts"][conflict_id]
+                st.session_state["success_msg"] = "Konflikt aufgelöst!"
+            except ConflictError as e:
+                # Schon wieder geändert - mit dem neuen Stand erneut anzeigen
+                conflict["current"] = e.current
+            st.rerun()
+        
+        if cf2.button("↩️ Aktuelle Version behalten", key=f"cf_discard_{conflict_id}"):
+            del st.session_state["conflicts"][conflict_id]
+            load_data.clear()
+            st.rerun()
+    
     # Suchfunktion
     search_col1, search_col2, search_col3 = st.columns([3, 2, 1])
     with search_col1:
@@ -712,8 +765,61 @@ with tab_journal:
     if df.empty:
         st.info("Noch keine Einträge.")
     else:
-        df["datetime_sort"] = pd.to_datetime(df["date"].astype(str) + " " + df["time"].astype(str))
-        df_sorted = df.sort_values(by="datetime_sort", ascending=False)
+        facet_index = get_facet_index(get_data_version(df), df)
+        
+        # Strukturierte Filter in der Sidebar
+        with st.sidebar:
+            st.header("🔎 Tagebuch-Filter")
+            if st.button("✖️ Filter zurücksetzen", key="flt_reset"):
+                for key in [k for k in st.session_state.keys() if str(k).startswith("flt_")]:
+                    del st.session_state[key]
+                st.rerun()
+            
+            journal_filters = {}
+            
+            min_date, max_date = min(df["date"]), max(df["date"])
+            # Key enthält die Grenzen - neue Trades ausserhalb des alten Zeitraums werden nicht verschluckt
+            date_range = st.date_input("Zeitraum", (min_date, max_date), min_value=min_date, max_value=max_date, key=f"flt_date_{min_date}_{max_date}")
+            if isinstance(date_range, (list, tuple)) and len(date_range) == 2 and tuple(date_range) != (min_date, max_date):
+                journal_filters["date"] = tuple(date_range)
+            
+            facet_labels = [
+                ("account", "Konto"), ("asset", "Asset"), ("direction", "Richtung"),
+                ("reviewed", "Review-Status"), ("pnl_sign", "Ergebnis"), ("tags", "Tags")
+            ]
+            for facet, label in facet_labels:
+                selected = st.multiselect(label, facet_index.values(facet), key=f"flt_{facet}")
+                if selected:
+                    journal_filters[facet] = selected
+            
+            checklist_labels = {k: info["label"] for items in checklist_schema.values() for k, info in items.items()}
+            selected_items = st.multiselect(
+                "Checkliste (alle angehakt)",
+                [k for k in checklist_labels if k in facet_index.masks["checklist"]],
+                format_func=lambda k: checklist_labels.get(k, k),
+                key="flt_checklist"
+            )
+            if selected_items:
+                journal_filters["checklist"] = selected_items
+            
+            pnl_min, pnl_max = float(facet_index.pnl.min()), float(facet_index.pnl.max())
+            if pnl_min < pnl_max:
+                # Key enthält die Grenzen - ändern sie sich, startet der Slider neu
+                pnl_range = st.slider("PnL ($)", pnl_min, pnl_max, (pnl_min, pnl_max), key=f"flt_pnl_{pnl_min}_{pnl_max}")
+                if pnl_range != (pnl_min, pnl_max):
+                    journal_filters["pnl_range"] = pnl_range
+            
+            # Wie viele Trades jede Auswahl übrig lässt
+            st.markdown("---")
+            st.caption(f"**{int(facet_index.mask(journal_filters).sum())}** von {facet_index.size} Trades")
+            for facet, label in facet_labels + [("checklist", "Checkliste")]:
+                counts = facet_index.counts(journal_filters, facet)
+                names = checklist_labels if facet == "checklist" else {}
+                st.caption(f"**{label}:** " + " · ".join(
+                    f"{names.get(v, v)} ({n})" for v, n in sorted(counts.items(), key=lambda x: -x[1]) if n > 0
+                ))
+        
+        df_sorted = df[facet_index.mask(journal_filters)].sort_values(by="datetime_sort", ascending=False)
         
         # Filter anwenden
         if search_query:
@@ -743,12 +849,108 @@ with tab_journal:
         else:
             df_filtered = df_sorted
         
+        bulk_mode = st.toggle(
+            "🧰 Sammelbearbeitung", key="bulk_mode",
+            help="Gefilterte Trades als Tabelle: Zellen direkt ändern oder mehrere auswählen und gemeinsam bearbeiten"
+        )
+        
         if df_filtered.empty:
             st.warning("Keine Trades gefunden.")
+        elif bulk_mode:
+            # Index = Trade-UUID, damit Änderungen auch nach einem Refresh der richtigen Zeile zugeordnet werden
+            bulk_df = pd.DataFrame({
+                "Auswahl": False,
+                "Trade-ID": df_filtered["trade_id"].astype(str),
+                "Datum": df_filtered["date"],
+                "Asset": df_filtered["asset"].astype(str),
+                "PnL": df_filtered["pnl"],
+                "Konto": df_filtered["account"].astype(str),
+                "Tags": df_filtered["tags"].astype(str),
+                "Reviewed": df_filtered["reviewed"].astype(bool),
+            })
+            bulk_df.index = df_filtered["id"].values
+            trade_ids = dict(zip(df_filtered["id"], df_filtered["trade_id"].astype(str)))
+            bulk_generation = st.session_state.get("bulk_generation", 0)
+            
+            edited = st.data_editor(
+                bulk_df,
+                column_config={
+                    "Auswahl": st.column_config.CheckboxColumn("✔", help="Für die Sammelaktion auswählen"),
+                    "PnL": st.column_config.NumberColumn("PnL", format="$%.2f"),
+                    "Konto": st.column_config.SelectboxColumn(
+                        "Konto", options=list(dict.fromkeys(settings["accounts"] + list(bulk_df["Konto"]))), required=True
+                    ),
+                    "Reviewed": st.column_config.CheckboxColumn("Reviewed"),
+                },
+                disabled=["Trade-ID", "Datum", "Asset", "PnL"],
+                hide_index=True,
+                use_container_width=True,
+                key=f"bulk_editor_{bulk_generation}"
+            )
+            
+            bc1, bc2 = st.columns(2)
+            bulk_action = bc1.selectbox(
+                f"Aktion für {int(edited['Auswahl'].sum())} ausgewählte Trades",
+                list(BULK_ACTIONS), format_func=BULK_ACTIONS.get, key="bulk_action"
+            )
+            bulk_value = None
+            if bulk_action in ("add_tags", "set_tags"):
+                bulk_value = bc2.text_input("Tags", placeholder="Setup A, Fehler B...", key="bulk_tags")
+            elif bulk_action == "account":
+                bulk_value = bc2.selectbox("Konto", settings["accounts"], key="bulk_account")
+            
+            bulk_changes, bulk_deletions = collect_bulk_changes(bulk_df, edited, bulk_action, bulk_value)
+            st.caption(f"{len(bulk_changes)} Trades werden geändert, {len(bulk_deletions)} gelöscht")
+            
+            # Erwartete Version = die Version, die beim Bearbeiten angezeigt wurde. Der Editor behält seine
+            # Änderungen über einen Refresh hinweg - die Version einer Zeile mit offenen Änderungen wird
+            # deshalb eingefroren, sonst würde die Änderung einer anderen Session stillschweigend überschrieben
+            shown_versions = st.session_state.setdefault(f"bulk_versions_{bulk_generation}", {})
+            pending = set(bulk_changes) | set(edited.index[edited["Auswahl"]])
+            row_versions = {}
+            for entry_id, version in zip(df_filtered["id"], df_filtered["row_version"]):
+                row_versions[entry_id] = shown_versions.get(entry_id, version) if entry_id in pending else version
+                shown_versions[entry_id] = row_versions[entry_id]
+            
+            if st.button("💾 Übernehmen", type="primary", key="bulk_apply", disabled=not (bulk_changes or bulk_deletions)):
+                # Ein Download, ein Batch-Update und gebündelte Löschungen statt eines Reruns pro Trade
+                updated, deleted, conflicts = bulk_update_entries(
+                    {i: (row_versions[i], fields) for i, fields in bulk_changes.items()},
+                    {i: row_versions[i] for i in bulk_deletions}
+                )
+                for e in conflicts:
+                    action = "delete" if e.entry_id in bulk_deletions else "bulk"
+                    register_conflict(e.entry_id, trade_ids.get(e.entry_id, ""), action, e, changes=bulk_changes.get(e.entry_id, {}))
+                st.session_state.pop(f"bulk_versions_{bulk_generation}", None)
+                st.session_state["bulk_generation"] = bulk_generation + 1
+                st.session_state["success_msg"] = f"{updated} Trades geändert, {deleted} gelöscht" + (
+                    f" ({len(conflicts)} Konflikte)" if conflicts else ""
+                )
+                st.rerun()
         else:
+            # Seitenweise Anzeige
+            total_pages = max(1, -(-len(df_filtered) // JOURNAL_PAGE_SIZE))
+            if total_pages > 1:
+                page = st.selectbox(
+                    "Seite",
+                    list(range(1, total_pages + 1)),
+                    format_func=lambda p: f"Seite {p} / {total_pages}",
+                    key="journal_page"
+                )
+            else:
+                page = 1
+            df_page = df_filtered.iloc[(page - 1) * JOURNAL_PAGE_SIZE:page * JOURNAL_PAGE_SIZE]
+            
+            # Screenshots der sichtbaren Seite im Hintergrund in den lokalen Cache laden
+            image_cache = get_image_cache()
+            page_image_ids = []
+            for images_json in df_page["images"]:
+                page_image_ids.extend(fid for fid in map(get_drive_file_id, parse_images(images_json)) if fid)
+            image_cache.prefetch(page_image_ids)
+            
             current_kw = None
             
-            for index, row in df_filtered.iterrows():
+            for index, row in df_page.iterrows():
                 date_obj = row["date"]
                 isocal = date_obj.isocalendar()
                 kw_label = f"KW {isocal[1]} / {isocal[0]}"
@@ -825,10 +1027,12 @@ with tab_journal:
                                     "reviewed": row.get("reviewed", False),
                                     "created_at": row.get("created_at", "")
                                 }
-                                save_entry(updated_entry, mode="edit")
+                                try:
+                                    save_entry(dict(updated_entry), mode="edit", expected_version=row["row_version"])
+                                    st.session_state["success_msg"] = "Trade aktualisiert!"
+                                except ConflictError as e:
+                                    register_conflict(row["id"], row.get("trade_id", ""), "edit", e, entry=updated_entry)
                                 st.session_state[edit_key] = False
-                                st.session_state["success_msg"] = "Trade aktualisiert!"
-                                load_data.clear()
                                 st.rerun()
                         
                         if st.button("Abbrechen", key=f"cncl_{row['id']}"):
@@ -845,19 +1049,16 @@ with tab_journal:
                             st.markdown(f"**Tags:** {row.get('tags', '-')}")
                             
                             # Bilder aus Google Drive URLs laden
-                            images_json = row.get("images", "[]")
-                            try:
-                                if isinstance(images_json, str) and images_json:
-                                    images = json.loads(images_json)
-                                else:
-                                    images = []
-                            except:
-                                images = []
+                            images = parse_images(row.get("images", "[]"))
                             
                             if images:
                                 st.markdown("**📷 Screenshots:**")
                                 for img in images:
-                                    st.image(img['url'], caption=img['name'], use_container_width=True)
+                                    # Aus dem lokalen Cache wenn vorhanden, sonst direkt von Drive
+                                    file_id = get_drive_file_id(img)
+                                    cached = image_cache.get(file_id) if file_id else None
+                                    if cached or img.get('url'):
+                                        st.image(cached if cached else img['url'], caption=img.get('name', ''), use_container_width=True)
                         
                         with vc2:
                             try: 
@@ -891,13 +1092,17 @@ with tab_journal:
                         
                         btn_txt = "Als offen markieren" if row["reviewed"] else "✅ Als Reviewed markieren"
                         if b2.button(btn_txt, key=f"br_{row['id']}"):
-                            update_review_status(row["id"], not row["reviewed"])
-                            load_data.clear()
+                            try:
+                                update_review_status(row["id"], not row["reviewed"], expected_version=row["row_version"])
+                            except ConflictError as e:
+                                register_conflict(row["id"], row.get("trade_id", ""), "review", e, status=not row["reviewed"])
                             st.rerun()
                         
                         if b3.button("🗑️ Löschen", key=f"del_{row['id']}"):
-                            delete_entry(row["id"])
-                            load_data.clear()
+                            try:
+                                delete_entry(row["id"], expected_version=row["row_version"])
+                            except ConflictError as e:
+                                register_conflict(row["id"], row.get("trade_id", ""), "delete", e)
                             st.warning("Gelöscht!")
                             st.rerun()
 
@@ -917,18 +1122,187 @@ with tab_dash:
         k2.plotly_chart(plot_gauge(win_rate, "Win Rate"), use_container_width=True)
         k3.metric("Trades", len(df))
         
+        risk_status = get_risk_status(df, settings)
+        if risk_status:
+            st.subheader("🛡️ Risiko pro Konto")
+            risk_rows = []
+            for acc, state in risk_status.items():
+                rules = settings["risk_rules"][acc]
+                if state["drawdown_breached"]:
+                    status = f"❌ Max-Drawdown verletzt ({state['drawdown_breached']})"
+                elif state["daily_remaining"] <= 0:
+                    status = "❌ Tageslimit erreicht"
+                elif (state["daily_remaining"] < 0.25 * rules["max_daily_loss"]
+                      or state["drawdown_remaining"] < 0.25 * rules["max_drawdown"]):
+                    status = "⚠️ Nahe am Limit"
+                else:
+                    status = "✅ OK"
+                risk_rows.append({
+                    "Konto": acc, "Kontostand": state["balance"], "Heute": state["today_pnl"],
+                    "Tageslimit übrig": state["daily_remaining"], "Höchststand": state["high_water_mark"],
+                    "Drawdown": state["drawdown"], "Max-DD übrig": state["drawdown_remaining"],
+                    "Tagesverstösse": state["daily_breaches"], "Status": status
+                })
+            money_columns = ["Kontostand", "Heute", "Tageslimit übrig", "Höchststand", "Drawdown", "Max-DD übrig"]
+            st.dataframe(
+                pd.DataFrame(risk_rows), hide_index=True, use_container_width=True,
+                column_config={c: st.column_config.NumberColumn(c, format="%.2f $") for c in money_columns}
+            )
+        
         st.divider()
         c1, c2 = st.columns([2, 1])
         with c1:
-            daily = df.groupby("date")["pnl"].sum().reset_index()
-            fig = px.bar(daily, x="date", y="pnl", color="pnl", color_continuous_scale=["red", "green"], title="Daily PnL")
-            st.plotly_chart(fig, use_container_width=True)
+            data_version = get_data_version(df)
+            st.plotly_chart(build_daily_pnl_chart(data_version, df), use_container_width=True)
+            st.plotly_chart(build_equity_chart(data_version, df), use_container_width=True)
         with c2:
             st.subheader("Letzte Aktivitäten")
             st.dataframe(df[["date", "asset", "pnl"]].sort_values("date", ascending=False).head(5), hide_index=True)
+            
+            st.subheader("🏷️ Tags")
+            st.dataframe(
+                get_tag_stats(data_version, df),
+                hide_index=True,
+                column_config={
+                    "tag": "Tag", "trades": "Trades",
+                    "win_rate": st.column_config.NumberColumn("Win Rate", format="%.1f %%"),
+                    "total_pnl": st.column_config.NumberColumn("PnL", format="%.2f $"),
+                    "avg_pnl": st.column_config.NumberColumn("Ø PnL", format="%.2f $")
+                }
+            )
+        
+        st.divider()
+        with st.expander("📄 Review-Reports", expanded=False):
+            st.caption("Ein Report pro Woche bzw. Monat mit Kennzahlen, Equity-Kurve, Checklisten-Disziplin und Notizen inkl. Screenshots.")
+            rc1, rc2 = st.columns(2)
+            report_period = rc1.radio("Zeitraum", ["Woche", "Monat"], horizontal=True, key="report_period")
+            format_options = ["HTML", "PDF"] if reports.pdf_available() else ["HTML"]
+            report_formats = rc2.multiselect(
+                "Format", format_options, default=["HTML"], key="report_formats",
+                help=None if "PDF" in format_options else "Für PDF muss weasyprint installiert sein"
+            )
+            
+            report_run = st.session_state.get("report_run")
+            report_running = report_run is not None and not report_run["future"].done()
+            if st.button("📄 Reports erzeugen", key="report_start", disabled=report_running or not report_formats):
+                report_run = start_report_run(df, {"Woche": "week", "Monat": "month"}[report_period], [f.lower() for f in report_formats])
+                st.session_state["report_run"] = report_run
+                report_running = True
+            
+            if report_running:
+                progress = report_run["progress"]
+                st.info(f"⏳ Reports werden im Hintergrund erzeugt... {progress['done']}/{progress['total'] or '?'}")
+                st.button("🔄 Status aktualisieren", key="report_refresh")
+            elif report_run is not None:
+                try:
+                    result = report_run["future"].result()
+                except Exception as e:
+                    st.error(f"❌ Fehler bei der Report-Erzeugung: {e}")
+                else:
+                    st.success(f"✅ {len(result['written'])} Reports erzeugt, {len(result['skipped'])} unverändert")
+                    for fail in result["failed"]:
+                        st.error(f"❌ {fail['key']}: {fail['error']}")
+                    st.download_button(
+                        "⬇️ Alle Reports (ZIP)", data=report_run.setdefault("zip", reports.zip_reports()), file_name="review_reports.zip",
+                        mime="application/zip", key="report_download"
+                    )
 
 # =========================================================
-# TAB 4: CHECKLISTE VERWALTEN
+# TAB 4: ANALYSE (Würfel über alle Dimensionen)
+# =========================================================
+with tab_analysis:
+    st.header("🧊 Analyse")
+    df = load_data()
+    if df.empty:
+        st.info("Keine Daten.")
+    else:
+        cube = get_analytics_cube(get_data_version(df), df)
+        dimensions = analytics.CUBE_DIMENSIONS
+        measures = analytics.CUBE_MEASURES
+        checklist_labels = reports.checklist_labels(checklist_schema)
+        label_counts = pd.Series([checklist_labels.get(k, k) for k in cube.values("checklist")]).value_counts()
+        
+        def value_label(dim, value):
+            if dim != "checklist":
+                return value
+            label = checklist_labels.get(value, value)
+            # Gleiche Beschriftung bei mehreren Punkten (z.B. in zwei Kategorien) -> Schlüssel anhängen
+            return f"{label} ({value})" if label_counts.get(label, 0) > 1 else label
+        
+        ac1, ac2, ac3 = st.columns(3)
+        rows_dim = ac1.selectbox("Zeilen", list(dimensions), format_func=dimensions.get, key="cube_rows")
+        cols_dim = ac2.selectbox(
+            "Spalten", [None] + [d for d in dimensions if d != rows_dim],
+            format_func=lambda d: "—" if d is None else dimensions[d], key="cube_cols"
+        )
+        measure = ac3.selectbox("Kennzahl", list(measures), format_func=measures.get, key="cube_measure")
+        group_by = [rows_dim] + ([cols_dim] if cols_dim else [])
+        
+        # Drill-down: Filter auf weitere Dimensionen (Checkliste/Tags nur, wenn danach gruppiert wird)
+        cube_filters = {}
+        with st.expander("🔎 Filter / Drill-down", expanded=False):
+            filter_dims = [d for d in dimensions if d not in analytics.CUBE_MULTI_DIMENSIONS or d in group_by]
+            filter_cols = st.columns(3)
+            for i, dim in enumerate(filter_dims):
+                selected = filter_cols[i % 3].multiselect(
+                    dimensions[dim], cube.values(dim), format_func=lambda v, dim=dim: value_label(dim, v), key=f"cube_flt_{dim}"
+                )
+                if selected:
+                    cube_filters[dim] = selected
+        
+        started = datetime.now()
+        result = cube.query(group_by, cube_filters)
+        elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+        st.caption(f"{len(result)} Zeilen aus dem Würfel in {elapsed_ms:.1f} ms")
+        
+        if result.empty:
+            st.warning("Keine Trades für diese Auswahl.")
+        else:
+            measure_format = "%.1f %%" if measure == "win_rate" else ("%d" if measure == "trades" else "%.2f $")
+            
+            if cols_dim is None:
+                result[rows_dim] = [value_label(rows_dim, v) for v in result[rows_dim]]
+                st.plotly_chart(go.Figure(
+                    go.Bar(x=result[rows_dim].astype(str), y=result[measure],
+                           marker_color=["#00cc96" if v >= 0 else "#EF553B" for v in result[measure]])
+                ).update_layout(
+                    height=320, margin=dict(l=10, r=10, t=30, b=10), xaxis_title=dimensions[rows_dim], yaxis_title=measures[measure]
+                ), use_container_width=True)
+                st.dataframe(
+                    result.rename(columns={rows_dim: dimensions[rows_dim]}), hide_index=True, use_container_width=True,
+                    column_config={
+                        "trades": "Trades",
+                        "total_pnl": st.column_config.NumberColumn("PnL", format="%.2f $"),
+                        "avg_pnl": st.column_config.NumberColumn("Ø PnL", format="%.2f $"),
+                        "win_rate": st.column_config.NumberColumn("Win Rate", format="%.1f %%")
+                    }
+                )
+            else:
+                # Pivot über die Werte des Würfels (eindeutig), Beschriftungen erst danach.
+                # Reihenfolge des Würfels beibehalten (Wochentage, Stunden), nicht alphabetisch
+                pivot = result.pivot(index=rows_dim, columns=cols_dim, values=measure).reindex(
+                    index=result[rows_dim].drop_duplicates(),
+                    columns=[c for c in cube.values(cols_dim) if c in set(result[cols_dim])]
+                )
+                pivot.index = [value_label(rows_dim, v) for v in pivot.index]
+                pivot.columns = [value_label(cols_dim, v) for v in pivot.columns]
+                st.plotly_chart(go.Figure(
+                    go.Heatmap(z=pivot.to_numpy(), x=pivot.columns.astype(str), y=pivot.index.astype(str),
+                               colorscale="RdYlGn", zmid=0 if measure in ("total_pnl", "avg_pnl") else None)
+                ).update_layout(
+                    height=max(320, 22 * len(pivot)), margin=dict(l=10, r=10, t=30, b=10),
+                    xaxis_title=dimensions[cols_dim], yaxis_title=dimensions[rows_dim]
+                ), use_container_width=True)
+                st.dataframe(
+                    pivot.rename_axis(index=dimensions[rows_dim], columns=None), use_container_width=True,
+                    column_config={str(c): st.column_config.NumberColumn(str(c), format=measure_format) for c in pivot.columns}
+                )
+            
+            if any(d in analytics.CUBE_MULTI_DIMENSIONS for d in group_by):
+                st.caption("Bei Checklisten-Punkten und Tags zählt ein Trade in jeder seiner Gruppen.")
+
+# =========================================================
+# TAB 5: CHECKLISTE VERWALTEN
 # =========================================================
 with tab_checklist:
     st.header("✅ Checkliste verwalten")
@@ -955,7 +1329,6 @@ with tab_checklist:
                     save_checklist_schema(checklist_schema)
                     st.session_state["show_new_cat"] = False
                     st.session_state["success_msg"] = f"Kategorie '{new_cat_name}' erstellt!"
-                    load_data.clear()
                     st.rerun()
             if col2.form_submit_button("Abbrechen"):
                 st.session_state["show_new_cat"] = False
@@ -980,7 +1353,6 @@ with tab_checklist:
                     checklist_schema[selected_cat][key]["order"], checklist_schema[selected_cat][prev_key]["order"] = \
                         checklist_schema[selected_cat][prev_key]["order"], checklist_schema[selected_cat][key]["order"]
                     save_checklist_schema(checklist_schema)
-                    load_data.clear()
                     st.rerun()
                 
                 if col2.button("⬇️", key=f"down_{key}") and i < len(sorted_items) - 1:
@@ -988,14 +1360,12 @@ with tab_checklist:
                     checklist_schema[selected_cat][key]["order"], checklist_schema[selected_cat][next_key]["order"] = \
                         checklist_schema[selected_cat][next_key]["order"], checklist_schema[selected_cat][key]["order"]
                     save_checklist_schema(checklist_schema)
-                    load_data.clear()
                     st.rerun()
                 
                 if col3.button("🗑️ Löschen", key=f"del_item_{key}"):
                     del checklist_schema[selected_cat][key]
                     save_checklist_schema(checklist_schema)
                     st.session_state["success_msg"] = "Punkt gelöscht!"
-                    load_data.clear()
                     st.rerun()
         
         st.divider()
@@ -1016,7 +1386,6 @@ with tab_checklist:
                     }
                     save_checklist_schema(checklist_schema)
                     st.session_state["success_msg"] = f"'{ni_label}' hinzugefügt!"
-                    load_data.clear()
                     st.rerun()
                 else:
                     st.error("Bitte Schlüssel und Label ausfüllen.")
@@ -1027,13 +1396,12 @@ with tab_checklist:
                 del checklist_schema[selected_cat]
                 save_checklist_schema(checklist_schema)
                 st.session_state["success_msg"] = f"Kategorie '{selected_cat}' gelöscht!"
-                load_data.clear()
                 st.rerun()
             else:
                 st.error("Mindestens eine Kategorie muss existieren.")
 
 # =========================================================
-# TAB 5: EINSTELLUNGEN
+# TAB 6: EINSTELLUNGEN
 # =========================================================
 with tab_settings:
     st.header("⚙️ Einstellungen")
@@ -1053,24 +1421,46 @@ with tab_settings:
                     real_idx = settings["accounts"].index(acc)
                     settings["accounts"][real_idx], settings["accounts"][real_idx-1] = \
                         settings["accounts"][real_idx-1], settings["accounts"][real_idx]
-                    save_settings(settings)
-                    load_data.clear()
+                    save_setting("accounts", settings["accounts"])
                     st.rerun()
                 
                 if c2.button("⬇️", key=f"dn_acc_{i}") and i < len(accounts) - 1:
                     real_idx = settings["accounts"].index(acc)
                     settings["accounts"][real_idx], settings["accounts"][real_idx+1] = \
                         settings["accounts"][real_idx+1], settings["accounts"][real_idx]
-                    save_settings(settings)
-                    load_data.clear()
+                    save_setting("accounts", settings["accounts"])
                     st.rerun()
                 
                 if c3.button("🗑️", key=f"del_acc_{i}"):
                     settings["accounts"].remove(acc)
-                    save_settings(settings)
+                    save_setting("accounts", settings["accounts"])
                     st.session_state["success_msg"] = f"'{acc}' gelöscht!"
-                    load_data.clear()
                     st.rerun()
+                
+                # Prop-Firm Regeln (Tagesverlust-Limit, Max-Drawdown)
+                acc_rules = settings.get("risk_rules", {}).get(acc)
+                defaults = acc_rules or risk.suggest_rules(acc)
+                with st.form(f"risk_form_{i}"):
+                    st.markdown("**🛡️ Risiko-Regeln**")
+                    r_start = st.number_input("Startkapital ($)", min_value=0.0, step=1000.0, value=float(defaults["start_balance"]), key=f"risk_start_{i}")
+                    r_daily = st.number_input("Max. Tagesverlust ($)", min_value=0.0, step=100.0, value=float(defaults["max_daily_loss"]), key=f"risk_daily_{i}")
+                    r_dd = st.number_input("Max. Drawdown ($)", min_value=0.0, step=100.0, value=float(defaults["max_drawdown"]), key=f"risk_dd_{i}")
+                    r_type = st.selectbox(
+                        "Drawdown-Art", list(risk.DRAWDOWN_TYPES), format_func=risk.DRAWDOWN_TYPES.get,
+                        index=list(risk.DRAWDOWN_TYPES).index(defaults["drawdown_type"]), key=f"risk_type_{i}"
+                    )
+                    rf1, rf2 = st.columns(2)
+                    if rf1.form_submit_button("💾 Regeln speichern"):
+                        settings.setdefault("risk_rules", {})[acc] = {
+                            "start_balance": r_start, "max_daily_loss": r_daily, "max_drawdown": r_dd, "drawdown_type": r_type
+                        }
+                        save_setting("risk_rules", settings["risk_rules"])
+                        st.session_state["success_msg"] = f"Regeln für '{acc}' gespeichert!"
+                        st.rerun()
+                    if acc_rules and rf2.form_submit_button("Regeln entfernen"):
+                        del settings["risk_rules"][acc]
+                        save_setting("risk_rules", settings["risk_rules"])
+                        st.rerun()
         
         st.divider()
         with st.form("new_acc_form"):
@@ -1078,9 +1468,8 @@ with tab_settings:
             if st.form_submit_button("➕ Konto hinzufügen"):
                 if new_acc and new_acc not in settings["accounts"]:
                     settings["accounts"].append(new_acc)
-                    save_settings(settings)
+                    save_setting("accounts", settings["accounts"])
                     st.session_state["success_msg"] = f"'{new_acc}' hinzugefügt!"
-                    load_data.clear()
                     st.rerun()
     
     with col_ass:
@@ -1096,23 +1485,20 @@ with tab_settings:
                     real_idx = settings["assets"].index(ass)
                     settings["assets"][real_idx], settings["assets"][real_idx-1] = \
                         settings["assets"][real_idx-1], settings["assets"][real_idx]
-                    save_settings(settings)
-                    load_data.clear()
+                    save_setting("assets", settings["assets"])
                     st.rerun()
                 
                 if c2.button("⬇️", key=f"dn_ass_{i}") and i < len(assets) - 1:
                     real_idx = settings["assets"].index(ass)
                     settings["assets"][real_idx], settings["assets"][real_idx+1] = \
                         settings["assets"][real_idx+1], settings["assets"][real_idx]
-                    save_settings(settings)
-                    load_data.clear()
+                    save_setting("assets", settings["assets"])
                     st.rerun()
                 
                 if c3.button("🗑️", key=f"del_ass_{i}"):
                     settings["assets"].remove(ass)
-                    save_settings(settings)
+                    save_setting("assets", settings["assets"])
                     st.session_state["success_msg"] = f"'{ass}' gelöscht!"
-                    load_data.clear()
                     st.rerun()
         
         st.divider()
@@ -1121,11 +1507,54 @@ with tab_settings:
             if st.form_submit_button("➕ Asset hinzufügen"):
                 if new_ass and new_ass not in settings["assets"]:
                     settings["assets"].append(new_ass)
-                    save_settings(settings)
+                    save_setting("assets", settings["assets"])
                     st.session_state["success_msg"] = f"'{new_ass}' hinzugefügt!"
-                    load_data.clear()
                     st.rerun()
     
+    st.divider()
+    st.subheader("🗜️ Wartung: Checklisten komprimieren")
+    legacy_count = 0
+    if connection_ok and not df.empty:
+        legacy_count = int((df["checklist_version"].astype(str) == "").sum())
+    st.caption(f"Trades mit Checkliste im alten JSON-Format: {legacy_count}")
+    if st.button("🗜️ Zu Bitsets konvertieren", key="migrate_checklists", disabled=legacy_count == 0):
+        with st.spinner("Konvertiere Checklisten..."):
+            converted = migrate_checklists_to_bitmask()
+        st.session_state["success_msg"] = f"{converted} Checklisten konvertiert!"
+        st.rerun()
+    
+    st.divider()
+    st.subheader("🧹 Wartung: Verwaiste Screenshots")
+    st.caption(
+        f"Screenshots im Drive-Ordner, die zu keinem Trade mehr gehören (gelöschte Trades, "
+        f"abgebrochene Speichervorgänge). Dateien jünger als {drive.GC_MIN_AGE_HOURS}h werden ignoriert."
+    )
+    
+    gc_pending = drive.load_gc_state()
+    if gc_pending:
+        st.warning(f"Unterbrochener Aufräum-Lauf vom {gc_pending['started_at']} - wird beim Löschen fortgesetzt.")
+    
+    gc_col1, gc_col2 = st.columns(2)
+    if gc_col1.button("🔍 Suchen (Dry-Run)", key="gc_dry_run"):
+        with st.spinner("Durchsuche Drive-Ordner..."):
+            st.session_state["gc_report"] = collect_orphaned_screenshots(dry_run=True)
+    if gc_col2.button("🗑️ Verwaiste Screenshots löschen", key="gc_delete"):
+        with st.spinner("Lösche verwaiste Screenshots..."):
+            st.session_state["gc_report"] = collect_orphaned_screenshots(dry_run=False)
+    
+    gc_report = st.session_state.get("gc_report")
+    if gc_report:
+        g1, g2, g3 = st.columns(3)
+        g1.metric("Dateien im Ordner", gc_report["scanned"])
+        g2.metric("Verwaist", len(gc_report["orphans"]), f"{gc_report['orphan_bytes'] / 1024 / 1024:.1f} MB", delta_color="off")
+        g3.metric("Gelöscht", "- (Dry-Run)" if gc_report["dry_run"] else gc_report["deleted"])
+        if gc_report.get("rescued"):
+            st.caption(f"♻️ {gc_report['rescued']} Screenshots wurden seit dem Auflisten wieder verwendet und nicht gelöscht")
+        if gc_report["orphans"]:
+            st.dataframe(pd.DataFrame(gc_report["orphans"]), hide_index=True, use_container_width=True)
+        for fail in gc_report["failed"]:
+            st.error(f"❌ {fail['id']}: {fail['error']}")
+    
     st.divider()
     st.info(f"📊 Trades Gesamt: {len(df)}")
     st.caption("☁️ Daten werden in Google Sheets gespeichert")
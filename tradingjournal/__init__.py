@@ -0,0 +1,6 @@
+"""Trading Journal Core - Datenschicht ohne Streamlit.
+
+Sheets-Zugriff, Trade-IDs, Parsing und Analysen können aus der Streamlit-App,
+aus Skripten, Cron-Jobs und über die Kommandozeile (``python -m tradingjournal``)
+verwendet werden.
+"""
@@ -0,0 +1,331 @@
+"""Analysen über den Trades-DataFrame: Tag-Tabelle, Tag-Statistik, Facetten-Filter und Rollups"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .parsing import get_trade_timestamps
+
+
+def build_tag_table(df):
+    """Tag-Dimensionstabelle: eine Zeile pro (Trade, Tag)"""
+    if df.empty or "tag_list" not in df.columns:
+        return pd.DataFrame(columns=["id", "trade_id", "tag", "tag_key"])
+    
+    tags = df[["id", "trade_id", "tag_list"]].explode("tag_list").dropna(subset=["tag_list"])
+    tags = tags.rename(columns={"tag_list": "tag"})
+    tags["tag_key"] = tags["tag"].str.casefold()
+    
+    # Anzeigename pro Tag: die häufigste Schreibweise
+    spelling = tags.groupby(["tag_key", "tag"]).size().reset_index(name="n")
+    spelling = spelling.sort_values("n", ascending=False).drop_duplicates("tag_key")
+    tags["tag"] = tags["tag_key"].map(spelling.set_index("tag_key")["tag"])
+    
+    return tags.reset_index(drop=True)
+
+
+def compute_tag_stats(df, tag_table=None):
+    """Statistik pro Tag (Anzahl, Win Rate, PnL)"""
+    tags = build_tag_table(df) if tag_table is None else tag_table
+    if tags.empty:
+        return pd.DataFrame(columns=["tag", "trades", "win_rate", "total_pnl", "avg_pnl"])
+    
+    pnl = tags["id"].map(df.drop_duplicates("id").set_index("id")["pnl"])
+    stats = pd.DataFrame({"tag": tags["tag"], "pnl": pnl, "win": pnl > 0}).groupby("tag").agg(
+        trades=("pnl", "size"),
+        win_rate=("win", "mean"),
+        total_pnl=("pnl", "sum"),
+        avg_pnl=("pnl", "mean")
+    )
+    stats["win_rate"] = (stats["win_rate"] * 100).round(1)
+    stats["total_pnl"] = stats["total_pnl"].round(2)
+    stats["avg_pnl"] = stats["avg_pnl"].round(2)
+    return stats.sort_values("trades", ascending=False).reset_index()
+
+
+def compute_rollups(df, tag_table=None):
+    """Vorberechnete Auswertungen: PnL pro Tag, Kalenderwoche, Monat, Konto und Asset sowie die Tag-Statistik"""
+    if df.empty:
+        return {}
+    
+    dates = pd.to_datetime(df["date"])
+    isocal = dates.dt.isocalendar()
+    frame = pd.DataFrame({
+        "date": df["date"],
+        "week": isocal["year"].astype(str) + "-W" + isocal["week"].astype(str).str.zfill(2),
+        "month": dates.dt.strftime("%Y-%m"),
+        "account": df["account"],
+        "asset": df["asset"],
+        "pnl": df["pnl"],
+        "win": df["pnl"] > 0
+    })
+    
+    def summarize(by):
+        result = frame.groupby(by, sort=True).agg(trades=("pnl", "size"), pnl=("pnl", "sum"), win_rate=("win", "mean"))
+        result["win_rate"] = (result["win_rate"] * 100).round(1)
+        return result.reset_index()
+    
+    return {
+        "daily": summarize("date"),
+        "weekly": summarize("week"),
+        "monthly": summarize("month"),
+        "accounts": summarize("account"),
+        "assets": summarize("asset"),
+        "tags": compute_tag_stats(df, tag_table)
+    }
+
+
+# --- FILTER & FACETTEN ---
+PNL_SIGNS = ["Gewinn", "Verlust", "Break-even"]
+
+
+class FacetIndex:
+    """Vorberechnete Facetten-Masken eines Trades-DataFrames (eine Instanz pro Datenversion).
+    
+    Filter sind Dicts {facette: auswahl}. Innerhalb einer Facette wird ODER-verknüpft,
+    nur bei "checklist" müssen alle gewählten Punkte angehakt sein. "date" und "pnl_range"
+    sind (von, bis)-Tupel.
+    """
+    MAX_CACHED_FILTERS = 64
+    
+    def __init__(self, df, tag_table=None):
+        self.size = len(df)
+        self.dates = pd.to_datetime(df["date"]).to_numpy().astype("datetime64[D]")
+        self.pnl = df["pnl"].to_numpy(dtype=float)
+        self.masks = {}
+        
+        for facet in ("account", "asset", "direction"):
+            codes, values = pd.factorize(df[facet].astype(str))
+            self.masks[facet] = {value: codes == i for i, value in enumerate(values)}
+        
+        reviewed = df["reviewed"].to_numpy(dtype=bool)
+        self.masks["reviewed"] = {"Reviewed": reviewed, "Offen": ~reviewed}
+        self.masks["pnl_sign"] = {"Gewinn": self.pnl > 0, "Verlust": self.pnl < 0, "Break-even": self.pnl == 0}
+        
+        self.masks["tags"] = {}
+        if tag_table is None:
+            tag_table = build_tag_table(df)
+        positions = pd.Series(np.arange(self.size), index=df["id"])
+        for tag, rows in tag_table.groupby("tag")["id"]:
+            tag_mask = np.zeros(self.size, dtype=bool)
+            tag_mask[positions.loc[rows].to_numpy()] = True
+            self.masks["tags"][tag] = tag_mask
+        
+        self.masks["checklist"] = {}
+        for pos, checklist in enumerate(df["checklist"]):
+            for key, checked in checklist.items():
+                if checked:
+                    self.masks["checklist"].setdefault(key, np.zeros(self.size, dtype=bool))[pos] = True
+        
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def values(self, facet):
+        """Alle Werte einer Facette"""
+        return list(self.masks.get(facet, {}).keys())
+    
+    def mask(self, filters):
+        """Boolesche Maske für eine Filter-Kombination (gecacht)"""
+        return self._cached(("mask", self._key(filters)), lambda: self._compute(filters))
+    
+    def counts(self, filters, facet):
+        """Anzahl Trades pro Wert einer Facette, wenn alle anderen Filter aktiv sind"""
+        def compute():
+            if facet == "checklist":
+                # UND-Verknüpfung: jeder weitere Punkt schränkt die aktuelle Auswahl ein
+                base = self.mask(filters)
+            else:
+                base = self.mask({f: v for f, v in filters.items() if f != facet})
+            return {value: int(np.count_nonzero(base & m)) for value, m in self.masks[facet].items()}
+        return self._cached(("counts", facet, self._key(filters)), compute)
+    
+    def _compute(self, filters):
+        mask = np.ones(self.size, dtype=bool)
+        for facet, selected in filters.items():
+            if facet == "date":
+                mask &= (self.dates >= np.datetime64(selected[0])) & (self.dates <= np.datetime64(selected[1]))
+            elif facet == "pnl_range":
+                mask &= (self.pnl >= selected[0]) & (self.pnl <= selected[1])
+            elif facet == "checklist":
+                for key in selected:
+                    mask &= self.masks["checklist"].get(key, np.zeros(self.size, dtype=bool))
+            else:
+                facet_mask = np.zeros(self.size, dtype=bool)
+                for value in selected:
+                    if value in self.masks[facet]:
+                        facet_mask |= self.masks[facet][value]
+                mask &= facet_mask
+        mask.setflags(write=False)
+        return mask
+    
+    def _key(self, filters):
+        return tuple(sorted((f, tuple(v)) for f, v in filters.items()))
+    
+    def _cached(self, key, compute):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        value = compute()
+        with self._lock:
+            self._cache[key] = value
+            while len(self._cache) > self.MAX_CACHED_FILTERS:
+                self._cache.popitem(last=False)
+        return value
+
+
+# --- ANALYSE-WÜRFEL ---
+CUBE_DIMENSIONS = {
+    "asset": "Asset", "account": "Konto", "direction": "Richtung", "weekday": "Wochentag",
+    "hour": "Stunde", "checklist": "Checklisten-Punkt", "tag": "Tag"
+}
+CUBE_MEASURES = {"trades": "Trades", "total_pnl": "PnL", "avg_pnl": "Ø PnL", "win_rate": "Win Rate"}
+# Mehrwertige Dimensionen (ein Trade hat mehrere Punkte/Tags) bekommen eigene, aufgefächerte Würfel
+CUBE_MULTI_DIMENSIONS = ("checklist", "tag")
+CUBE_SCALAR_DIMENSIONS = tuple(d for d in CUBE_DIMENSIONS if d not in CUBE_MULTI_DIMENSIONS)
+WEEKDAY_NAMES = ["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"]
+UNKNOWN_VALUE = "?"
+
+
+def parse_hours(times):
+    """Stunde aus "HH:MM"-Strings (24 für fehlende oder ungültige Uhrzeiten)"""
+    hours = pd.to_numeric(pd.Series(times, dtype=object).astype(str).str.extract(r"^\s*(\d{1,2}):", expand=False), errors="coerce")
+    hours = hours.where((hours >= 0) & (hours < 24))
+    return hours.fillna(24).to_numpy(dtype=np.int64)
+
+
+class AnalyticsCube:
+    """Vorberechnete Aggregate (Anzahl, PnL-Summe, Gewinner) über alle Dimensionen (eine Instanz pro Datenversion).
+    
+    Jede Dimension wird einmal in Integer-Codes übersetzt, jede belegte Kombination ist eine
+    Zelle (dünn besetzt: höchstens so viele Zellen wie Trades). Abfragen filtern und gruppieren
+    nur noch die Zellen. Checklisten-Punkte und Tags stehen in eigenen Würfeln mit einer Zeile
+    pro (Trade, Punkt) bzw. (Trade, Tag) - dort zählt ein Trade in jeder seiner Gruppen.
+    """
+    
+    def __init__(self, df, tag_table=None):
+        self.size = len(df)
+        self.pnl = df["pnl"].to_numpy(dtype=float)
+        self.codes = {}
+        self.labels = {}
+        
+        for dim in ("asset", "account", "direction"):
+            codes, values = pd.factorize(df[dim].astype(str), sort=True)
+            self.codes[dim] = codes.astype(np.int64)
+            self.labels[dim] = list(values)
+        
+        weekdays = pd.Series(get_trade_timestamps(df)).dt.dayofweek
+        self.codes["weekday"] = weekdays.fillna(7).to_numpy(dtype=np.int64)
+        self.labels["weekday"] = WEEKDAY_NAMES + [UNKNOWN_VALUE]
+        self.codes["hour"] = parse_hours(df["time"])
+        self.labels["hour"] = [f"{h:02d}" for h in range(24)] + [UNKNOWN_VALUE]
+        
+        # Mehrwertige Dimensionen als Paare (Zeile im DataFrame, Code)
+        self.pairs = {}
+        checked = [(pos, key) for pos, checklist in enumerate(df["checklist"]) for key, value in checklist.items() if value]
+        positions = np.array([pos for pos, _ in checked], dtype=np.int64)
+        codes, values = pd.factorize(pd.Series([key for _, key in checked], dtype=object), sort=True)
+        self.pairs["checklist"] = (positions, codes.astype(np.int64))
+        self.labels["checklist"] = list(values)
+        
+        if tag_table is None:
+            tag_table = build_tag_table(df)
+        row_of = pd.Series(np.arange(self.size), index=df["id"])
+        positions = tag_table["id"].map(row_of[~row_of.index.duplicated()])
+        codes, values = pd.factorize(tag_table["tag"], sort=True)
+        valid = positions.notna().to_numpy()
+        self.pairs["tag"] = (positions[valid].to_numpy(dtype=np.int64), codes[valid].astype(np.int64))
+        self.labels["tag"] = list(values)
+        
+        self._cubes = {}
+        self._lock = threading.Lock()
+        for multi in ((), ("checklist",), ("tag",)):
+            self._cubes[multi] = self._build(multi)
+    
+    @property
+    def cells(self):
+        """Anzahl belegter Zellen im Würfel ohne mehrwertige Dimensionen"""
+        return len(self._cubes[()]["count"])
+    
+    def values(self, dim):
+        """Alle Werte einer Dimension (in Sortierreihenfolge des Würfels)"""
+        return list(self.labels[dim])
+    
+    def query(self, group_by, filters=None):
+        """Kennzahlen pro Kombination der ``group_by``-Dimensionen, nur Zellen die ``filters`` ({dim: werte}) erfüllen.
+        
+        Mehrwertige Dimensionen können nur gefiltert werden, wenn auch nach ihnen gruppiert wird -
+        sonst würde ein Trade mit mehreren passenden Punkten/Tags mehrfach gezählt.
+        """
+        group_by = list(group_by)
+        filters = {dim: selected for dim, selected in (filters or {}).items() if selected is not None}
+        for dim in filters:
+            if dim in CUBE_MULTI_DIMENSIONS and dim not in group_by:
+                raise ValueError(f"Filter auf '{dim}' nur zusammen mit Gruppierung nach '{dim}'")
+        cube = self._cube(tuple(d for d in CUBE_MULTI_DIMENSIONS if d in group_by))
+        
+        mask = np.ones(len(cube["count"]), dtype=bool)
+        for dim, selected in filters.items():
+            selected = set(selected)
+            wanted = [i for i, value in enumerate(self.labels[dim]) if value in selected]
+            mask &= np.isin(cube["codes"][dim], wanted)
+        
+        count, pnl, wins = cube["count"][mask], cube["pnl"][mask], cube["wins"][mask]
+        if group_by:
+            shape = [len(self.labels[dim]) for dim in group_by]
+            keys = np.ravel_multi_index([cube["codes"][dim][mask] for dim in group_by], shape)
+            groups, inverse = np.unique(keys, return_inverse=True)
+            count = np.bincount(inverse, weights=count, minlength=len(groups))
+            pnl = np.bincount(inverse, weights=pnl, minlength=len(groups))
+            wins = np.bincount(inverse, weights=wins, minlength=len(groups))
+            group_codes = np.unravel_index(groups, shape)
+        else:
+            count, pnl, wins = np.array([count.sum()]), np.array([pnl.sum()]), np.array([wins.sum()])
+            group_codes = []
+        
+        result = pd.DataFrame({dim: np.asarray(self.labels[dim], dtype=object)[codes] for dim, codes in zip(group_by, group_codes)})
+        result["trades"] = count.astype(np.int64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result["total_pnl"] = pnl.round(2)
+            result["avg_pnl"] = (pnl / count).round(2)
+            result["win_rate"] = (wins / count * 100).round(1)
+        return result[result["trades"] > 0].reset_index(drop=True)
+    
+    def _cube(self, multi):
+        with self._lock:
+            cube = self._cubes.get(multi)
+        if cube is None:
+            # Checkliste x Tag wird erst bei Bedarf aufgefächert
+            cube = self._build(multi)
+            with self._lock:
+                self._cubes[multi] = cube
+        return cube
+    
+    def _build(self, multi):
+        rows = np.arange(self.size)
+        multi_codes = {}
+        for dim in multi:
+            positions, codes = self.pairs[dim]
+            if not multi_codes:
+                rows, multi_codes[dim] = positions, codes
+            else:
+                pairs = pd.DataFrame({"row": rows, **multi_codes}).merge(pd.DataFrame({"row": positions, dim: codes}), on="row")
+                rows = pairs["row"].to_numpy()
+                multi_codes = {d: pairs[d].to_numpy() for d in multi}
+        
+        dims = CUBE_SCALAR_DIMENSIONS + multi
+        columns = [self.codes[dim][rows] for dim in CUBE_SCALAR_DIMENSIONS] + [multi_codes[dim] for dim in multi]
+        shape = [max(len(self.labels[dim]), 1) for dim in dims]
+        if not len(rows):
+            empty = np.zeros(0, dtype=np.int64)
+            return {"codes": {dim: empty for dim in dims}, "count": empty, "pnl": np.zeros(0), "wins": empty}
+        
+        cells, inverse = np.unique(np.ravel_multi_index(columns, shape), return_inverse=True)
+        pnl = self.pnl[rows]
+        return {
+            "codes": dict(zip(dims, np.unravel_index(cells, shape))),
+            "count": np.bincount(inverse, minlength=len(cells)),
+            "pnl": np.bincount(inverse, weights=pnl, minlength=len(cells)),
+            "wins": np.bincount(inverse, weights=pnl > 0, minlength=len(cells)).astype(np.int64),
+        }
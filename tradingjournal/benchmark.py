@@ -0,0 +1,89 @@
+"""Benchmark der Datenschicht mit echten oder synthetischen Trades"""
+import json
+import time
+import uuid
+import random
+from datetime import date, timedelta
+
+from . import analytics, charts
+from .checklist import get_default_checklist, get_checklist_keys, encode_checklist
+from .parsing import parse_trades
+
+
+def synthetic_records(n, seed=0):
+    """Erzeugt n zufällige Trades im Format von get_all_records (Checklist als Bitset, Version 1)"""
+    rnd = random.Random(seed)
+    keys = get_checklist_keys(get_default_checklist())
+    assets = ["NQ", "ES", "DAX", "EURUSD", "GOLD"]
+    accounts = ["Privat", "FTMO 12.2025 100K"]
+    tags = ["Setup A", "FOMO", "News", "Revenge", "A+", "Fehler B"]
+    start = date(2020, 1, 1)
+    
+    records = []
+    for i in range(n):
+        day = start + timedelta(days=i * 2000 // max(n, 1))
+        asset = rnd.choice(assets)
+        records.append({
+            "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+            "trade_id": f"{i + 1:05d}{asset}{day.strftime('%d%m%Y')}",
+            "date": day.isoformat(),
+            "time": f"{rnd.randint(8, 21):02d}:{rnd.randint(0, 59):02d}",
+            "account": rnd.choice(accounts),
+            "asset": asset,
+            "direction": rnd.choice(["Long", "Short"]),
+            "pnl": round(rnd.gauss(20, 250), 2),
+            "notes": "",
+            "tags": ", ".join(rnd.sample(tags, rnd.randint(0, 2))),
+            "checklist": encode_checklist({k: rnd.random() < 0.4 for k in keys}, keys),
+            "reviewed": str(rnd.random() < 0.5),
+            "created_at": f"{day.isoformat()} 22:00:00",
+            "images": "[]",
+            "checklist_version": 1
+        })
+    return records, {1: keys}
+
+
+def run_benchmark(records, versions, repeat=3):
+    """Misst die Laufzeit der wichtigsten Schritte, gibt [(schritt, sekunden, info)] zurück"""
+    def measure(func):
+        best, result = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+    
+    results = []
+    
+    elapsed, df = measure(lambda: parse_trades(records, versions))
+    results.append(("parse_trades", elapsed, f"{len(df)} Trades"))
+    
+    elapsed, tag_table = measure(lambda: analytics.build_tag_table(df))
+    results.append(("build_tag_table", elapsed, f"{len(tag_table)} Zeilen"))
+    
+    elapsed, _ = measure(lambda: analytics.compute_tag_stats(df, tag_table))
+    results.append(("compute_tag_stats", elapsed, ""))
+    
+    elapsed, facet_index = measure(lambda: analytics.FacetIndex(df, tag_table))
+    results.append(("FacetIndex", elapsed, ""))
+    
+    filters = {"reviewed": ["Offen"], "direction": ["Short"], "asset": [facet_index.values("asset")[0]]}
+    elapsed, mask = measure(lambda: facet_index._compute(filters))
+    results.append(("Filter-Maske (ungecacht)", elapsed, f"{int(mask.sum())} Treffer"))
+    
+    elapsed, cube = measure(lambda: analytics.AnalyticsCube(df, tag_table))
+    results.append(("AnalyticsCube", elapsed, f"{cube.cells} Zellen"))
+    
+    elapsed, pivot = measure(lambda: cube.query(["weekday", "hour"], {"direction": ["Short"]}))
+    results.append(("Würfel-Abfrage", elapsed, f"{len(pivot)} Zeilen"))
+    
+    elapsed, _ = measure(lambda: analytics.compute_rollups(df, tag_table))
+    results.append(("compute_rollups", elapsed, ""))
+    
+    for name, build in (("build_daily_pnl_chart", charts.build_daily_pnl_chart), ("build_equity_chart", charts.build_equity_chart)):
+        elapsed, fig = measure(lambda: build(df))
+        payload = len(json.dumps(fig.to_plotly_json(), default=str))
+        results.append((name, elapsed, f"{payload / 1024:.0f} KB Plotly-JSON"))
+    
+    return results
@@ -0,0 +1,151 @@
+"""Stale-while-revalidate Cache für langsame Loader (Sheets-Downloads) und ihre Abhängigkeiten"""
+import copy
+import threading
+import time
+
+_MISSING = object()
+
+
+class StaleWhileRevalidate:
+    """Liefert sofort den letzten gültigen Wert und lädt nach Ablauf der TTL im Hintergrund neu.
+    
+    Nur der allererste Aufruf (oder der erste nach ``clear()``) wartet auf den Loader.
+    Pro Cache läuft höchstens ein Refresh gleichzeitig, egal wie viele Sessions zugreifen.
+    """
+    
+    def __init__(self, loader, ttl, copy_value=copy.deepcopy, name="swr"):
+        self.loader = loader
+        self.ttl = ttl
+        self.copy_value = copy_value
+        self.name = name
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # nur für synchrone Erstladungen, get() mit Wert wartet nie darauf
+        self._value = None
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._refreshing = False
+        self._generation = 0
+    
+    def __call__(self):
+        return self.get()
+    
+    def get(self):
+        """Gibt den (ggf. veralteten) Wert zurück und stößt bei Bedarf einen Hintergrund-Refresh an"""
+        value = _MISSING
+        with self._lock:
+            if self._loaded:
+                if time.monotonic() - self._loaded_at > self.ttl and not self._refreshing:
+                    self._start_refresh()
+                value = self._value
+    
+        if value is _MISSING:
+            # Noch kein Wert: synchron laden, parallele Erstaufrufe warten auf denselben Download
+            with self._load_lock:
+                with self._lock:
+                    if self._loaded:
+                        value = self._value
+                    generation = self._generation
+                if value is _MISSING:
+                    value = self.loader()
+                    with self._lock:
+                        if generation == self._generation:
+                            self._store(value)
+    
+        # Kopie außerhalb des Locks: gespeicherte Werte werden nur ersetzt, nie verändert
+        return self.copy_value(value)
+    
+    def seed(self, value):
+        """Setzt einen Startwert (z.B. Snapshot von der Festplatte), der beim ersten Zugriff sofort im Hintergrund aktualisiert wird"""
+        with self._lock:
+            if not self._loaded:
+                self._store(value)
+                self._loaded_at = float("-inf")
+    
+    def clear(self):
+        """Verwirft den Wert (z.B. nach eigenen Schreibzugriffen), der nächste Aufruf lädt synchron"""
+        with self._lock:
+            self._generation += 1
+            self._loaded = False
+            self._value = None
+    
+    def refresh(self, wait=False):
+        """Startet einen Refresh im Hintergrund (ohne den aktuellen Wert zu verwerfen)"""
+        with self._lock:
+            thread = self._start_refresh() if not self._refreshing else None
+        if wait and thread is not None:
+            thread.join()
+    
+    @property
+    def age(self):
+        """Alter des aktuellen Werts in Sekunden (None wenn noch nichts geladen ist)"""
+        with self._lock:
+            return time.monotonic() - self._loaded_at if self._loaded else None
+    
+    def _store(self, value):
+        self._value = value
+        self._loaded = True
+        self._loaded_at = time.monotonic()
+        self.last_error = None
+    
+    def _start_refresh(self):
+        # Aufruf nur mit gehaltenem self._lock
+        self._refreshing = True
+        thread = threading.Thread(
+            target=self._refresh, args=(self._generation,), name=f"{self.name}-refresh", daemon=True
+        )
+        thread.start()
+        return thread
+    
+    def _refresh(self, generation):
+        try:
+            value = self.loader()
+        except Exception as e:
+            # Alten Wert behalten, nächster Versuch erst nach Ablauf der TTL
+            with self._lock:
+                self.last_error = e
+                self._loaded_at = time.monotonic()
+                self._refreshing = False
+            return
+        with self._lock:
+            # Nach clear() gestartete Schreibzugriffe nicht mit älteren Daten überschreiben
+            if generation == self._generation:
+                self._store(value)
+            self._refreshing = False
+
+
+class CacheGraph:
+    """Welche Caches von welchen Datenquellen (Sheets oder anderen Caches) abhängen.
+    
+    Schreibzugriffe melden nur die Quellen, die sie verändert haben. Verworfen werden genau
+    die Caches, die direkt oder über andere Caches davon abhängen - alle anderen bleiben warm.
+    """
+    
+    def __init__(self):
+        self._caches = {}
+        self._dependents = {}
+    
+    def add(self, name, cache, depends_on=()):
+        """Registriert einen Cache (mit ``clear()``) und die Quellen, aus denen er geladen wird"""
+        self._caches[name] = cache
+        for source in depends_on:
+            self._dependents.setdefault(source, []).append(name)
+        return cache
+    
+    def affected(self, *sources):
+        """Namen aller Caches, die von den Quellen abhängen (in Reihenfolge der Abhängigkeiten)"""
+        affected = []
+        pending = list(sources)
+        while pending:
+            for name in self._dependents.get(pending.pop(0), []):
+                if name not in affected:
+                    affected.append(name)
+                    pending.append(name)
+        return affected
+    
+    def invalidate(self, *sources):
+        """Verwirft alle von den Quellen abhängigen Caches und gibt ihre Namen zurück"""
+        affected = self.affected(*sources)
+        for name in affected:
+            self._caches[name].clear()
+        return affected
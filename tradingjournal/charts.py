@@ -0,0 +1,97 @@
+"""Plotly Charts mit Downsampling für lange Historien"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from .parsing import get_trade_timestamps
+
+# Maximale Punkte pro Chart - grob die Breite des Charts in Pixeln.
+# Mehr Punkte sind im Browser nicht sichtbar, machen aber das Plotly-JSON grösser.
+CHART_MAX_POINTS = 1500
+
+
+def downsample_lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: gibt die Indizes der Punkte zurück, die die Form der Linie erhalten"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    
+    # Erster und letzter Punkt bleiben immer erhalten, der Rest wird in Buckets geteilt
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+    
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Durchschnitt des nächsten Buckets als dritter Punkt des Dreiecks
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        
+        # Punkt mit der grössten Dreiecksfläche im aktuellen Bucket wählen
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) -
+            (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+    
+    return indices
+
+
+def downsample_minmax(y, n_buckets):
+    """Min/Max-Bucketing: gibt pro Bucket die Indizes von Minimum und Maximum zurück"""
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    
+    y = np.asarray(y, dtype=float)
+    indices = []
+    for bucket in np.array_split(np.arange(n), n_buckets):
+        values = y[bucket]
+        indices.append(bucket[np.argmin(values)])
+        indices.append(bucket[np.argmax(values)])
+    
+    return np.unique(indices)
+
+
+def build_daily_pnl_chart(df, max_points=CHART_MAX_POINTS):
+    """Baut das Daily-PnL-Chart (Balken, Extremtage bleiben bei langen Historien erhalten)"""
+    daily = df.groupby("date")["pnl"].sum().reset_index()
+    
+    # Bei langen Historien nur die Extremtage pro Bucket behalten
+    keep = downsample_minmax(daily["pnl"].to_numpy(), max_points // 2)
+    daily = daily.iloc[keep]
+    
+    fig = go.Figure(go.Bar(
+        x=daily["date"], y=daily["pnl"],
+        marker=dict(color=daily["pnl"], colorscale=["red", "green"], showscale=True)
+    ))
+    fig.update_layout(title="Daily PnL", xaxis_title="date", yaxis_title="pnl")
+    return fig
+
+
+def build_equity_chart(df, max_points=CHART_MAX_POINTS):
+    """Baut die Equity-Kurve (WebGL)"""
+    trades = pd.DataFrame({
+        "datetime": get_trade_timestamps(df),
+        "pnl": df["pnl"]
+    }).dropna(subset=["datetime"]).sort_values("datetime")
+    trades["equity"] = trades["pnl"].cumsum()
+    
+    # Downsampling auf die Auflösung des Charts
+    x_num = trades["datetime"].to_numpy().astype("datetime64[ns]").astype(np.int64)
+    keep = downsample_lttb(x_num, trades["equity"].to_numpy(), max_points)
+    trades = trades.iloc[keep]
+    
+    fig = go.Figure(go.Scattergl(
+        x=trades["datetime"], y=trades["equity"],
+        mode="lines", line=dict(color="#00cc96")
+    ))
+    fig.update_layout(title="Equity-Kurve", xaxis_title="date", yaxis_title="equity")
+    return fig
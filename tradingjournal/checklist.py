@@ -0,0 +1,83 @@
+"""Checklist Schema und kompakte Kodierung.
+
+Checklisten werden als Bitset über die Schlüssel einer Schema-Version gespeichert,
+z.B. "0x1a5" + checklist_version 3 statt {"m_range": false, "m_long": true, ...}.
+"""
+import json
+
+
+def get_default_checklist():
+    return {
+        "Markt-Status": {
+            "m_range": {"label": "Range Markt", "description": "Der Markt bewegt sich seitwärts.", "image": None, "order": 0},
+            "m_long": {"label": "Long Trend", "description": "Klarer Aufwärtstrend.", "image": None, "order": 1},
+            "m_short": {"label": "Short Trend", "description": "Klarer Abwärtstrend.", "image": None, "order": 2}
+        },
+        "Setup & Play": {
+            "p_vwap": {"label": "VWAP Play", "description": "Trade basiert auf VWAP.", "image": None, "order": 0},
+            "p_manip": {"label": "Manipulation", "description": "Manipulation Zone erkannt.", "image": None, "order": 1},
+            "p_wol": {"label": "WOL", "description": "Week Open Level.", "image": None, "order": 2},
+            "p_mm": {"label": "Market Maker", "description": "Market Maker Setup.", "image": None, "order": 3}
+        },
+        "Einstieg & Risk": {
+            "e_liq": {"label": "Liquidität", "description": "Einstieg nach Liquiditäts-Sweep.", "image": None, "order": 0},
+            "e_val": {"label": "Value Area", "description": "Einstieg in Value Area.", "image": None, "order": 1},
+            "r_ok": {"label": "Risk Mgmt (1-2%)", "description": "Risikomanagement eingehalten.", "image": None, "order": 2}
+        },
+        "Ergebnis": {
+            "winner": {"label": "Winner", "description": "", "image": None, "order": 0},
+            "looser": {"label": "Looser", "description": "", "image": None, "order": 1},
+            "n_plan": {"label": "Nach Plan", "description": "", "image": None, "order": 2}
+        }
+    }
+
+
+def get_checklist_keys(schema):
+    """Alle Checklist-Schlüssel eines Schemas in Anzeigereihenfolge"""
+    keys = []
+    for items in schema.values():
+        keys.extend(k for k, _ in sorted(items.items(), key=lambda x: x[1].get("order", 0)))
+    return keys
+
+
+def next_version_keys(versions, schema):
+    """Schlüssel einer neuen Version, oder None wenn die neueste Version schon passt"""
+    schema_keys = get_checklist_keys(schema)
+    if not versions:
+        return schema_keys
+    
+    latest_keys = versions[max(versions)]
+    if set(latest_keys) == set(schema_keys):
+        return None
+    # Bestehende Bit-Positionen beibehalten, neue Schlüssel hinten anhängen
+    return [k for k in latest_keys if k in schema_keys] + [k for k in schema_keys if k not in latest_keys]
+
+
+def encode_checklist(checklist, keys):
+    """Kodiert ein Checklist-Dict als Hex-Bitset über die Schlüssel einer Version"""
+    mask = 0
+    for bit, key in enumerate(keys):
+        if checklist.get(key):
+            mask |= 1 << bit
+    return hex(mask)
+
+
+def decode_checklist(value, version, versions):
+    """Dekodiert eine gespeicherte Checkliste (Bitset oder altes JSON) zu einem Dict"""
+    if isinstance(value, dict):
+        return value
+    value = str(value) if value is not None else ""
+    
+    if value.startswith("0x"):
+        try:
+            keys = versions[int(version)]
+            mask = int(value, 16)
+        except (KeyError, ValueError, TypeError):
+            return {}
+        return {key: bool(mask >> bit & 1) for bit, key in enumerate(keys)}
+    
+    # Altes Format: JSON-Dict
+    try:
+        return json.loads(value) if value else {}
+    except ValueError:
+        return {}
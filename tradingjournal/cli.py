@@ -0,0 +1,323 @@
+"""Kommandozeile für Batch-Jobs ausserhalb der Streamlit-App.
+
+    python -m tradingjournal export --format csv --output trades.csv
+    python -m tradingjournal import trades.csv
+    python -m tradingjournal rollups --output-dir rollups
+    python -m tradingjournal benchmark --synthetic 20000
+    python -m tradingjournal migrate-checklists
+    python -m tradingjournal migrate-schema
+    python -m tradingjournal gc [--delete]
+    python -m tradingjournal rebuild-upload-index
+    python -m tradingjournal report --period week --format html --format pdf
+    python -m tradingjournal loadtest --sessions 8 --latency 0.1 --rate-limit 0.02
+    python -m tradingjournal ingest --port 8765 [--fake]
+"""
+import os
+import sys
+import json
+import uuid
+import signal
+import argparse
+from datetime import date
+
+import pandas as pd
+
+from . import analytics, benchmark, drive, ids, ingest, reports, sheets
+from .parsing import enable_copy_on_write
+
+
+def load_service_account_info(path=None):
+    """Service-Account aus --credentials, $TRADINGJOURNAL_CREDENTIALS oder .streamlit/secrets.toml (sonst credentials.json)"""
+    path = path or os.environ.get("TRADINGJOURNAL_CREDENTIALS")
+    if path:
+        with open(path) as f:
+            return json.load(f)
+    
+    secrets_file = os.path.join(".streamlit", "secrets.toml")
+    if os.path.exists(secrets_file):
+        import tomllib
+        with open(secrets_file, "rb") as f:
+            return tomllib.load(f).get("gcp_service_account")
+    return None
+
+
+def connect(args):
+    """Verbindet mit Google Sheets, gibt (credentials, spreadsheet) zurück"""
+    credentials = sheets.get_credentials(load_service_account_info(args.credentials))
+    client = sheets.get_google_client(credentials)
+    return credentials, sheets.get_or_create_spreadsheet(client)
+
+
+def to_export_frame(df):
+    """Trades-DataFrame in exportierbare Spalten umwandeln (Checklist als JSON)"""
+    export = df.drop(columns=["tag_list", "datetime_sort"], errors="ignore")
+    if "checklist" in export.columns:
+        export["checklist"] = export["checklist"].map(lambda c: json.dumps(c, ensure_ascii=False))
+    return export
+
+
+def cmd_export(args):
+    _, spreadsheet = connect(args)
+    export = to_export_frame(sheets.load_trades(spreadsheet))
+    output = args.output or sys.stdout
+    if args.format == "json":
+        export.to_json(output, orient="records", date_format="iso", force_ascii=False, indent=2)
+    else:
+        export.to_csv(output, index=False)
+    print(f"{len(export)} Trades exportiert", file=sys.stderr)
+
+
+def cmd_import(args):
+    _, spreadsheet = connect(args)
+    rows = pd.read_csv(args.file, dtype=str, keep_default_na=False).to_dict("records")
+    
+    next_number = ids.get_next_trade_number(sheets.load_trades(spreadsheet))
+    entries = []
+    for row in rows:
+        entry = {k: v for k, v in row.items() if v != ""}
+        entry.setdefault("id", str(uuid.uuid4()))
+        if "trade_id" not in entry:
+            entry["trade_id"] = ids.generate_trade_id(entry.get("asset", "-- Kein Asset --"), entry["date"], next_number)
+            next_number += 1
+        if str(entry.get("checklist", "")).startswith("{"):
+            entry["checklist"] = json.loads(entry["checklist"])
+        entries.append(entry)
+    
+    if args.dry_run:
+        print(f"{len(entries)} Trades würden importiert (Dry-Run)")
+        return
+    count = sheets.append_entries(spreadsheet, entries)
+    print(f"{count} Trades importiert")
+
+
+def cmd_rollups(args):
+    _, spreadsheet = connect(args)
+    rollups = analytics.compute_rollups(sheets.load_trades(spreadsheet))
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name, frame in rollups.items():
+        path = os.path.join(args.output_dir, f"{name}.csv")
+        frame.to_csv(path, index=False)
+        print(f"{path}: {len(frame)} Zeilen")
+
+
+def cmd_benchmark(args):
+    if args.synthetic:
+        records, versions = benchmark.synthetic_records(args.synthetic)
+    else:
+        _, spreadsheet = connect(args)
+        records = sheets.load_trade_records(spreadsheet)
+        versions = sheets.load_checklist_versions(spreadsheet)
+    
+    print(f"{'Schritt':<28} {'ms':>10}  Info")
+    for step, elapsed, info in benchmark.run_benchmark(records, versions, repeat=args.repeat):
+        print(f"{step:<28} {elapsed * 1000:>10.1f}  {info}")
+
+
+def cmd_migrate_checklists(args):
+    _, spreadsheet = connect(args)
+    converted = sheets.migrate_checklists_to_bitmask(spreadsheet)
+    print(f"{converted} Checklisten konvertiert")
+
+
+def cmd_migrate_schema(args):
+    _, spreadsheet = connect(args)
+    headers, applied = sheets.migrate_trades_schema(spreadsheet)
+    if applied:
+        print(f"Trades Sheet auf Schema-Version {max(applied)} migriert (Versionen {', '.join(map(str, applied))})")
+    else:
+        print("Trades Sheet ist aktuell")
+    print(f"{len(headers)} Spalten: {', '.join(headers)}", file=sys.stderr)
+
+
+def cmd_gc(args):
+    credentials, spreadsheet = connect(args)
+    report = drive.collect_orphaned_screenshots(
+        drive.build_drive_service(credentials), spreadsheet,
+        dry_run=not args.delete,
+        upload_index=drive.UploadIndex(),
+        on_progress=lambda state: print(f"  {state['phase']}: {state['scanned']} Dateien, {len(state['deleted'])} gelöscht", file=sys.stderr)
+    )
+    for orphan in report["orphans"]:
+        print(f"{orphan['id']}\t{orphan['name']}\t{orphan['size']}\t{orphan['created']}")
+    print(
+        f"{report['scanned']} Dateien, {len(report['orphans'])} verwaist ({report['orphan_bytes'] / 1024 / 1024:.1f} MB), "
+        f"{'Dry-Run' if report['dry_run'] else str(report['deleted']) + ' gelöscht'}"
+        f"{', ' + str(report['rescued']) + ' inzwischen wieder verwendet' if report['rescued'] else ''}",
+        file=sys.stderr
+    )
+    for fail in report["failed"]:
+        print(f"Fehler {fail['id']}: {fail['error']}", file=sys.stderr)
+
+
+def cmd_upload_index(args):
+    credentials, _ = connect(args)
+    index = drive.UploadIndex()
+    count = index.rebuild(drive.build_drive_service(credentials))
+    print(f"{count} Screenshots im Upload-Index")
+
+
+def cmd_report(args):
+    credentials, spreadsheet = connect(args)
+    jobs = reports.build_report_jobs(
+        sheets.load_trades(spreadsheet), args.period, sheets.load_checklist_schema(spreadsheet),
+        start=args.start, end=args.end
+    )
+    image_cache = None
+    if not args.no_images:
+        image_cache = drive.ImageCache(
+            drive.IMAGE_CACHE_DIR, drive.IMAGE_CACHE_MAX_BYTES, lambda: drive.build_drive_service(credentials)
+        )
+    result = reports.generate_reports(
+        jobs, args.output_dir, args.format or ["html"], image_cache=image_cache,
+        max_workers=args.workers, force=args.force,
+        on_progress=lambda done, total: print(f"  {done}/{total}", file=sys.stderr)
+    )
+    for fail in result["failed"]:
+        print(f"Fehler {fail['key']}: {fail['error']}", file=sys.stderr)
+    print(f"{len(result['written'])} Reports erzeugt, {len(result['skipped'])} unverändert -> {result['index']}")
+
+
+def cmd_loadtest(args):
+    from streamlit import logger
+    from . import loadtest
+    
+    # AppTest ohne Server warnt bei jeder Session über den fehlenden ScriptRunContext
+    logger.set_log_level("error")
+    # AppTest löst relative Pfade gegen die aufrufende Datei auf, nicht gegen das Arbeitsverzeichnis
+    measurements, calls = loadtest.run_load_test(
+        os.path.abspath(args.app), sessions=args.sessions, iterations=args.iterations, trades=args.trades,
+        latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit, think_time=args.think_time, seed=args.seed
+    )
+    summary, totals = loadtest.summarize(measurements, calls)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(summary.to_string())
+        if args.calls:
+            print()
+            print(loadtest.calls_by_type(calls).to_string())
+    print(
+        f"{totals['sessions']} Sessions, {totals['runs']} Reruns in {totals['wall_seconds']:.1f} s, "
+        f"{totals['api_calls']} API-Aufrufe ({totals['background_calls']} im Hintergrund), "
+        f"{totals['rate_limited']}x 429, {totals['errors']} Fehler",
+        file=sys.stderr
+    )
+    for error, count in measurements.loc[measurements["errors"] > 0, "error"].value_counts().items():
+        print(f"{count}x {error}", file=sys.stderr)
+
+
+def cmd_ingest(args):
+    if args.fake:
+        # Lokales Sheets-Double statt Google - zum Testen der Plattform-Skripte
+        from . import loadtest
+        backend = loadtest.FakeBackend(latency=args.fake_latency, jitter=0.0)
+        spreadsheet = sheets.get_or_create_spreadsheet(backend.client)
+    else:
+        _, spreadsheet = connect(args)
+    
+    queue = ingest.IngestQueue(
+        spreadsheet, batch_size=args.batch_size, flush_interval=args.flush_interval,
+        spool_path=None if args.fake else args.spool
+    ).start()
+    server = ingest.create_server(queue, args.host, args.port, token=args.token or os.environ.get("TRADINGJOURNAL_INGEST_TOKEN"))
+    print(f"Ingest auf http://{args.host}:{server.server_port}/fills ({'Sheets-Double' if args.fake else 'Google Sheets'}), Ctrl+C beendet", file=sys.stderr)
+    
+    def interrupt(signum, frame):
+        raise KeyboardInterrupt
+    # Auch beim Beenden durch einen Dienst-Manager (SIGTERM) die Queue noch ins Sheet schreiben
+    signal.signal(signal.SIGTERM, interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        queue.stop()
+    status = queue.status()
+    print(
+        f"{status['received']} Fills empfangen, {status['written']} geschrieben in {status['batches']} Batches, "
+        f"{status['duplicates']} Duplikate, {status['queued']} noch in der Queue",
+        file=sys.stderr
+    )
+    if status["last_error"]:
+        print(f"Letzter Fehler: {status['last_error']}", file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="tradingjournal", description="Trading Journal Batch-Jobs")
+    parser.add_argument("--credentials", help="Service-Account JSON (Standard: $TRADINGJOURNAL_CREDENTIALS, .streamlit/secrets.toml, credentials.json)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    export = commands.add_parser("export", help="Trades als CSV oder JSON exportieren")
+    export.add_argument("--format", choices=["csv", "json"], default="csv")
+    export.add_argument("--output", help="Zieldatei (Standard: stdout)")
+    export.set_defaults(func=cmd_export)
+    
+    imp = commands.add_parser("import", help="Trades aus einer CSV-Datei anhängen (Spalten wie im Trades Sheet)")
+    imp.add_argument("file")
+    imp.add_argument("--dry-run", action="store_true")
+    imp.set_defaults(func=cmd_import)
+    
+    rollups = commands.add_parser("rollups", help="Auswertungen pro Tag/Woche/Monat/Konto/Asset/Tag als CSV berechnen")
+    rollups.add_argument("--output-dir", default="rollups")
+    rollups.set_defaults(func=cmd_rollups)
+    
+    bench = commands.add_parser("benchmark", help="Laufzeit der Datenschicht messen")
+    bench.add_argument("--synthetic", type=int, metavar="N", help="N synthetische Trades statt des Sheets verwenden")
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.set_defaults(func=cmd_benchmark)
+    
+    migrate = commands.add_parser("migrate-checklists", help="JSON-Checklisten zu Bitsets konvertieren")
+    migrate.set_defaults(func=cmd_migrate_checklists)
+    
+    migrate_schema = commands.add_parser("migrate-schema", help="Fehlende Spalten im Trades Sheet anlegen und mit Standardwerten füllen")
+    migrate_schema.set_defaults(func=cmd_migrate_schema)
+    
+    gc = commands.add_parser("gc", help="Verwaiste Screenshots im Drive-Ordner finden (mit --delete löschen)")
+    gc.add_argument("--delete", action="store_true")
+    gc.set_defaults(func=cmd_gc)
+    
+    upload_index = commands.add_parser("rebuild-upload-index", help="Index Inhalts-Hash -> Drive-Datei aus dem Drive-Ordner neu aufbauen")
+    upload_index.set_defaults(func=cmd_upload_index)
+    
+    report = commands.add_parser("report", help="Review-Reports pro Woche oder Monat erzeugen (HTML, PDF mit weasyprint)")
+    report.add_argument("--period", choices=["week", "month"], default="week")
+    report.add_argument("--format", action="append", choices=list(reports.REPORT_FORMATS), help="mehrfach angebbar (Standard: html)")
+    report.add_argument("--from", dest="start", type=date.fromisoformat, metavar="YYYY-MM-DD")
+    report.add_argument("--to", dest="end", type=date.fromisoformat, metavar="YYYY-MM-DD")
+    report.add_argument("--output-dir", default=reports.REPORTS_DIR)
+    report.add_argument("--workers", type=int, help="Prozesse für das PDF-Rendern (Standard: Anzahl CPUs)")
+    report.add_argument("--force", action="store_true", help="auch unveränderte Perioden neu erzeugen")
+    report.add_argument("--no-images", action="store_true", help="ohne Screenshot-Thumbnails")
+    report.set_defaults(func=cmd_report)
+    
+    load = commands.add_parser("loadtest", help="Parallele Sessions der App gegen ein lokales Sheets/Drive-Double (ohne Google)")
+    load.add_argument("--app", default="app.py", help="Pfad zur Streamlit-App (Standard: app.py)")
+    load.add_argument("--sessions", type=int, default=4)
+    load.add_argument("--iterations", type=int, default=10, help="Aktionen pro Session nach dem Öffnen")
+    load.add_argument("--trades", type=int, default=500, help="synthetische Trades im Sheet")
+    load.add_argument("--latency", type=float, default=0.05, help="Sekunden pro API-Aufruf (Mittelwert)")
+    load.add_argument("--jitter", type=float, default=0.02, help="Standardabweichung der Latenz in Sekunden")
+    load.add_argument("--rate-limit", type=float, default=0.0, help="Anteil der API-Aufrufe, die mit 429 abgelehnt werden")
+    load.add_argument("--think-time", type=float, default=0.0, help="max. Pause zwischen zwei Aktionen in Sekunden")
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--calls", action="store_true", help="API-Aufrufe pro Aktion und Methode ausgeben")
+    load.set_defaults(func=cmd_loadtest)
+    
+    ing = commands.add_parser("ingest", help="Lokaler HTTP-Endpunkt für Fills von Trading-Plattformen (POST /fills)")
+    ing.add_argument("--host", default=ingest.DEFAULT_HOST)
+    ing.add_argument("--port", type=int, default=ingest.DEFAULT_PORT)
+    ing.add_argument("--token", help="verlangt 'Authorization: Bearer <token>' (Standard: $TRADINGJOURNAL_INGEST_TOKEN)")
+    ing.add_argument("--batch-size", type=int, default=200, help="Fills pro append_rows-Batch")
+    ing.add_argument("--flush-interval", type=float, default=2.0, help="Sekunden bis wartende Fills spätestens geschrieben werden")
+    ing.add_argument("--spool", default=ingest.SPOOL_FILE, help="Datei für angenommene, noch nicht geschriebene Fills")
+    ing.add_argument("--fake", action="store_true", help="In-Memory Sheets-Double statt Google Sheets")
+    ing.add_argument("--fake-latency", type=float, default=0.05, help="Sekunden pro API-Aufruf des Doubles")
+    ing.set_defaults(func=cmd_ingest)
+    
+    return parser
+
+
+def main(argv=None):
+    enable_copy_on_write()
+    args = build_parser().parse_args(argv)
+    args.func(args)
+    return 0
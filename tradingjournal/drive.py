@@ -0,0 +1,577 @@
+"""Google Drive: Screenshot-Upload, lokaler Bild-Cache und Aufräumen verwaister Screenshots"""
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from io import BytesIO
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from .parsing import parse_images
+
+SCREENSHOTS_FOLDER_ID = "1QF7rcbS8cce_f3CwX48lveSP3ZRU7Is_"
+
+logger = logging.getLogger(__name__)
+
+
+def build_drive_service(credentials):
+    """Erstellt Google Drive Service für Datei-Uploads"""
+    from googleapiclient.discovery import build
+    return build('drive', 'v3', credentials=credentials)
+
+
+# --- UPLOAD (Inhalts-Hash, fortsetzbare Chunks) ---
+UPLOAD_INDEX_FILE = ".drive_upload_index.json"
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Muss ein Vielfaches von 256 KB sein (Vorgabe der Drive API)
+UPLOAD_CHUNK_RETRIES = 3  # Wiederholungen pro Chunk bei 429/5xx (Backoff in googleapiclient)
+UPLOAD_MAX_FAILURES = 5  # Abbrüche pro Upload, nach denen jeweils beim Stand des Servers weitergemacht wird
+UPLOAD_MAX_PENDING = 20  # Abgebrochene Uploads, die pro Prozess zum Fortsetzen aufgehoben werden
+
+
+def compute_content_hash(data):
+    """SHA-256 des Dateiinhalts (Schlüssel für die Duplikat-Erkennung)"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_drive_image_url(file_id):
+    """Direkte Bild-URL für öffentliche Ordner"""
+    return f"https://drive.google.com/uc?export=view&id={file_id}"
+
+
+class UploadIndex:
+    """Lokaler Index Inhalts-Hash -> Drive-Datei, damit Duplikate ohne Drive-Abfrage erkannt werden.
+    
+    Maßgeblich ist die Datei: ``put`` und ``discard_files`` lesen sie neu und ändern nur ihren
+    eigenen Eintrag, damit Löschungen anderer Prozesse (``gc``, ``rebuild-upload-index``) nicht
+    aus dem Speicher eines lange laufenden App-Prozesses zurückgeschrieben werden.
+    
+    Hält ausserdem (pro Prozess) abgebrochene Uploads, die beim nächsten Versuch mit demselben
+    Inhalt ab dem letzten vom Server bestätigten Byte fortgesetzt werden.
+    """
+    
+    def __init__(self, path=UPLOAD_INDEX_FILE):
+        self.path = path
+        self.pending = {}
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._entries = self._read()
+    
+    def _read(self):
+        try:
+            self._mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            self._mtime = None
+            return {}
+        except ValueError:
+            return {}
+    
+    def _reload_if_changed(self):
+        # Aufruf nur mit gehaltenem self._lock
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            self._entries = self._read()
+    
+    def _write(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, content_hash):
+        """Bekannte Drive-Datei ({"id", "name"}) für einen Inhalts-Hash oder None"""
+        with self._lock:
+            self._reload_if_changed()
+            return self._entries.get(content_hash)
+    
+    def put(self, content_hash, file_info):
+        """Merkt sich eine hochgeladene Datei (Einträge anderer Prozesse werden übernommen)"""
+        with self._lock:
+            self._entries = {**self._read(), content_hash: file_info}
+            self._write()
+    
+    def discard_files(self, file_ids):
+        """Entfernt Drive-Dateien aus dem Index, gibt die entfernten Einträge {hash: datei} zurück"""
+        file_ids = set(file_ids)
+        with self._lock:
+            entries = self._read()
+            self._entries = {h: info for h, info in entries.items() if info["id"] not in file_ids}
+            if len(self._entries) != len(entries):
+                self._write()
+        return {h: info for h, info in entries.items() if info["id"] in file_ids}
+    
+    def keep_pending(self, content_hash, request):
+        """Hebt einen abgebrochenen Upload zum Fortsetzen auf (die ältesten fallen raus)"""
+        with self._lock:
+            self.pending.pop(content_hash, None)
+            self.pending[content_hash] = request
+            while len(self.pending) > UPLOAD_MAX_PENDING:
+                self.pending.pop(next(iter(self.pending)))
+    
+    def take_pending(self, content_hash):
+        with self._lock:
+            return self.pending.pop(content_hash, None)
+    
+    def rebuild(self, drive_service, folder_id=SCREENSHOTS_FOLDER_ID):
+        """Baut den Index aus den appProperties der Dateien im Drive-Ordner neu auf, gibt die Anzahl zurück"""
+        entries, page_token = {}, None
+        while True:
+            page = drive_service.files().list(
+                q=f"'{folder_id}' in parents and trashed = false",
+                fields="nextPageToken, files(id, name, appProperties)",
+                pageSize=1000,
+                pageToken=page_token,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True
+            ).execute()
+            for f in page.get("files", []):
+                content_hash = (f.get("appProperties") or {}).get("sha256")
+                if content_hash:
+                    entries.setdefault(content_hash, {"id": f["id"], "name": f.get("name", "")})
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                break
+        with self._lock:
+            self._entries = entries
+            self._write()
+        return len(entries)
+
+
+def drive_file_exists(drive_service, file_id):
+    """Prüft ob eine Drive-Datei noch existiert und nicht im Papierkorb liegt"""
+    from googleapiclient.errors import HttpError
+    try:
+        file = drive_service.files().get(fileId=file_id, fields="id, trashed", supportsAllDrives=True).execute()
+    except HttpError as e:
+        if e.resp.status == 404:
+            return False
+        raise
+    return not file.get("trashed", False)
+
+
+def upload_resumable(request, on_progress=None, max_failures=UPLOAD_MAX_FAILURES):
+    """Lädt eine Datei in Chunks hoch und setzt nach Abbrüchen beim Stand des Servers fort.
+    
+    Nach einem Fehler fragt ``next_chunk`` beim nächsten Aufruf zuerst ab, wie viele Bytes
+    der Server schon hat, statt von vorne zu beginnen.
+    """
+    import httplib2
+    from googleapiclient.errors import HttpError
+    
+    failures = 0
+    response = None
+    while response is None:
+        try:
+            status, response = request.next_chunk(num_retries=UPLOAD_CHUNK_RETRIES)
+        except (HttpError, httplib2.HttpLib2Error, OSError) as e:
+            # 404/410: Upload-Session abgelaufen, Fortsetzen nicht möglich
+            if getattr(getattr(e, "resp", None), "status", None) in (404, 410) or failures >= max_failures:
+                raise
+            failures += 1
+            time.sleep(min(2 ** failures, 30))
+            continue
+        if status is not None and on_progress:
+            on_progress(status.progress())
+    return response
+
+
+def upload_image_to_drive(drive_service, uploaded_file, trade_id, image_number, folder_id=SCREENSHOTS_FOLDER_ID,
+                          index=None, on_progress=None):
+    """Lädt ein Bild zu Google Drive hoch und gibt {"id", "name", "url", "deduplicated"} zurück.
+    
+    Mit ``index`` wird ein Bild mit gleichem Inhalt nicht erneut hochgeladen, sondern die
+    bestehende Drive-Datei verwendet (wenn es sie noch gibt), und abgebrochene Uploads werden
+    fortgesetzt.
+    """
+    from googleapiclient.http import MediaIoBaseUpload
+    
+    try:
+        uploaded_file.seek(0)
+        data = uploaded_file.read()
+        content_hash = compute_content_hash(data)
+        
+        # Gleicher Inhalt schon hochgeladen (anderer Trade, wiederholtes Speichern)
+        existing = index.get(content_hash) if index is not None else None
+        if existing and drive_file_exists(drive_service, existing['id']):
+            return {'id': existing['id'], 'name': existing['name'], 'url': get_drive_image_url(existing['id']), 'deduplicated': True}
+        if existing:
+            # Veralteter Eintrag (Datei z.B. von Hand gelöscht) -> neu hochladen
+            index.discard_files([existing['id']])
+        
+        # Dateiname: TradeID_Bildnummer.extension
+        file_extension = uploaded_file.name.split('.')[-1].lower()
+        filename = f"{trade_id}_{image_number:02d}.{file_extension}"
+        
+        request = index.take_pending(content_hash) if index is not None else None
+        if request is None:
+            # Hash als appProperty, damit sich der Index aus Drive wiederherstellen lässt
+            file_metadata = {
+                'name': filename,
+                'parents': [folder_id],
+                'appProperties': {'sha256': content_hash}
+            }
+            media = MediaIoBaseUpload(
+                BytesIO(data),
+                mimetype=getattr(uploaded_file, "type", None) or 'image/png',
+                chunksize=UPLOAD_CHUNK_SIZE,
+                resumable=True
+            )
+            request = drive_service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id, name',
+                supportsAllDrives=True
+            )
+        
+        try:
+            file = upload_resumable(request, on_progress)
+        except Exception as e:
+            if index is not None and getattr(getattr(e, "resp", None), "status", None) not in (404, 410):
+                index.keep_pending(content_hash, request)
+            raise
+        
+        file_id = file['id']
+        name = file.get('name', filename)
+        if index is not None:
+            index.put(content_hash, {'id': file_id, 'name': name})
+        
+        return {
+            'id': file_id,
+            'name': name,
+            'url': get_drive_image_url(file_id),
+            'deduplicated': False
+        }
+    except Exception as e:
+        raise Exception(f"Upload fehlgeschlagen: {str(e)}")
+
+
+def get_images_for_trade(trade_id, df):
+    """Holt alle Bild-URLs für einen Trade aus dem DataFrame"""
+    if df.empty:
+        return []
+    
+    trade_row = df[df['trade_id'] == trade_id]
+    if trade_row.empty:
+        return []
+    
+    return parse_images(trade_row.iloc[0].get('images', '[]'))
+
+
+# --- BILD-CACHE (lokal) ---
+IMAGE_CACHE_DIR = ".image_cache"
+IMAGE_CACHE_MAX_BYTES = 200 * 1024 * 1024  # 200 MB
+THUMBNAIL_SIZE = (1280, 1280)
+
+
+def get_drive_file_id(img):
+    """Ermittelt die Drive-Datei-ID eines gespeicherten Bildes (auch aus alten Einträgen nur mit URL)"""
+    if not isinstance(img, dict):
+        return None
+    if img.get("id"):
+        return img["id"]
+    match = re.search(r"[?&]id=([\w-]+)", img.get("url", ""))
+    return match.group(1) if match else None
+
+
+def is_valid_file_id(file_id):
+    """Drive-IDs bestehen nur aus Buchstaben, Ziffern, - und _ (alles andere wäre als Dateiname unsicher)"""
+    return isinstance(file_id, str) and re.fullmatch(r"[\w-]+", file_id) is not None
+
+
+class ImageCache:
+    """Grössenbegrenzter LRU-Cache für Drive-Screenshots auf der lokalen Festplatte"""
+    
+    def __init__(self, cache_dir, max_bytes, service_factory):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.service_factory = service_factory
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="image-prefetch")
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def _path(self, file_id, thumbnail):
+        if not is_valid_file_id(file_id):
+            raise ValueError(f"Ungültige Drive-Datei-ID: {file_id}")
+        return os.path.join(self.cache_dir, f"{file_id}.thumb.jpg" if thumbnail else file_id)
+    
+    def get(self, file_id, thumbnail=True):
+        """Gibt die gecachten Bytes zurück oder None (auch bei ungültiger ID)"""
+        if not is_valid_file_id(file_id):
+            logger.warning("Ungültige Drive-Datei-ID im Bild-Cache ignoriert: %r", file_id)
+            return None
+        path = self._path(file_id, thumbnail)
+        if not thumbnail or not os.path.exists(path):
+            path = self._path(file_id, False)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # LRU: Zugriffszeit über mtime festhalten
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+    
+    def put(self, file_id, data):
+        """Speichert ein Bild (und ein Thumbnail) im Cache"""
+        self._write(self._path(file_id, False), data)
+        thumbnail = make_thumbnail(data)
+        if thumbnail is not None:
+            self._write(self._path(file_id, True), thumbnail)
+        self._evict()
+    
+    def fetch(self, file_id, thumbnail=True):
+        """Holt ein Bild aus dem Cache oder lädt es von Google Drive"""
+        data = self.get(file_id, thumbnail)
+        if data is None:
+            self.put(file_id, self._download(file_id))
+            data = self.get(file_id, thumbnail)
+        return data
+    
+    def prefetch(self, file_ids):
+        """Lädt fehlende Bilder im Hintergrund (ungültige IDs werden übersprungen)"""
+        for file_id in file_ids:
+            # Eine kaputte images-Zelle darf das Rendern der Seite nicht abbrechen
+            if not is_valid_file_id(file_id):
+                logger.warning("Ungültige Drive-Datei-ID beim Vorladen übersprungen: %r", file_id)
+                continue
+            with self._lock:
+                if file_id in self._pending or os.path.exists(self._path(file_id, False)):
+                    continue
+                self._pending.add(file_id)
+            self._executor.submit(self._prefetch_one, file_id)
+    
+    def _prefetch_one(self, file_id):
+        try:
+            self.fetch(file_id)
+        except Exception:
+            # Beim nächsten Aufruf wird es erneut versucht, bis dahin zeigt die Ansicht die Drive-URL
+            pass
+        finally:
+            with self._lock:
+                self._pending.discard(file_id)
+    
+    def _download(self, file_id):
+        from googleapiclient.http import MediaIoBaseDownload
+        
+        # Drive Service ist nicht thread-safe -> einer pro Thread
+        if not hasattr(self._local, "service"):
+            self._local.service = self.service_factory()
+        
+        buffer = BytesIO()
+        request = self._local.service.files().get_media(fileId=file_id, supportsAllDrives=True)
+        downloader = MediaIoBaseDownload(buffer, request)
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
+        return buffer.getvalue()
+    
+    def _write(self, path, data):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    
+    def _evict(self):
+        """Löscht die am längsten nicht benutzten Dateien bis das Limit eingehalten ist"""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+def make_thumbnail(data):
+    """Verkleinert ein Bild für die Anzeige, None wenn das nicht möglich ist"""
+    try:
+        from PIL import Image
+        image = Image.open(BytesIO(data))
+        image.thumbnail(THUMBNAIL_SIZE)
+        buffer = BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=85)
+        return buffer.getvalue()
+    except Exception:
+        return None
+
+
+# --- WARTUNG: VERWAISTE SCREENSHOTS ---
+GC_STATE_FILE = ".drive_gc_state.json"
+GC_BATCH_SIZE = 100  # Maximum pro Drive Batch-Request
+GC_MIN_AGE_HOURS = 24  # Jüngere Dateien gehören evtl. zu einem Speichervorgang der gerade läuft
+
+
+def get_referenced_image_ids(spreadsheet):
+    """Holt die Drive-IDs aller Screenshots die von einem Trade referenziert werden (ohne Cache)"""
+    trades_ws = spreadsheet.worksheet("Trades")
+    
+    referenced = set()
+    for row in trades_ws.get_all_records():
+        for img in parse_images(row.get("images")):
+            file_id = get_drive_file_id(img)
+            if file_id:
+                referenced.add(file_id)
+    return referenced
+
+
+def load_gc_state(state_file=GC_STATE_FILE):
+    """Lädt den Stand eines unterbrochenen Aufräum-Laufs"""
+    try:
+        with open(state_file) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_gc_state(state, state_file=GC_STATE_FILE):
+    """Speichert den Stand des Aufräum-Laufs damit er fortgesetzt werden kann"""
+    if state is None:
+        if os.path.exists(state_file):
+            os.remove(state_file)
+        return
+    with open(state_file, "w") as f:
+        json.dump(state, f)
+
+
+def delete_drive_files_batched(drive_service, file_ids):
+    """Löscht Drive-Dateien mit Batch-Requests, gibt (gelöscht, fehlgeschlagen) zurück"""
+    deleted, failed = [], []
+    
+    def on_response(request_id, response, exception):
+        # 404: Datei wurde bereits gelöscht (z.B. im unterbrochenen Lauf)
+        if exception is None or getattr(getattr(exception, "resp", None), "status", None) == 404:
+            deleted.append(request_id)
+        else:
+            failed.append({"id": request_id, "error": str(exception)})
+    
+    for start in range(0, len(file_ids), GC_BATCH_SIZE):
+        batch = drive_service.new_batch_http_request(callback=on_response)
+        for file_id in file_ids[start:start + GC_BATCH_SIZE]:
+            batch.add(drive_service.files().delete(fileId=file_id, supportsAllDrives=True), request_id=file_id)
+        batch.execute()
+    
+    return deleted, failed
+
+
+def collect_orphaned_screenshots(drive_service, spreadsheet, dry_run=True, resume=True, on_progress=None,
+                                 folder_id=SCREENSHOTS_FOLDER_ID, state_file=GC_STATE_FILE, upload_index=None):
+    """Findet (und löscht) Screenshots im Drive-Ordner, die von keinem Trade mehr referenziert werden.
+    
+    Läuft in zwei Phasen: Ordner seitenweise auflisten, dann Waisen in Batches löschen.
+    Nach jeder Seite bzw. jedem Batch wird der Stand gespeichert, ein abgebrochener Lauf
+    macht beim nächsten Aufruf dort weiter. Ein Dry-Run löscht nichts und speichert keinen Stand.
+    Vor jedem Batch werden die Referenzen neu gelesen: Waisen, die seit dem Auflisten wieder
+    verwendet werden (Duplikat-Upload), landen in ``rescued`` statt gelöscht zu werden.
+    """
+    state = load_gc_state(state_file) if resume and not dry_run else None
+    if state is None:
+        state = {
+            "started_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "phase": "list",
+            "page_token": None,
+            "scanned": 0,
+            "orphans": [],
+            "deleted": [],
+            "rescued": [],
+            "failed": []
+        }
+    state.setdefault("rescued", [])
+    
+    if state["phase"] == "list":
+        referenced = get_referenced_image_ids(spreadsheet)
+        min_created = (datetime.now(timezone.utc) - timedelta(hours=GC_MIN_AGE_HOURS)).strftime("%Y-%m-%dT%H:%M:%S")
+        
+        while True:
+            page = drive_service.files().list(
+                q=f"'{folder_id}' in parents and trashed = false",
+                fields="nextPageToken, files(id, name, size, createdTime)",
+                pageSize=1000,
+                pageToken=state["page_token"],
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True
+            ).execute()
+            
+            for f in page.get("files", []):
+                if f["id"] not in referenced and f.get("createdTime", "") < min_created:
+                    state["orphans"].append({
+                        "id": f["id"],
+                        "name": f.get("name", ""),
+                        "size": int(f.get("size", 0)),
+                        "created": f.get("createdTime", "")
+                    })
+            state["scanned"] += len(page.get("files", []))
+            state["page_token"] = page.get("nextPageToken")
+            
+            if not dry_run:
+                save_gc_state(state, state_file)
+            if on_progress:
+                on_progress(state)
+            if not state["page_token"]:
+                break
+        
+        state["phase"] = "delete"
+        if not dry_run:
+            save_gc_state(state, state_file)
+    
+    if not dry_run:
+        # Fehlgeschlagene Löschungen eines unterbrochenen Laufs werden erneut versucht
+        done = set(state["deleted"]) | set(state["rescued"])
+        remaining = [o["id"] for o in state["orphans"] if o["id"] not in done]
+        state["failed"] = []
+        for start in range(0, len(remaining), GC_BATCH_SIZE):
+            batch = remaining[start:start + GC_BATCH_SIZE]
+            # Die Waisenliste kann Tage alt sein. Erst aus dem Upload-Index nehmen (keine neuen
+            # Duplikat-Treffer mehr), dann prüfen ob ein Upload sie seit dem Auflisten wieder verwendet
+            discarded = upload_index.discard_files(batch) if upload_index is not None else {}
+            referenced = get_referenced_image_ids(spreadsheet)
+            state["rescued"].extend(file_id for file_id in batch if file_id in referenced)
+            for content_hash, info in discarded.items():
+                if info["id"] in referenced:
+                    upload_index.put(content_hash, info)
+            
+            deleted, failed = delete_drive_files_batched(drive_service, [i for i in batch if i not in referenced])
+            state["deleted"].extend(deleted)
+            state["failed"].extend(failed)
+            save_gc_state(state, state_file)
+            if on_progress:
+                on_progress(state)
+        
+        # Lauf abgeschlossen - was jetzt noch fehlschlägt, steht weiter in Drive und wird beim
+        # nächsten Lauf wieder als Waise gefunden
+        save_gc_state(None, state_file)
+    
+    return {
+        "dry_run": dry_run,
+        "started_at": state["started_at"],
+        "scanned": state["scanned"],
+        "orphans": state["orphans"],
+        "orphan_bytes": sum(o["size"] for o in state["orphans"]),
+        "deleted": len(state["deleted"]),
+        "rescued": len(state["rescued"]),
+        "failed": state["failed"]
+    }
@@ -0,0 +1,26 @@
+"""Trade-IDs im Format 00001XAUUSD03012026 (laufende Nummer, Asset, Datum)"""
+from datetime import datetime
+
+
+def get_next_trade_number(df):
+    """Ermittelt die nächste fortlaufende Trade-Nummer"""
+    if df.empty or "trade_id" not in df.columns:
+        return 1
+    
+    # Die ersten 5 Zeichen sind die laufende Nummer
+    prefixes = df["trade_id"].astype(str).str[:5]
+    numbers = prefixes[prefixes.str.fullmatch(r"\d{5}")].astype(int)
+    max_num = int(numbers.max()) if len(numbers) else 0
+    
+    return max_num + 1 if max_num > 0 else 1
+
+
+def generate_trade_id(asset, date, number):
+    """Generiert Trade-ID im Format: 00001XAUUSD03012026"""
+    asset_clean = asset.replace(" ", "").replace("-", "").replace("--", "").upper()
+    if asset_clean == "KEINASSET":
+        asset_clean = "NONE"
+    if isinstance(date, str):
+        date = datetime.strptime(date, "%Y-%m-%d")
+    date_str = date.strftime("%d%m%Y")
+    return f"{number:05d}{asset_clean}{date_str}"
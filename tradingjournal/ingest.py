@@ -0,0 +1,371 @@
+"""Lokaler HTTP-Endpunkt, über den Skripte von Trading-Plattformen Fills automatisch eintragen.
+
+    POST /fills    ein Fill als JSON-Objekt oder mehrere als Liste
+    GET  /health   Zustand der Queue
+
+Fills werden sofort mit 202 quittiert, in einer Queue gesammelt und gebündelt mit
+``append_rows`` ins Trades Sheet geschrieben - ein Burst von Fills kostet einen API-Aufruf
+pro Batch statt einen pro Fill. Jeder Fill hat einen Idempotenz-Schlüssel (Header
+``Idempotency-Key``, Feld ``idempotency_key`` oder ein Hash des Fills, siehe ``fill_key``). Er
+steht in der Spalte ``ingest_key``, wiederholt zugestellte Fills werden deshalb auch nach einem
+Neustart verworfen.
+"""
+import os
+import json
+import math
+import hmac
+import time
+import uuid
+import hashlib
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import gspread
+import pandas as pd
+
+from . import ids, sheets
+from .parsing import parse_tags
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+SPOOL_FILE = ".ingest_spool.jsonl"
+MAX_BODY_BYTES = 1024 * 1024
+DEFAULT_ACCOUNT = "-- Kein Konto --"
+DIRECTIONS = {"long": "Long", "buy": "Long", "short": "Short", "sell": "Short"}
+
+
+# --- FILLS ---
+
+def normalize_fill(payload):
+    """Prüft einen Fill und wandelt ihn in Felder des Trades Sheets um (ValueError bei ungültigen Werten)"""
+    if not isinstance(payload, dict):
+        raise ValueError("Fill muss ein JSON-Objekt sein")
+    missing = [f for f in ("asset", "pnl") if payload.get(f) in (None, "")]
+    if missing:
+        raise ValueError(f"Pflichtfelder fehlen: {', '.join(missing)}")
+    
+    # Zeitpunkt als "timestamp" (ISO 8601 oder Unix-Sekunden) oder "date" + "time", ohne Angabe: Empfangszeit
+    raw_time = payload.get("timestamp")
+    if raw_time in (None, ""):
+        parts = [payload.get(f) for f in ("date", "time") if payload.get(f) not in (None, "")]
+        if not all(isinstance(p, str) for p in parts):
+            raise ValueError("date und time müssen Text sein (z.B. 2025-01-03 und 15:31)")
+        raw_time = " ".join(parts)
+    elif isinstance(raw_time, bool) or not isinstance(raw_time, (str, int, float)):
+        raise ValueError(f"Ungültiger Zeitpunkt: {raw_time} (ISO 8601 oder Unix-Sekunden)")
+    try:
+        if isinstance(raw_time, str):
+            timestamp = pd.Timestamp(raw_time) if raw_time else pd.Timestamp.now()
+        else:
+            # Zahlen sind Unix-Sekunden (pd.Timestamp würde sie als Nanosekunden lesen)
+            timestamp = pd.Timestamp(raw_time, unit="s", tz="UTC")
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Ungültiger Zeitpunkt: {raw_time}")
+    if pd.isna(timestamp):
+        raise ValueError(f"Ungültiger Zeitpunkt: {raw_time}")
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(datetime.now().astimezone().tzinfo).tz_localize(None)
+    
+    direction = str(payload.get("direction") or "Long")
+    if direction.lower() not in DIRECTIONS:
+        raise ValueError(f"Ungültige Richtung: {direction} (erlaubt: Long/Short/Buy/Sell)")
+    try:
+        pnl = round(float(payload["pnl"]), 2)
+    except (TypeError, ValueError):
+        raise ValueError(f"Ungültiger PnL: {payload['pnl']}")
+    # NaN/Inf würden jede Summe, Equity-Kurve und das Risiko-Konto des Kontos unbrauchbar machen
+    if not math.isfinite(pnl):
+        raise ValueError(f"Ungültiger PnL: {payload['pnl']}")
+    
+    tags = payload.get("tags") or ""
+    if isinstance(tags, list):
+        tags = ", ".join(str(t) for t in tags)
+    return {
+        "timestamp": timestamp.isoformat(),  # volle Genauigkeit für fill_key, nicht im Sheet
+        "date": timestamp.strftime("%Y-%m-%d"),
+        "time": timestamp.strftime("%H:%M"),
+        "account": str(payload.get("account") or DEFAULT_ACCOUNT),
+        "asset": str(payload["asset"]),
+        "direction": DIRECTIONS[direction.lower()],
+        "pnl": pnl,
+        "tags": ", ".join(parse_tags(str(tags))),
+        "notes": str(payload.get("notes") or ""),
+    }
+
+
+def fill_key(fill):
+    """Idempotenz-Schlüssel aus dem normalisierten Fill (ohne expliziten Schlüssel).
+    
+    Gleich sind zwei Fills nur mit gleichem Inhalt und gleichem Zeitpunkt auf die Sekunde (bzw. so
+    genau wie geschickt). Ohne Zeitpunkt zählt die Empfangszeit - solche Fills sind nie Duplikate,
+    vor doppelt zugestellten schützt dann nur ein expliziter Schlüssel.
+    """
+    canonical = json.dumps(fill, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:32]
+
+
+def is_retryable(error):
+    """Kontingent (429), Serverfehler und Verbindungsabbrüche lohnen einen neuen Versuch"""
+    import requests
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (requests.exceptions.RequestException, OSError))
+
+
+# --- QUEUE ---
+
+class IngestQueue:
+    """Sammelt Fills und schreibt sie gebündelt ins Trades Sheet (eigener Hintergrund-Thread).
+    
+    Geschrieben wird, sobald ``batch_size`` Fills warten oder spätestens nach ``flush_interval``
+    Sekunden. Angenommene Fills stehen zusätzlich in der Spool-Datei, bis sie im Sheet sind, und
+    gehen so auch bei einem Absturz nicht verloren.
+    """
+    
+    def __init__(self, spreadsheet, batch_size=200, flush_interval=2.0, chunk_rows=500,
+                 max_retries=5, retry_delay=1.0, spool_path=SPOOL_FILE):
+        self.spreadsheet = spreadsheet
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.chunk_rows = chunk_rows
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.spool_path = spool_path
+        self.stats = {"received": 0, "written": 0, "duplicates": 0, "batches": 0, "retries": 0, "last_error": None}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._pending = []  # [(schlüssel, fill)]
+        self._pending_keys = set()
+        self._known_keys = set()
+        self._unconfirmed = False  # letzter Schreibversuch fehlgeschlagen, evtl. trotzdem im Sheet
+    
+    def start(self):
+        """Liest Header, Checklist-Version und bekannte Schlüssel einmal und startet den Flush-Thread"""
+        self.headers = sheets.ensure_trades_headers(self.spreadsheet)
+        self.trades_ws = self.spreadsheet.worksheet("Trades")
+        self.checklist_version, self.checklist_keys = sheets.resolve_checklist_encoding(self.spreadsheet)
+        self._known_keys = self._load_sheet_keys()
+        
+        # Fills aus der Spool-Datei, die beim letzten Lauf nicht mehr geschrieben wurden
+        for key, fill in self._read_spool():
+            if key not in self._known_keys and key not in self._pending_keys:
+                self._pending.append((key, fill))
+                self._pending_keys.add(key)
+        self._write_spool()
+        
+        self._thread = threading.Thread(target=self._run, name="ingest-flush", daemon=True)
+        self._thread.start()
+        return self
+    
+    def submit(self, payloads, keys=None):
+        """Nimmt Fills an (alle oder keiner bei ungültigen Fills), gibt [(schlüssel, "queued"|"duplicate")] zurück"""
+        keys = keys or [None] * len(payloads)
+        prepared = []
+        for payload, key in zip(payloads, keys):
+            fill = normalize_fill(payload)
+            prepared.append((str(key or payload.get("idempotency_key") or fill_key(fill)), fill))
+        results = []
+        with self._lock:
+            accepted = []
+            for key, fill in prepared:
+                self.stats["received"] += 1
+                if key in self._known_keys or key in self._pending_keys:
+                    self.stats["duplicates"] += 1
+                    results.append((key, "duplicate"))
+                    continue
+                self._pending.append((key, fill))
+                self._pending_keys.add(key)
+                accepted.append((key, fill))
+                results.append((key, "queued"))
+            self._append_spool(accepted)
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+        return results
+    
+    def flush(self):
+        """Schreibt alle wartenden Fills in Batches, gibt die Anzahl geschriebener Fills zurück"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._pending[:self.batch_size]
+                if not batch:
+                    return written
+                try:
+                    self._write_with_retries(batch)
+                except Exception as e:
+                    # Fills bleiben in der Queue, nächster Versuch beim nächsten Flush
+                    self.stats["last_error"] = f"{type(e).__name__}: {e}"
+                    return written
+                with self._lock:
+                    del self._pending[:len(batch)]
+                    self._pending_keys.difference_update(key for key, _ in batch)
+                    self._known_keys.update(key for key, _ in batch)
+                    self.stats["written"] += len(batch)
+                    self.stats["batches"] += 1
+                    self.stats["last_error"] = None
+                    self._write_spool()
+                written += len(batch)
+    
+    def stop(self, timeout=None):
+        """Beendet den Flush-Thread nach einem letzten Flush"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+    
+    def status(self):
+        with self._lock:
+            return {**self.stats, "queued": len(self._pending)}
+    
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+        self.flush()
+    
+    def _write_with_retries(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                # Nach einem Fehler kann ein Teil schon im Sheet stehen (z.B. Timeout nach dem Schreiben),
+                # auch wenn der Fehler schon im letzten Flush war - der Batch steht dann noch vorne in der Queue
+                self._write_batch(batch, recheck_keys=attempt > 0 or self._unconfirmed)
+                self._unconfirmed = False
+                return
+            except Exception as e:
+                self._unconfirmed = True
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.stats["retries"] += 1
+                time.sleep(self.retry_delay * 2 ** attempt)
+    
+    def _write_batch(self, batch, recheck_keys=False):
+        if recheck_keys:
+            written_keys = self._load_sheet_keys()
+            batch = [(key, fill) for key, fill in batch if key not in written_keys]
+        
+        # Nummern wie in der App: fortlaufend ab der höchsten Trade-ID im Sheet (auch von Hand erfasste)
+        trade_ids = self.trades_ws.col_values(self.headers.index("trade_id") + 1)[1:]
+        number = ids.get_next_trade_number(pd.DataFrame({"trade_id": trade_ids}))
+        rows = []
+        for key, fill in batch:
+            entry = {
+                **fill, "id": str(uuid.uuid4()), "ingest_key": key, "checklist": {}, "reviewed": False,
+                "trade_id": ids.generate_trade_id(fill["asset"], fill["date"], number),
+            }
+            number += 1
+            sheets.prepare_entry(entry, self.checklist_keys, self.checklist_version)
+            entry.setdefault("row_version", 1)
+            rows.append([str(entry.get(h, "")) for h in self.headers])
+        
+        for start in range(0, len(rows), self.chunk_rows):
+            self.trades_ws.append_rows(rows[start:start + self.chunk_rows])
+    
+    def _load_sheet_keys(self):
+        return set(self.trades_ws.col_values(self.headers.index("ingest_key") + 1)[1:]) - {""}
+    
+    def _read_spool(self):
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return []
+        entries = []
+        with open(self.spool_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    entries.append((record["key"], record["fill"]))
+                except (ValueError, KeyError):
+                    # Unvollständige letzte Zeile nach einem Absturz
+                    continue
+        return entries
+    
+    def _append_spool(self, entries):
+        # Aufruf nur mit gehaltenem self._lock
+        if not self.spool_path or not entries:
+            return
+        with open(self.spool_path, "a") as f:
+            for key, fill in entries:
+                f.write(json.dumps({"key": key, "fill": fill}) + "\n")
+    
+    def _write_spool(self):
+        # Aufruf nur mit gehaltenem self._lock (oder vor dem Start)
+        if not self.spool_path:
+            return
+        tmp_path = f"{self.spool_path}.tmp"
+        with open(tmp_path, "w") as f:
+            for key, fill in self._pending:
+                f.write(json.dumps({"key": key, "fill": fill}) + "\n")
+        os.replace(tmp_path, self.spool_path)
+
+
+# --- HTTP ---
+
+def make_handler(queue, token=None):
+    """Request-Handler für ``queue`` (mit ``token`` nur mit Header ``Authorization: Bearer <token>``)"""
+    
+    class IngestHandler(BaseHTTPRequestHandler):
+        server_version = "TradingJournalIngest/1"
+        
+        def do_POST(self):
+            if self.path.rstrip("/") != "/fills":
+                return self._reply(404, {"error": "Unbekannter Pfad"})
+            if token and not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {token}"):
+                return self._reply(401, {"error": "Token fehlt oder ist falsch"})
+            
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                # read(-1) würde bis zum Schließen der Verbindung blockieren
+                return self._reply(400, {"error": "Ungültiger Content-Length"})
+            if length > MAX_BODY_BYTES:
+                return self._reply(413, {"error": f"Maximal {MAX_BODY_BYTES} Bytes pro Request"})
+            try:
+                payload = json.loads(self.rfile.read(length) or b"null")
+            except ValueError:
+                return self._reply(400, {"error": "Kein gültiges JSON"})
+            
+            payloads = payload if isinstance(payload, list) else [payload]
+            header_key = self.headers.get("Idempotency-Key")
+            if header_key and len(payloads) != 1:
+                return self._reply(400, {"error": "Idempotency-Key gilt nur für einen Fill, bei Listen idempotency_key pro Fill"})
+            try:
+                results = queue.submit(payloads, [header_key] if header_key else None)
+            except ValueError as e:
+                return self._reply(400, {"error": str(e)})
+            self._reply(202, {"results": [{"idempotency_key": key, "status": status} for key, status in results]})
+        
+        def do_GET(self):
+            if self.path.rstrip("/") != "/health":
+                return self._reply(404, {"error": "Unbekannter Pfad"})
+            self._reply(200, queue.status())
+        
+        def log_message(self, format, *args):
+            # Keine Logzeile pro Fill - bei einem Burst wären das tausende
+            pass
+        
+        def _reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+    
+    return IngestHandler
+
+
+class IngestServer(ThreadingHTTPServer):
+    # Standard-Backlog ist 5 - bei einem Burst paralleler Skripte würden Verbindungen abgewiesen
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def create_server(queue, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None):
+    """HTTP-Server (ein Thread pro Request), ``serve_forever()`` startet ihn"""
+    return IngestServer((host, port), make_handler(queue, token))
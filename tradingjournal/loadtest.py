@@ -0,0 +1,539 @@
+"""Lasttest: mehrere Streamlit-Sessions gleichzeitig gegen ein lokales Sheets/Drive-Double.
+
+Jede Session ist ein ``AppTest`` der echten ``app.py`` und spielt typische Abläufe durch
+(Trade erfassen, suchen, Review-Status umschalten, Dashboard). Das Double ersetzt gspread und
+die Drive API im Prozess, verzögert jeden API-Aufruf und antwortet zufällig mit 429. Gemessen
+wird die Dauer jedes Reruns und wie viele API-Aufrufe er ausgelöst hat.
+
+Braucht Streamlit (``streamlit.testing``), aber keine Google-Credentials.
+"""
+import json
+import time
+import random
+import tempfile
+import threading
+from functools import partial
+from contextlib import contextmanager, nullcontext
+from unittest import mock
+
+import pandas as pd
+import gspread
+from gspread.utils import a1_to_rowcol, numericise_all
+
+from . import benchmark, drive, sheets, snapshot
+from .schema import TRADES_HEADERS
+
+ACTIONS = ["open", "add_trade", "search", "toggle_reviewed", "dashboard"]
+# Aufrufe, die das Sheet verändern (alles andere zählt als Lesezugriff)
+WRITE_CALLS = {"update", "batch_update", "append_row", "append_rows", "delete_rows", "clear", "update_title",
+               "add_worksheet", "create", "files.create", "files.delete"}
+SESSION_KEY = "loadtest_session"
+SEARCH_TERMS = ["NQ", "FOMO", "Setup A", "DAX", "News"]
+
+
+# --- SHEETS/DRIVE-DOUBLE ---
+
+class FakeBackend:
+    """Gemeinsamer Zustand des Doubles: Latenz, 429-Quote und Zähler aller API-Aufrufe"""
+    
+    def __init__(self, latency=0.05, jitter=0.02, rate_limit=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.calls = []  # (session, aufruf, 429)
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.client = FakeClient(self)
+        self.drive = FakeDrive(self)
+    
+    def call(self, name):
+        """Simuliert einen API-Aufruf: zählen, warten, ggf. mit 429 ablehnen"""
+        with self._lock:
+            delay = max(0.0, self._random.gauss(self.latency, self.jitter)) if self.latency else 0.0
+            limited = self._random.random() < self.rate_limit
+            self.calls.append((current_session(), name, limited))
+        if delay:
+            time.sleep(delay)
+        if limited:
+            raise rate_limit_error()
+    
+    def reset_calls(self):
+        with self._lock:
+            self.calls = []
+    
+    def install(self):
+        """Leitet sheets/drive auf das Double um, gibt eine Funktion zum Zurücksetzen zurück"""
+        originals = (sheets.get_credentials, sheets.get_google_client, drive.build_drive_service)
+        sheets.get_credentials = lambda *args, **kwargs: None
+        sheets.get_google_client = lambda credentials: self.client
+        drive.build_drive_service = lambda credentials: self.drive
+        
+        def uninstall():
+            sheets.get_credentials, sheets.get_google_client, drive.build_drive_service = originals
+        return uninstall
+
+
+def current_session():
+    """Nummer der Session, deren Script-Thread gerade läuft (None für Hintergrund-Threads)"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return None
+    try:
+        return ctx.session_state[SESSION_KEY]
+    except KeyError:
+        return None
+
+
+def rate_limit_error():
+    """APIError wie bei überschrittenem Sheets-Kontingent"""
+    import requests
+    response = requests.Response()
+    response.status_code = 429
+    response._content = json.dumps({"error": {
+        "code": 429, "status": "RESOURCE_EXHAUSTED",
+        "message": "Quota exceeded (simuliert)"
+    }}).encode()
+    return gspread.exceptions.APIError(response)
+
+
+class FakeWorksheet:
+    """Worksheet im Speicher mit den gspread-Methoden, die das Journal benutzt"""
+    
+    def __init__(self, backend, title):
+        self.backend = backend
+        self.title = title
+        self.rows = []
+        self._lock = threading.RLock()
+    
+    def _ensure(self, row, col):
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        while len(cells) < col:
+            cells.append("")
+    
+    def _write(self, range_name, values):
+        start = range_name.split(":")[0]
+        if start.isalpha():
+            start += "1"
+        row0, col0 = a1_to_rowcol(start)
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                self._ensure(row0 + i, col0 + j)
+                self.rows[row0 + i - 1][col0 + j - 1] = "" if value is None else str(value)
+    
+    def _values(self):
+        width = max((len(r) for r in self.rows), default=0)
+        return [list(r) + [""] * (width - len(r)) for r in self.rows]
+    
+    def update_title(self, title):
+        self.backend.call("update_title")
+        self.title = title
+    
+    def update(self, range_name, values=None, **kwargs):
+        if not isinstance(range_name, str):
+            range_name, values = values, range_name
+        self.backend.call("update")
+        with self._lock:
+            self._write(range_name, values)
+    
+    def batch_update(self, data, **kwargs):
+        self.backend.call("batch_update")
+        with self._lock:
+            for item in data:
+                self._write(item["range"], item["values"])
+    
+    def get_all_values(self, **kwargs):
+        self.backend.call("get_all_values")
+        with self._lock:
+            return self._values()
+    
+    def get_all_records(self, **kwargs):
+        self.backend.call("get_all_records")
+        with self._lock:
+            values = self._values()
+        if len(values) < 2:
+            return []
+        return [dict(zip(values[0], numericise_all(row))) for row in values[1:]]
+    
+    def row_values(self, row):
+        self.backend.call("row_values")
+        with self._lock:
+            values = list(self.rows[row - 1]) if row <= len(self.rows) else []
+        while values and values[-1] == "":
+            values.pop()
+        return values
+    
+    def col_values(self, col):
+        self.backend.call("col_values")
+        with self._lock:
+            values = [r[col - 1] if len(r) >= col else "" for r in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+    
+    def acell(self, label):
+        self.backend.call("acell")
+        row, col = a1_to_rowcol(label)
+        with self._lock:
+            value = self.rows[row - 1][col - 1] if row <= len(self.rows) and col <= len(self.rows[row - 1]) else None
+        return gspread.Cell(row, col, value)
+    
+    def append_row(self, values, **kwargs):
+        self.backend.call("append_row")
+        with self._lock:
+            self.rows.append(["" if v is None else str(v) for v in values])
+    
+    def append_rows(self, values, **kwargs):
+        self.backend.call("append_rows")
+        with self._lock:
+            self.rows.extend(["" if v is None else str(v) for v in row] for row in values)
+    
+    def delete_rows(self, start_index, end_index=None):
+        self.backend.call("delete_rows")
+        with self._lock:
+            del self.rows[start_index - 1:end_index or start_index]
+    
+    def clear(self):
+        self.backend.call("clear")
+        with self._lock:
+            self.rows = []
+
+
+class FakeSpreadsheet:
+    def __init__(self, backend):
+        self.backend = backend
+        self.worksheets = [FakeWorksheet(backend, "Sheet1")]
+    
+    @property
+    def sheet1(self):
+        return self.worksheets[0]
+    
+    def worksheet(self, title):
+        self.backend.call("worksheet")
+        for ws in self.worksheets:
+            if ws.title == title:
+                return ws
+        raise gspread.WorksheetNotFound(title)
+    
+    def add_worksheet(self, title, rows=100, cols=10, **kwargs):
+        self.backend.call("add_worksheet")
+        ws = FakeWorksheet(self.backend, title)
+        self.worksheets.append(ws)
+        return ws
+
+
+class FakeClient:
+    def __init__(self, backend):
+        self.backend = backend
+        self.spreadsheet = None
+    
+    def open(self, name):
+        self.backend.call("open")
+        if self.spreadsheet is None:
+            raise gspread.SpreadsheetNotFound(name)
+        return self.spreadsheet
+    
+    def create(self, name, **kwargs):
+        self.backend.call("create")
+        self.spreadsheet = FakeSpreadsheet(self.backend)
+        return self.spreadsheet
+
+
+class FakeDriveRequest:
+    def __init__(self, run):
+        self.run = run
+    
+    def execute(self, **kwargs):
+        return self.run()
+    
+    def next_chunk(self, num_retries=0):
+        # Uploads gehen in einem Chunk durch
+        return None, self.run()
+
+
+class FakeDriveFiles:
+    def __init__(self, fake_drive):
+        self.fake_drive = fake_drive
+    
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        def run():
+            self.fake_drive.backend.call("files.create")
+            with self.fake_drive._lock:
+                self.fake_drive.created += 1
+                file_id = f"fake{self.fake_drive.created}"
+                self.fake_drive.stored[file_id] = {"id": file_id, **(body or {})}
+            return {"id": file_id, "name": (body or {}).get("name", "")}
+        return FakeDriveRequest(run)
+    
+    def list(self, pageToken=None, pageSize=100, **kwargs):
+        def run():
+            self.fake_drive.backend.call("files.list")
+            with self.fake_drive._lock:
+                files = list(self.fake_drive.stored.values())
+            start = int(pageToken or 0)
+            page = {"files": [dict(f) for f in files[start:start + pageSize]]}
+            if start + pageSize < len(files):
+                page["nextPageToken"] = str(start + pageSize)
+            return page
+        return FakeDriveRequest(run)
+    
+    def get(self, fileId, **kwargs):
+        def run():
+            self.fake_drive.backend.call("files.get")
+            with self.fake_drive._lock:
+                stored = self.fake_drive.stored.get(fileId)
+            if stored is None:
+                import httplib2
+                from googleapiclient.errors import HttpError
+                raise HttpError(httplib2.Response({"status": 404}), b"File not found")
+            return {"id": fileId, "name": stored.get("name", ""), "trashed": False}
+        return FakeDriveRequest(run)
+    
+    def delete(self, fileId, **kwargs):
+        def run():
+            self.fake_drive.backend.call("files.delete")
+            with self.fake_drive._lock:
+                self.fake_drive.stored.pop(fileId, None)
+        return FakeDriveRequest(run)
+
+
+class FakeDrive:
+    """Drive-Service im Speicher (Upload, Abfragen, Auflisten, Löschen; keine Downloads)"""
+    
+    def __init__(self, backend):
+        self.backend = backend
+        self.stored = {}  # Nicht "files": das würde die Methode files() verdecken
+        self.created = 0  # Zähler für IDs (nach Löschungen sonst doppelt vergeben)
+        self._lock = threading.Lock()
+    
+    def files(self):
+        return FakeDriveFiles(self)
+
+
+def seed_backend(backend, trades=500, seed=0):
+    """Legt das Spreadsheet wie beim ersten Start an und füllt es mit synthetischen Trades (ohne Latenz und 429)"""
+    settings = backend.latency, backend.rate_limit
+    backend.latency, backend.rate_limit = 0.0, 0.0
+    try:
+        spreadsheet = sheets.get_or_create_spreadsheet(backend.client)
+        records, _ = benchmark.synthetic_records(trades, seed=seed)
+        rows = [[str(record.get(h, 1 if h == "row_version" else "")) for h in TRADES_HEADERS] for record in records]
+        spreadsheet.worksheet("Trades").append_rows(rows)
+    finally:
+        backend.latency, backend.rate_limit = settings
+    backend.reset_calls()
+    return spreadsheet
+
+
+# --- SESSIONS ---
+
+class Session:
+    """Eine simulierte Browser-Session (ein AppTest) mit den Abläufen des Lasttests"""
+    
+    def __init__(self, number, app_path, timeout=120):
+        from streamlit.testing.v1 import AppTest
+        self.number = number
+        self.random = random.Random(number)
+        self.app = AppTest.from_file(app_path, default_timeout=timeout)
+        self.app.secrets["app_password"] = "loadtest"
+        self.app.secrets["gcp_service_account"] = {"type": "service_account"}
+        self.app.session_state["password_correct"] = True
+        self.app.session_state[SESSION_KEY] = number
+    
+    def open(self):
+        self.app.run()
+    
+    def add_trade(self):
+        self.app.number_input(key="input_pnl").set_value(round(self.random.gauss(20, 200), 2))
+        self.app.text_input(key="input_tags").input(self.random.choice(SEARCH_TERMS[1:]))
+        next(b for b in self.app.button if "Speichern" in b.label).click()
+        self.app.run()
+    
+    def search(self):
+        self.app.text_input(key="search_query").input(self.random.choice(SEARCH_TERMS))
+        self.app.run()
+    
+    def toggle_reviewed(self):
+        buttons = [b for b in self.app.button if str(b.key).startswith("br_")]
+        if not buttons:
+            self.app.run()
+            return
+        self.random.choice(buttons).click()
+        self.app.run()
+    
+    def dashboard(self):
+        # Alle Tabs werden bei jedem Rerun gerendert - eine Eingabe im Dashboard löst einen vollen Rerun aus
+        radio = self.app.radio(key="report_period")
+        radio.set_value("Monat" if radio.value == "Woche" else "Woche")
+        self.app.run()
+    
+    def errors(self):
+        """Fehler des letzten Reruns (Exceptions und st.error)"""
+        return [e.message for e in self.app.exception] + [e.value for e in self.app.error]
+
+
+@contextmanager
+def shared_app_runtime():
+    """Lässt mehrere AppTests gleichzeitig laufen wie Sessions eines Servers.
+    
+    AppTest setzt pro Lauf eine eigene Runtime als globale Instanz und die Option
+    ``global.appTest`` (und setzt beides danach zurück, auch wenn andere Läufe noch laufen) und
+    kompiliert das Script jedes Mal neu. Hier nutzen alle Läufe die erste Runtime, die Option
+    bleibt während des ganzen Tests gesetzt, und der Bytecode wird nur einmal kompiliert -
+    parallele Kompilierungen scheitern unter Python 3.11. Geloggt werden nur Fehler, nicht die
+    Deprecation-Hinweise jedes Reruns.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test
+    from streamlit.testing.v1.util import patch_config_options
+    
+    shared = {}
+    script_cache = ScriptCache()
+    get_bytecode = ScriptCache.get_bytecode
+    
+    def instance(cls):
+        if cls._instance is not None:
+            shared.setdefault("runtime", cls._instance)
+        if "runtime" not in shared:
+            raise RuntimeError("Runtime hasn't been created!")
+        return shared["runtime"]
+    
+    with mock.patch.object(Runtime, "instance", classmethod(instance)), \
+            mock.patch.object(Runtime, "exists", classmethod(lambda cls: "runtime" in shared or cls._instance is not None)), \
+            mock.patch.object(ScriptCache, "get_bytecode", lambda self, path: get_bytecode(script_cache, path)), \
+            patch_config_options({"global.appTest": True, "logger.level": "error"}), \
+            mock.patch.object(app_test, "patch_config_options", lambda options: nullcontext()):
+        yield
+
+
+def default_flow(rnd):
+    """Nächste Aktion einer Session: meist suchen und lesen, ab und zu schreiben"""
+    return rnd.choices(
+        ["add_trade", "search", "toggle_reviewed", "dashboard"],
+        weights=[2, 4, 2, 3]
+    )[0]
+
+
+def run_session(session, backend, iterations, results, lock, think_time=0.0, flow=default_flow):
+    """Spielt ``iterations`` Aktionen einer Session durch und hängt die Messungen an ``results`` an"""
+    errors = []
+    for i in range(iterations + 1):
+        # Nach einem Fehler fehlen die Widgets der Seite - wie ein Benutzer neu laden
+        action = "open" if i == 0 or errors else flow(session.random)
+        before = len(backend.calls)
+        start = time.perf_counter()
+        try:
+            getattr(session, action)()
+            errors = session.errors()
+        except Exception as e:
+            errors = [f"{type(e).__name__}: {e}"]
+        elapsed = time.perf_counter() - start
+        with lock:
+            results.append({
+                "session": session.number, "action": action, "seconds": elapsed,
+                "errors": len(errors), "error": errors[0] if errors else "", "calls_before": before,
+            })
+        if think_time:
+            time.sleep(session.random.uniform(0, think_time))
+
+
+def run_load_test(app_path, sessions=4, iterations=10, trades=500, latency=0.05, jitter=0.02, rate_limit=0.0,
+                  think_time=0.0, seed=0):
+    """Startet ``sessions`` parallele Sessions, gibt (messungen, api_aufrufe) als DataFrames zurück"""
+    import streamlit as st
+    
+    backend = FakeBackend(latency=latency, jitter=jitter, rate_limit=rate_limit, seed=seed)
+    seed_backend(backend, trades, seed)
+    # Eigener Snapshot, damit weder der Snapshot des echten Journals geladen noch überschrieben wird
+    tmp_dir = tempfile.TemporaryDirectory(prefix="tradingjournal-loadtest-")
+    snapshot_path = f"{tmp_dir.name}/{snapshot.SNAPSHOT_FILE}"
+    uninstall = backend.install()
+    results, lock = [], threading.Lock()
+    try:
+        with shared_app_runtime(), \
+                mock.patch.object(snapshot, "load_snapshot", partial(snapshot.load_snapshot, snapshot_path)), \
+                mock.patch.object(snapshot, "update_snapshot", partial(snapshot.update_snapshot, path=snapshot_path)):
+            # Prozessweite Caches der App gehören sonst noch zum vorherigen Lauf bzw. zum echten Sheet
+            st.cache_resource.clear()
+            st.cache_data.clear()
+            threads = [
+                threading.Thread(
+                    target=run_session, name=f"loadtest-{number}",
+                    args=(Session(number, app_path), backend, iterations, results, lock, think_time)
+                )
+                for number in range(sessions)
+            ]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall = time.perf_counter() - started
+            st.cache_resource.clear()
+            st.cache_data.clear()
+    finally:
+        uninstall()
+        tmp_dir.cleanup()
+    
+    measurements = pd.DataFrame(results)
+    calls = pd.DataFrame(backend.calls, columns=["session", "call", "rate_limited"])
+    measurements.attrs["wall_seconds"] = wall
+    return measurements, attribute_calls(measurements, calls)
+
+
+def attribute_calls(measurements, calls):
+    """Ordnet jeden API-Aufruf der Aktion zu, die seine Session gerade ausgeführt hat"""
+    calls = calls.copy()
+    calls["position"] = range(len(calls))
+    calls["action"] = "hintergrund"
+    calls["run"] = float("nan")
+    for session, group in measurements.groupby("session"):
+        group = group.sort_values("calls_before")
+        mask = (calls["session"] == session).to_numpy()
+        # Letzte Aktion der Session, die vor dem Aufruf begonnen hat
+        idx = group["calls_before"].searchsorted(calls.loc[mask, "position"], side="right") - 1
+        calls.loc[mask, "action"] = group["action"].to_numpy()[idx.clip(0)]
+        calls.loc[mask, "run"] = group.index.to_numpy()[idx.clip(0)]
+    calls["write"] = calls["call"].isin(WRITE_CALLS)
+    return calls
+
+
+def summarize(measurements, calls):
+    """p50/p95/p99 der Rerun-Dauer und API-Aufrufe pro Aktion"""
+    per_run = calls.dropna(subset=["run"]).groupby("run").agg(
+        calls=("call", "size"), writes=("write", "sum"), rate_limited=("rate_limited", "sum")
+    )
+    runs = measurements.join(per_run).fillna({"calls": 0, "writes": 0, "rate_limited": 0})
+    
+    summary = runs.groupby("action").agg(
+        runs=("seconds", "size"),
+        p50_ms=("seconds", lambda s: s.quantile(0.50) * 1000),
+        p95_ms=("seconds", lambda s: s.quantile(0.95) * 1000),
+        p99_ms=("seconds", lambda s: s.quantile(0.99) * 1000),
+        max_ms=("seconds", lambda s: s.max() * 1000),
+        calls=("calls", "mean"),
+        writes=("writes", "mean"),
+        rate_limited=("rate_limited", "sum"),
+        errors=("errors", "sum"),
+    )
+    summary = summary.reindex([a for a in ACTIONS if a in summary.index])
+    
+    background = calls[calls["action"] == "hintergrund"]
+    totals = {
+        "sessions": measurements["session"].nunique(),
+        "runs": len(measurements),
+        "wall_seconds": measurements.attrs.get("wall_seconds", 0.0),
+        "api_calls": len(calls),
+        "background_calls": len(background),
+        "rate_limited": int(calls["rate_limited"].sum()),
+        "errors": int(measurements["errors"].sum()),
+    }
+    return summary.round(1), totals
+
+
+def calls_by_type(calls):
+    """API-Aufrufe pro Aktion und Methode (für die Suche nach unnötigen Aufrufen)"""
+    return calls.pivot_table(index="action", columns="call", values="position", aggfunc="count", fill_value=0)
@@ -0,0 +1,115 @@
+"""Umwandlung der Sheet-Zeilen in einen Trades-DataFrame"""
+import json
+import hashlib
+
+import pandas as pd
+
+from .checklist import decode_checklist
+from .schema import TRADES_HEADERS
+
+
+def enable_copy_on_write():
+    """Copy-on-Write für pandas 2.x einschalten (ab pandas 3 immer aktiv).
+    
+    Damit sind flache Kopien (``df.copy(deep=False)``) des gemeinsamen Trades-DataFrames sicher:
+    Änderungen an einer Kopie kopieren nur die betroffene Spalte statt das Original zu verändern.
+    """
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+
+def compute_data_version(records):
+    """Datenversion: ändert sich nur wenn sich der Inhalt des Sheets ändert"""
+    return hashlib.md5(json.dumps(records, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+def get_data_version(df):
+    """Gibt die Datenversion eines geladenen DataFrames zurück"""
+    return df.attrs.get("data_version", "")
+
+
+def canonicalize_tag(tag):
+    """Normalisiert Leerzeichen in einem Tag (" setup  A " -> "setup A")"""
+    return " ".join(str(tag).split())
+
+
+def parse_tags(tags):
+    """Zerlegt einen Tag-String in eine Liste normalisierter Tags (ohne Duplikate, Gross/Klein egal)"""
+    result, seen = [], set()
+    for tag in str(tags).split(","):
+        tag = canonicalize_tag(tag)
+        if tag and tag.casefold() not in seen:
+            seen.add(tag.casefold())
+            result.append(tag)
+    return result
+
+
+def find_unknown_checklist_versions(records, versions):
+    """Checklist-Versionen die in den Zeilen vorkommen, aber (noch) nicht bekannt sind"""
+    known = {str(v) for v in versions}
+    return {str(r.get("checklist_version", "")) for r in records} - known - {""}
+
+
+def compute_trade_timestamps(df):
+    """Zeitpunkt pro Trade aus Datum und Uhrzeit (ohne gültige Uhrzeit: Tagesbeginn)"""
+    dates = df["date"].astype(str)
+    timestamps = pd.to_datetime(dates + " " + df["time"].astype(str), errors="coerce", format="ISO8601")
+    return timestamps.fillna(pd.to_datetime(dates, errors="coerce", format="ISO8601"))
+
+
+def get_trade_timestamps(df):
+    """Beim Laden vorberechnete Spalte datetime_sort (oder neu berechnet für fremde DataFrames)"""
+    return df["datetime_sort"] if "datetime_sort" in df.columns else compute_trade_timestamps(df)
+
+
+def parse_images(images_json):
+    """Liest die Bilder-Liste eines Trades (JSON-String) robust ein, nur Einträge als Objekt"""
+    try:
+        if isinstance(images_json, str) and images_json:
+            images = json.loads(images_json)
+            return [img for img in images if isinstance(img, dict)] if isinstance(images, list) else []
+    except ValueError:
+        pass
+    return []
+
+
+def parse_trades(records, versions):
+    """Baut aus den Zeilen des Trades Sheets (get_all_records) einen DataFrame"""
+    if not records:
+        return pd.DataFrame(columns=TRADES_HEADERS)
+    
+    df = pd.DataFrame(records)
+    df.attrs["data_version"] = compute_data_version(records)
+    
+    # Konvertierungen
+    if "date" in df.columns and len(df) > 0:
+        df["date"] = pd.to_datetime(df["date"]).dt.date
+    if "reviewed" in df.columns:
+        df["reviewed"] = df["reviewed"].apply(lambda x: x == "True" or x == True)
+    if "pnl" in df.columns:
+        df["pnl"] = pd.to_numeric(df["pnl"], errors='coerce').fillna(0)
+    
+    # Zeitpunkt für Sortierung und Equity einmal beim Laden berechnen statt pro Rerun
+    if "date" in df.columns and "time" in df.columns:
+        df["datetime_sort"] = compute_trade_timestamps(df)
+    
+    # Zeilen-Version für Optimistic Locking (alte Zeilen ohne Version = 0)
+    if "row_version" in df.columns:
+        df["row_version"] = pd.to_numeric(df["row_version"], errors='coerce').fillna(0).astype(int)
+    else:
+        df["row_version"] = 0
+    
+    # Stelle sicher dass images Spalte existiert
+    if "images" not in df.columns:
+        df["images"] = "[]"
+    
+    # Tags einmal parsen (Komma-String -> Liste normalisierter Tags)
+    df["tag_list"] = df["tags"].astype(str).map(parse_tags) if "tags" in df.columns else [[] for _ in range(len(df))]
+    
+    # Checklisten einmal dekodieren (Bitset oder altes JSON -> Dict)
+    if "checklist" in df.columns:
+        if "checklist_version" not in df.columns:
+            df["checklist_version"] = ""
+        df["checklist"] = [decode_checklist(c, v, versions) for c, v in zip(df["checklist"], df["checklist_version"])]
+    
+    return df
@@ -0,0 +1,359 @@
+"""Review-Reports pro Kalenderwoche oder Monat (HTML, optional PDF)
+
+Die Vorbereitung (Gruppieren, Kennzahlen, Equity-Punkte, Thumbnails aus dem Bild-Cache)
+passiert im aufrufenden Prozess, das PDF-Rendern der einzelnen Perioden parallel in einem
+Prozess-Pool. Unveränderte Perioden werden anhand eines Inhalts-Hashes übersprungen.
+"""
+import os
+import json
+import base64
+import hashlib
+import importlib
+import zipfile
+import multiprocessing
+from io import BytesIO
+from html import escape
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from .charts import downsample_lttb
+from .drive import get_drive_file_id
+from .parsing import get_trade_timestamps, parse_images
+
+REPORTS_DIR = "reports"
+REPORT_FORMATS = ("html", "pdf")
+MANIFEST_FILE = "manifest.json"
+EQUITY_MAX_POINTS = 300
+REPORT_TRADE_COLUMNS = ["trade_id", "date", "time", "account", "asset", "direction", "tags", "notes"]
+MONTH_NAMES = ["Januar", "Februar", "März", "April", "Mai", "Juni",
+               "Juli", "August", "September", "Oktober", "November", "Dezember"]
+
+
+def period_keys(dates, period):
+    """Perioden-Schlüssel wie in den Rollups: "2024-W05" pro Woche, "2024-05" pro Monat"""
+    dates = pd.to_datetime(pd.Series(dates))
+    if period == "week":
+        isocal = dates.dt.isocalendar()
+        return (isocal["year"].astype(str) + "-W" + isocal["week"].astype(str).str.zfill(2)).to_numpy()
+    if period == "month":
+        return dates.dt.strftime("%Y-%m").to_numpy()
+    raise ValueError(f"Unbekannte Periode: {period}")
+
+
+def period_label(key):
+    """Anzeigename einer Periode, z.B. KW 5 / 2024 oder Mai 2024"""
+    year, rest = key.split("-", 1)
+    if rest.startswith("W"):
+        return f"KW {int(rest[1:])} / {year}"
+    return f"{MONTH_NAMES[int(rest) - 1]} {year}"
+
+
+def checklist_labels(schema):
+    """Checklist-Schlüssel -> Label, sortiert nach Kategorie und Reihenfolge im Schema"""
+    labels = {}
+    for items in (schema or {}).values():
+        for key, info in sorted(items.items(), key=lambda x: x[1].get("order", 0)):
+            labels[key] = info.get("label", key)
+    return labels
+
+
+def build_report_jobs(df, period="week", schema=None, start=None, end=None):
+    """Bereitet pro Periode einen Job (nur einfache Python-Typen, damit er an Worker-Prozesse geht) vor"""
+    if df.empty:
+        return []
+    
+    frame = df
+    if start is not None:
+        frame = frame[frame["date"] >= start]
+    if end is not None:
+        frame = frame[frame["date"] <= end]
+    if frame.empty:
+        return []
+    
+    frame = frame.assign(
+        _period=period_keys(frame["date"], period),
+        _datetime=get_trade_timestamps(frame)
+    ).sort_values(["_datetime", "trade_id"], na_position="first")
+    labels = checklist_labels(schema)
+    
+    # Spalten einmal in Python-Listen umwandeln statt pro Periode über Zeilen zu iterieren
+    pnl_all = frame["pnl"].to_numpy(dtype=float)
+    reviewed_all = frame["reviewed"].to_numpy(dtype=bool) if "reviewed" in frame.columns else None
+    checklists_all = frame["checklist"].tolist() if "checklist" in frame.columns else None
+    columns = {c: frame[c].astype(str).tolist() for c in REPORT_TRADE_COLUMNS}
+    images_all = frame["images"].tolist() if "images" in frame.columns else None
+    
+    jobs = []
+    for key, positions in sorted(frame.groupby("_period").indices.items()):
+        pnl = pnl_all[positions]
+        wins, losses = pnl[pnl > 0].sum(), -pnl[pnl < 0].sum()
+        stats = {
+            "trades": int(len(pnl)),
+            "total_pnl": round(float(pnl.sum()), 2),
+            "win_rate": round(float((pnl > 0).mean() * 100), 1),
+            "avg_pnl": round(float(pnl.mean()), 2),
+            "best": round(float(pnl.max()), 2),
+            "worst": round(float(pnl.min()), 2),
+            "profit_factor": round(float(wins / losses), 2) if losses > 0 else None,
+            "reviewed": int(reviewed_all[positions].sum()) if reviewed_all is not None else 0,
+        }
+        
+        # Equity innerhalb der Periode, auf die Auflösung des Charts reduziert
+        equity = pnl.cumsum()
+        keep = downsample_lttb(range(len(equity)), equity, EQUITY_MAX_POINTS)
+        
+        # Checklisten-Disziplin: Anteil der Trades, bei denen ein Punkt angehakt war
+        checklists = [checklists_all[p] for p in positions] if checklists_all is not None else []
+        keys = list(labels) or sorted({k for c in checklists if isinstance(c, dict) for k in c})
+        adherence = [
+            [labels.get(k, k), round(100 * sum(1 for c in checklists if isinstance(c, dict) and c.get(k)) / len(checklists), 1)]
+            for k in keys
+        ] if checklists else []
+        
+        trades = []
+        for n, p in enumerate(positions):
+            trade = {c: columns[c][p] for c in REPORT_TRADE_COLUMNS}
+            trade["pnl"] = round(float(pnl[n]), 2)
+            image_ids = [get_drive_file_id(img) for img in parse_images(images_all[p])] if images_all is not None else []
+            trade["image_ids"] = [i for i in image_ids if i]
+            trades.append(trade)
+        
+        job = {
+            "key": key, "label": period_label(key), "period": period, "stats": stats,
+            "equity": [round(float(equity[i]), 2) for i in keep], "checklist": adherence, "trades": trades
+        }
+        job["hash"] = hashlib.md5(json.dumps(job, sort_keys=True).encode()).hexdigest()
+        jobs.append(job)
+    
+    return jobs
+
+
+def render_equity_svg(points, width=640, height=180):
+    """Equity-Kurve als Inline-SVG (funktioniert in HTML und PDF ohne JavaScript)"""
+    if len(points) < 2:
+        return ""
+    low, high = min(min(points), 0), max(max(points), 0)
+    span = (high - low) or 1
+    step = width / (len(points) - 1)
+    
+    def y(value):
+        return height - (value - low) / span * height
+    
+    coords = " ".join(f"{i * step:.1f},{y(v):.1f}" for i, v in enumerate(points))
+    color = "#00cc96" if points[-1] >= 0 else "#EF553B"
+    return (
+        f'<svg viewBox="0 0 {width} {height}" width="100%" height="{height}" xmlns="http://www.w3.org/2000/svg">'
+        f'<line x1="0" y1="{y(0):.1f}" x2="{width}" y2="{y(0):.1f}" stroke="#999" stroke-dasharray="4"/>'
+        f'<polyline points="{coords}" fill="none" stroke="{color}" stroke-width="2"/></svg>'
+    )
+
+
+def image_data_uri(data):
+    """Bild-Bytes als data:-URI, damit der Report eine einzelne Datei bleibt"""
+    mime = "image/png" if data[:4] == b"\x89PNG" else "image/jpeg" if data[:2] == b"\xff\xd8" else "image/webp"
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+REPORT_CSS = """
+body { font-family: Helvetica, Arial, sans-serif; color: #222; margin: 2em; }
+h1 { border-bottom: 2px solid #4CAF50; padding-bottom: .2em; }
+.kpis { display: flex; flex-wrap: wrap; gap: .8em; }
+.kpi { border: 1px solid #ccc; border-radius: 5px; padding: .5em .8em; min-width: 7em; }
+.kpi b { display: block; font-size: 1.3em; }
+table { border-collapse: collapse; width: 100%; margin: .5em 0 1.5em; }
+td, th { border-bottom: 1px solid #ddd; padding: .3em .5em; text-align: left; vertical-align: top; }
+.pos { color: #00875a; } .neg { color: #c62828; }
+.bar { background: #4CAF50; height: .8em; }
+.trade { page-break-inside: avoid; border-top: 1px solid #ccc; padding: .5em 0; }
+.trade img { max-width: 240px; max-height: 160px; margin: .3em .3em 0 0; border: 1px solid #ccc; }
+.notes { white-space: pre-wrap; }
+"""
+
+
+def render_report_html(job, thumbnails=None):
+    """Baut das HTML eines Perioden-Reports"""
+    thumbnails = thumbnails or {}
+    stats = job["stats"]
+    
+    def money(value):
+        return f'<span class="{"pos" if value >= 0 else "neg"}">{value:.2f} $</span>'
+    
+    kpis = [
+        ("Trades", stats["trades"]), ("Net P&amp;L", money(stats["total_pnl"])),
+        ("Win Rate", f"{stats['win_rate']:.1f} %"), ("Ø PnL", money(stats["avg_pnl"])),
+        ("Bester", money(stats["best"])), ("Schlechtester", money(stats["worst"])),
+        ("Profit-Faktor", "-" if stats["profit_factor"] is None else f"{stats['profit_factor']:.2f}"),
+        ("Reviewed", f"{stats['reviewed']} / {stats['trades']}"),
+    ]
+    parts = [
+        f"<!DOCTYPE html><html lang=\"de\"><head><meta charset=\"utf-8\"><title>Review {escape(job['label'])}</title>",
+        f"<style>{REPORT_CSS}</style></head><body>",
+        f"<h1>📈 Review {escape(job['label'])}</h1>",
+        '<div class="kpis">' + "".join(f'<div class="kpi">{name}<b>{value}</b></div>' for name, value in kpis) + "</div>",
+        "<h2>Equity</h2>", render_equity_svg(job["equity"]),
+    ]
+    
+    if job["checklist"]:
+        parts.append("<h2>Checkliste</h2><table>")
+        for label, pct in job["checklist"]:
+            parts.append(f'<tr><td>{escape(label)}</td><td style="width:50%"><div class="bar" style="width:{pct}%"></div></td><td>{pct:.0f} %</td></tr>')
+        parts.append("</table>")
+    
+    parts.append("<h2>Trades</h2>")
+    for trade in job["trades"]:
+        images = "".join(
+            f'<img src="{image_data_uri(thumbnails[i])}">' for i in trade["image_ids"] if thumbnails.get(i)
+        )
+        parts.append(
+            f'<div class="trade"><b>{escape(trade["trade_id"])}</b> · {escape(trade["date"])} {escape(trade["time"])} · '
+            f'{escape(trade["account"])} · {escape(trade["asset"])} · {escape(trade["direction"])} · {money(trade["pnl"])}'
+            + (f'<br><i>{escape(trade["tags"])}</i>' if trade["tags"] else "")
+            + (f'<div class="notes">{escape(trade["notes"])}</div>' if trade["notes"] else "")
+            + images + "</div>"
+        )
+    
+    parts.append(f"<p><small>Erstellt am {datetime.now().strftime('%Y-%m-%d %H:%M')}</small></p></body></html>")
+    return "\n".join(parts)
+
+
+def render_report(job, output_dir, formats=("html",), thumbnails=None):
+    """Schreibt einen Perioden-Report (läuft in einem Worker-Prozess), gibt die Dateipfade zurück"""
+    html = render_report_html(job, thumbnails)
+    base = os.path.join(output_dir, f"review_{job['key']}")
+    paths = []
+    if "html" in formats:
+        with open(f"{base}.html", "w", encoding="utf-8") as f:
+            f.write(html)
+        paths.append(f"{base}.html")
+    if "pdf" in formats:
+        from weasyprint import HTML
+        HTML(string=html).write_pdf(f"{base}.pdf")
+        paths.append(f"{base}.pdf")
+    return paths
+
+
+def pdf_available():
+    """PDF-Export braucht das optionale Paket weasyprint"""
+    try:
+        importlib.import_module("weasyprint")
+        return True
+    except (ImportError, OSError):
+        return False
+
+
+def load_manifest(output_dir):
+    """Hash und Dateien der zuletzt erzeugten Reports pro Periode"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def fetch_thumbnails(image_ids, image_cache, max_workers=8):
+    """Holt Thumbnails aus dem Bild-Cache (fehlende werden von Drive geladen), Fehler werden übersprungen"""
+    def fetch(file_id):
+        try:
+            return file_id, image_cache.fetch(file_id, thumbnail=True)
+        except Exception:
+            return file_id, None
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return {file_id: data for file_id, data in pool.map(fetch, image_ids) if data}
+
+
+def generate_reports(jobs, output_dir=REPORTS_DIR, formats=("html",), image_cache=None,
+                     max_workers=None, force=False, on_progress=None):
+    """Rendert alle Jobs parallel in einem Prozess-Pool.
+    
+    Perioden, deren Inhalt sich seit dem letzten Lauf nicht geändert hat, werden übersprungen
+    (außer mit ``force``). Gibt {"written": [...], "skipped": [...], "failed": [...], "index": pfad} zurück.
+    """
+    formats = tuple(f for f in REPORT_FORMATS if f in formats)
+    if "pdf" in formats and not pdf_available():
+        raise RuntimeError("PDF-Export benötigt weasyprint (pip install weasyprint)")
+    os.makedirs(output_dir, exist_ok=True)
+    
+    manifest = load_manifest(output_dir)
+    todo, skipped = [], []
+    for job in jobs:
+        previous = manifest.get(job["key"], {})
+        files_ok = all(os.path.exists(os.path.join(output_dir, f"review_{job['key']}.{fmt}")) for fmt in formats)
+        if not force and previous.get("hash") == job["hash"] and set(formats) <= set(previous.get("formats", [])) and files_ok:
+            skipped.append(job["key"])
+        else:
+            todo.append(job)
+    
+    thumbnails = {}
+    if image_cache is not None and todo:
+        thumbnails = fetch_thumbnails(sorted({i for job in todo for t in job["trades"] for i in t["image_ids"]}), image_cache)
+    
+    def job_thumbnails(job):
+        return {i: thumbnails[i] for t in job["trades"] for i in t["image_ids"] if i in thumbnails}
+    
+    written, failed = [], []
+    
+    def finished(job, paths=None, error=None):
+        if error is None:
+            written.append(job["key"])
+            manifest[job["key"]] = {"hash": job["hash"], "formats": list(formats), "label": job["label"],
+                                    "files": [os.path.basename(p) for p in paths]}
+        else:
+            failed.append({"key": job["key"], "error": str(error)})
+        if on_progress:
+            on_progress(len(written) + len(failed), len(todo))
+    
+    # HTML allein ist in Millisekunden gerendert, den Prozess-Pool lohnt erst das PDF (weasyprint)
+    if max_workers is None and "pdf" not in formats:
+        max_workers = 1
+    if len(todo) <= 1 or max_workers == 1:
+        for job in todo:
+            try:
+                finished(job, render_report(job, output_dir, formats, job_thumbnails(job)))
+            except Exception as e:
+                finished(job, error=e)
+    else:
+        # "spawn" statt fork: der aufrufende Prozess (Streamlit) hat viele Threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+            futures = {pool.submit(render_report, job, output_dir, formats, job_thumbnails(job)): job for job in todo}
+            for future in as_completed(futures):
+                try:
+                    finished(futures[future], future.result())
+                except Exception as e:
+                    finished(futures[future], error=e)
+    
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    index = write_index(output_dir, manifest)
+    
+    return {"written": written, "skipped": skipped, "failed": failed, "index": index}
+
+
+def write_index(output_dir, manifest):
+    """Übersichtsseite mit Links auf alle erzeugten Reports"""
+    rows = "".join(
+        f'<tr><td>{escape(entry["label"])}</td><td>'
+        + " ".join(f'<a href="{escape(name)}">{escape(name.rsplit(".", 1)[-1].upper())}</a>' for name in entry["files"])
+        + "</td></tr>"
+        for _, entry in sorted(manifest.items(), reverse=True)
+    )
+    path = os.path.join(output_dir, "index.html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            f'<!DOCTYPE html><html lang="de"><head><meta charset="utf-8"><title>Review-Reports</title>'
+            f"<style>{REPORT_CSS}</style></head><body><h1>Review-Reports</h1><table>{rows}</table></body></html>"
+        )
+    return path
+
+
+def zip_reports(output_dir=REPORTS_DIR):
+    """Alle Reports eines Ordners als ZIP (Bytes) für den Download"""
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name in sorted(os.listdir(output_dir)):
+            if name.endswith((".html", ".pdf")):
+                archive.write(os.path.join(output_dir, name), name)
+    return buffer.getvalue()
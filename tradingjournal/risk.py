@@ -0,0 +1,178 @@
+"""Risiko-Tracking pro Konto nach Prop-Firm-Regeln (Tagesverlust-Limit, Max-Drawdown)
+
+Der Zustand eines Kontos wird pro gespeichertem Trade in O(1) fortgeschrieben. Nur bei
+Änderungen, Löschungen, nachgetragenen (älteren) Trades oder geänderten Regeln wird das
+betroffene Konto aus seinem Ledger neu berechnet - nie die ganze Historie aus dem Sheet.
+"""
+import re
+import threading
+from datetime import date
+
+import pandas as pd
+
+from .parsing import get_trade_timestamps
+
+DRAWDOWN_TYPES = {"static": "Statisch (ab Startkapital)", "trailing": "Trailing (ab Höchststand)"}
+
+
+def suggest_rules(account):
+    """Vorschlag aus dem Kontonamen, z.B. "FTMO 12.2025 100K" -> 100'000 Start, 5 % Tages-, 10 % Max-Verlust"""
+    match = re.search(r"(\d+(?:[.,]\d+)?)\s*([kKmM])\b", str(account))
+    start = 100000.0
+    if match:
+        start = float(match.group(1).replace(",", ".")) * (1000 if match.group(2).lower() == "k" else 1000000)
+    return {"start_balance": start, "max_daily_loss": start * 0.05, "max_drawdown": start * 0.10, "drawdown_type": "static"}
+
+
+def trade_timestamp(trade_date, trade_time):
+    """Zeitpunkt eines Trades für die Reihenfolge (ohne gültige Uhrzeit: Tagesbeginn)"""
+    timestamp = pd.to_datetime(f"{trade_date} {trade_time}", errors="coerce")
+    if pd.isna(timestamp):
+        timestamp = pd.to_datetime(str(trade_date), errors="coerce")
+    return timestamp
+
+
+class AccountRisk:
+    """Laufender Risiko-Zustand eines Kontos (Kontostand, Tagesverlust, Höchststand, Verstösse)"""
+    
+    def __init__(self, rules):
+        self.rules = dict(rules)
+        self.start_balance = float(rules["start_balance"])
+        self.balance = self.start_balance
+        self.high_water_mark = self.start_balance
+        self.max_drawdown_seen = 0.0
+        self.day = None
+        self.day_start_balance = self.start_balance
+        self.day_low = self.start_balance
+        self.last_timestamp = None
+        self.trades = 0
+        self.daily_breaches = []
+        self.drawdown_breached = None
+    
+    def drawdown_floor(self):
+        """Kontostand, unter den das Konto nie fallen darf"""
+        base = self.high_water_mark if self.rules.get("drawdown_type") == "trailing" else self.start_balance
+        return base - float(self.rules["max_drawdown"])
+    
+    def apply(self, timestamp, pnl):
+        """Schreibt einen (chronologisch neuesten) Trade fort"""
+        day = timestamp.date()
+        if day != self.day:
+            self.day = day
+            self.day_start_balance = self.balance
+            self.day_low = self.balance
+    
+        self.balance += pnl
+        self.day_low = min(self.day_low, self.balance)
+        self.high_water_mark = max(self.high_water_mark, self.balance)
+        self.max_drawdown_seen = max(self.max_drawdown_seen, self.high_water_mark - self.balance)
+        self.last_timestamp = timestamp
+        self.trades += 1
+    
+        # Verstösse merken (geschlossene Trades, Equity-Spitzen innerhalb eines Trades sind nicht bekannt)
+        if self.day_start_balance - self.day_low > float(self.rules["max_daily_loss"]) and day not in self.daily_breaches:
+            self.daily_breaches.append(day)
+        if self.drawdown_breached is None and self.balance < self.drawdown_floor():
+            self.drawdown_breached = day
+    
+    def status(self, today=None):
+        """Abstand zu den Limits für heute (Tageslimit bezieht sich auf den Kontostand bei Tagesbeginn)"""
+        today = today or date.today()
+        active = self.day == today
+        day_start = self.day_start_balance if active else self.balance
+        daily_floor = day_start - float(self.rules["max_daily_loss"])
+        drawdown_floor = self.drawdown_floor()
+        return {
+            "balance": round(self.balance, 2),
+            "pnl": round(self.balance - self.start_balance, 2),
+            "today_pnl": round(self.balance - day_start, 2),
+            "intraday_loss": round(day_start - self.day_low, 2) if active else 0.0,
+            "daily_remaining": round(self.balance - daily_floor, 2),
+            "high_water_mark": round(self.high_water_mark, 2),
+            "drawdown": round(self.high_water_mark - self.balance, 2),
+            "max_drawdown_seen": round(self.max_drawdown_seen, 2),
+            "drawdown_remaining": round(self.balance - drawdown_floor, 2),
+            "daily_breaches": len(self.daily_breaches),
+            "drawdown_breached": self.drawdown_breached,
+            "trades": self.trades,
+        }
+
+
+class RiskTracker:
+    """Risiko-Zustände aller Konten mit Regeln, plus Ledger {konto: {trade_id: (zeitpunkt, pnl)}} als Basis für Neuberechnungen"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rules = {}
+        self.ledgers = {}
+        self.states = {}
+        self.data_version = None
+        self._account_of = {}
+    
+    def sync(self, df, rules, data_version=None):
+        """Gleicht mit den geladenen Trades ab, berechnet nur Konten mit Abweichungen neu"""
+        rules = {account: dict(r) for account, r in (rules or {}).items()}
+        with self._lock:
+            if data_version is not None and data_version == self.data_version and rules == self.rules:
+                return
+    
+            ledgers = {}
+            if not df.empty:
+                timestamps = get_trade_timestamps(df)
+                for account, trade_id, timestamp, pnl in zip(df["account"], df["id"], timestamps, df["pnl"].astype(float)):
+                    if not pd.isna(timestamp):
+                        ledgers.setdefault(account, {})[trade_id] = (timestamp, pnl)
+    
+            changed = {a for a in set(ledgers) | set(self.ledgers) if ledgers.get(a) != self.ledgers.get(a)}
+            changed |= {a for a in set(rules) | set(self.rules) if rules.get(a) != self.rules.get(a)}
+            self.ledgers = ledgers
+            self.rules = rules
+            self._account_of = {trade_id: account for account, ledger in ledgers.items() for trade_id in ledger}
+            for account in changed:
+                self._recompute(account)
+            self.data_version = data_version
+    
+    def record(self, trade_id, account, trade_date, trade_time, pnl):
+        """Neuer oder geänderter Trade: O(1) wenn er der neueste des Kontos ist, sonst Neuberechnung des Kontos"""
+        timestamp = trade_timestamp(trade_date, trade_time)
+        if pd.isna(timestamp):
+            return
+        pnl = float(pnl or 0)
+        with self._lock:
+            previous = self._account_of.get(trade_id)
+            if previous is not None:
+                self.ledgers[previous].pop(trade_id, None)
+            self.ledgers.setdefault(account, {})[trade_id] = (timestamp, pnl)
+            self._account_of[trade_id] = account
+    
+            state = self.states.get(account)
+            if previous is None and state is not None and (state.last_timestamp is None or timestamp >= state.last_timestamp):
+                state.apply(timestamp, pnl)
+            else:
+                for affected in {previous, account} - {None}:
+                    self._recompute(affected)
+            self.data_version = None
+    
+    def remove(self, trade_id):
+        """Gelöschter Trade: nur sein Konto wird neu berechnet"""
+        with self._lock:
+            account = self._account_of.pop(trade_id, None)
+            if account is not None:
+                self.ledgers[account].pop(trade_id, None)
+                self._recompute(account)
+            self.data_version = None
+    
+    def status(self, today=None):
+        """{konto: status} für alle Konten mit Regeln"""
+        with self._lock:
+            return {account: state.status(today) for account, state in self.states.items()}
+    
+    def _recompute(self, account):
+        # Aufruf nur mit gehaltenem Lock
+        if account not in self.rules:
+            self.states.pop(account, None)
+            return
+        state = AccountRisk(self.rules[account])
+        for timestamp, pnl in sorted(self.ledgers.get(account, {}).values(), key=lambda x: x[0]):
+            state.apply(timestamp, pnl)
+        self.states[account] = state
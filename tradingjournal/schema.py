@@ -0,0 +1,37 @@
+"""Spalten des Trades Sheets (versioniert)
+
+Jede Spalte gehört zur Schema-Version, in der sie dazukam. ``sheets.migrate_trades_schema``
+bringt bestehende Sheets auf die aktuelle Version: fehlende Spalten werden hinten angehängt
+und in den bestehenden Zeilen mit ihrem Standardwert gefüllt. Geschrieben wird immer über
+den Namen im Header, nie über feste Spaltenbuchstaben.
+"""
+from collections import namedtuple
+
+# default: Wert für bestehende Zeilen beim Anlegen der Spalte (None = leer lassen)
+TradesColumn = namedtuple("TradesColumn", ["name", "version", "default"])
+
+# Neue Spalten immer hinten anhängen, mit der nächsten Version
+TRADES_COLUMNS = [
+    TradesColumn("id", 1, None),
+    TradesColumn("trade_id", 1, None),
+    TradesColumn("date", 1, None),
+    TradesColumn("time", 1, None),
+    TradesColumn("account", 1, None),
+    TradesColumn("asset", 1, None),
+    TradesColumn("direction", 1, None),
+    TradesColumn("pnl", 1, None),
+    TradesColumn("notes", 1, None),
+    TradesColumn("tags", 1, None),
+    TradesColumn("checklist", 1, None),
+    TradesColumn("reviewed", 1, None),
+    TradesColumn("created_at", 1, None),
+    TradesColumn("images", 1, None),
+    TradesColumn("checklist_version", 2, None),  # leer = Checkliste noch als JSON
+    TradesColumn("row_version", 3, 0),
+    TradesColumn("ingest_key", 4, None),
+]
+
+TRADES_HEADERS = [c.name for c in TRADES_COLUMNS]
+TRADES_SCHEMA_VERSION = max(c.version for c in TRADES_COLUMNS)
+# Key im Settings Sheet, unter dem die Schema-Version des Trades Sheets steht
+SCHEMA_VERSION_KEY = "trades_schema_version"
@@ -0,0 +1,635 @@
+"""Google Sheets Zugriff: Verbindung, Spreadsheet-Struktur, Trades, Settings und Checkliste.
+
+Alle Funktionen bekommen das Spreadsheet als ersten Parameter und cachen nichts -
+das Caching übernimmt der Aufrufer (z.B. die Streamlit-App).
+"""
+import json
+from datetime import datetime, time
+
+import gspread
+from google.oauth2.service_account import Credentials
+
+from .checklist import get_default_checklist, get_checklist_keys, next_version_keys, encode_checklist, decode_checklist
+from .parsing import parse_trades, find_unknown_checklist_versions
+from .schema import TRADES_COLUMNS, TRADES_HEADERS, TRADES_SCHEMA_VERSION, SCHEMA_VERSION_KEY
+
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+SPREADSHEET_NAME = "TradingJournal_Data"
+
+
+class ConflictError(Exception):
+    """Ein Trade wurde seit dem Laden in einer anderen Session geändert oder gelöscht.
+    
+    ``current`` enthält die aktuelle Zeile als Dict, oder None wenn der Trade gelöscht wurde
+    (leeres Dict wenn sich das Sheet während der Suche laufend verschoben hat).
+    """
+    
+    def __init__(self, entry_id, expected_version, current):
+        self.entry_id = entry_id
+        self.expected_version = expected_version
+        self.current = current
+        state = "gelöscht" if current is None else f"auf Version {parse_row_version(current.get('row_version'))} geändert"
+        super().__init__(f"Trade {entry_id} wurde inzwischen {state} (erwartet: Version {expected_version})")
+    
+    @property
+    def current_version(self):
+        return None if self.current is None else parse_row_version(self.current.get("row_version"))
+
+
+# --- VERBINDUNG ---
+
+def get_credentials(service_account_info=None, credentials_file="credentials.json"):
+    """Erstellt Credentials aus einem Service-Account-Dict oder einer lokalen JSON Datei"""
+    if service_account_info:
+        return Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
+    return Credentials.from_service_account_file(credentials_file, scopes=SCOPES)
+
+
+def get_google_client(credentials):
+    """Erstellt den Google Sheets Client"""
+    return gspread.authorize(credentials)
+
+
+def get_or_create_spreadsheet(client, name=SPREADSHEET_NAME):
+    """Holt oder erstellt das Trading Journal Spreadsheet"""
+    try:
+        # Versuche existierendes Spreadsheet zu öffnen
+        spreadsheet = client.open(name)
+    except gspread.SpreadsheetNotFound:
+        # Erstelle neues Spreadsheet im geteilten Ordner
+        spreadsheet = client.create(name)
+        
+        # Erstelle Worksheets
+        # Trades Sheet - mit images Spalte
+        trades_ws = spreadsheet.sheet1
+        trades_ws.update_title("Trades")
+        trades_ws.update(f'A1:{gspread.utils.rowcol_to_a1(1, len(TRADES_HEADERS))}', [TRADES_HEADERS])
+        
+        # Settings Sheet
+        settings_ws = spreadsheet.add_worksheet(title="Settings", rows=100, cols=10)
+        settings_ws.update('A1:B1', [["key", "value"]])
+        default_settings = {
+            "accounts": json.dumps(["-- Kein Konto --", "Privat", "FTMO 12.2025 100K"]),
+            "assets": json.dumps(["-- Kein Asset --", "NQ", "ES", "DAX", "EURUSD", "GOLD", "GBPJPY", "USDCAD", "CADCHF", "YEN BASKET"])
+        }
+        settings_ws.update('A2:B4', [
+            ["accounts", default_settings["accounts"]], ["assets", default_settings["assets"]],
+            [SCHEMA_VERSION_KEY, TRADES_SCHEMA_VERSION]
+        ])
+        
+        # Checklist Schema Sheet
+        checklist_ws = spreadsheet.add_worksheet(title="ChecklistSchema", rows=100, cols=10)
+        checklist_ws.update('A1:B1', [["schema_json", ""]])
+        default_checklist = get_default_checklist()
+        checklist_ws.update('A2', [[json.dumps(default_checklist, ensure_ascii=False)]])
+        
+        # Checklist Versionen Sheet (Reihenfolge der Bits pro Version)
+        versions_ws = spreadsheet.add_worksheet(title="ChecklistVersions", rows=100, cols=2)
+        versions_ws.update('A1:B2', [["version", "keys"], [1, json.dumps(get_checklist_keys(default_checklist))]])
+    
+    return spreadsheet
+
+
+def ensure_trades_headers(spreadsheet):
+    """Bringt das Trades Sheet auf die aktuelle Schema-Version und gibt den Header zurück"""
+    return migrate_trades_schema(spreadsheet)[0]
+
+
+def column_letter(headers, name):
+    """Spaltenbuchstabe einer Spalte über ihren Namen im Header (z.B. "row_version" -> "P")"""
+    return gspread.utils.rowcol_to_a1(1, headers.index(name) + 1)[:-1]
+
+
+def contiguous_runs(row_numbers):
+    """Fasst Zeilennummern zu zusammenhängenden Blöcken [(erste, letzte), ...] zusammen"""
+    runs = []
+    for row_number in sorted(row_numbers):
+        if runs and runs[-1][1] == row_number - 1:
+            runs[-1][1] = row_number
+        else:
+            runs.append([row_number, row_number])
+    return [tuple(run) for run in runs]
+
+
+def unchanged_runs(trades_ws, headers, all_data, runs, columns=()):
+    """Blöcke (erste, letzte) deren ID und ``columns`` noch dem Snapshot ``all_data`` entsprechen.
+    
+    Liest dafür nur diese Spalten neu: Zeilen, die sich seit dem Snapshot verschoben haben
+    (Einfügen/Löschen in einer anderen Session) oder geändert wurden, fallen heraus. Zwischen
+    Prüfung und Schreiben bleibt wie beim Compare-and-Swap ein Fenster von einem API-Aufruf.
+    """
+    names = ["id", *[c for c in columns if c != "id"]]
+    current = {name: trades_ws.col_values(headers.index(name) + 1) for name in names}
+    
+    def matches(row_number):
+        snapshot = all_data[row_number - 1] if row_number <= len(all_data) else []
+        for name in names:
+            col = headers.index(name)
+            now = current[name][row_number - 1] if row_number <= len(current[name]) else ""
+            if now != (snapshot[col] if col < len(snapshot) else ""):
+                return False
+        return True
+    
+    return [(first, last) for first, last in runs if all(matches(r) for r in range(first, last + 1))]
+
+
+def migrate_trades_schema(spreadsheet, chunk_ranges=1000, attempts=3):
+    """Legt fehlende Spalten an und füllt sie in bestehenden Zeilen mit ihrem Standardwert (gebündelte Range-Updates).
+    
+    Die Version des Sheets steht im Settings Sheet - ist sie aktuell, werden nur Header und
+    Settings gelesen. Gibt (header, [angewendete versionen]) zurück.
+    """
+    trades_ws = spreadsheet.worksheet("Trades")
+    headers = trades_ws.row_values(1)
+    missing = [h for h in TRADES_HEADERS if h not in headers]
+    try:
+        stored = int(load_settings(spreadsheet).get(SCHEMA_VERSION_KEY) or 0)
+    except (TypeError, ValueError):
+        stored = 0
+    if not missing and stored >= TRADES_SCHEMA_VERSION:
+        return headers, []
+    
+    if missing:
+        start = gspread.utils.rowcol_to_a1(1, len(headers) + 1)
+        end = gspread.utils.rowcol_to_a1(1, len(headers) + len(missing))
+        trades_ws.update(f'{start}:{end}', [missing])
+        headers = headers + missing
+    
+    # Neue Spalten mit Standardwert: leere Zellen aller bestehenden Zeilen füllen
+    backfill = [c for c in TRADES_COLUMNS if c.version > stored and c.default is not None]
+    for column in backfill:
+        col, letter = headers.index(column.name), column_letter(headers, column.name)
+        for _ in range(attempts):
+            all_data = trades_ws.get_all_values()
+            empty = [i for i, row in enumerate(all_data[1:], start=2) if col >= len(row) or row[col] == ""]
+            # Nur Blöcke schreiben, deren IDs noch stimmen und deren Zellen noch leer sind - ein
+            # inzwischen gesetzter Wert (z.B. neue row_version) darf nicht auf den Standard zurückfallen
+            runs = contiguous_runs(empty)
+            verified = unchanged_runs(trades_ws, headers, all_data, runs, [column.name]) if runs else []
+            ranges = [
+                {"range": f"{letter}{first}:{letter}{last}", "values": [[str(column.default)]] * (last - first + 1)}
+                for first, last in verified
+            ]
+            # Wenige Batch-Requests statt einem Request pro Zeile
+            for start in range(0, len(ranges), chunk_ranges):
+                trades_ws.batch_update(ranges[start:start + chunk_ranges])
+            if len(verified) == len(runs):
+                break
+        # Was nach allen Versuchen leer bleibt, wird beim Lesen ohnehin als Standardwert behandelt
+    
+    save_setting(spreadsheet, SCHEMA_VERSION_KEY, TRADES_SCHEMA_VERSION)
+    return headers, sorted({c.version for c in TRADES_COLUMNS if c.version > stored})
+
+
+# --- SETTINGS ---
+
+def load_settings(spreadsheet):
+    """Lädt Settings aus Google Sheets"""
+    settings_ws = spreadsheet.worksheet("Settings")
+    data = settings_ws.get_all_records()
+    
+    settings = {}
+    for row in data:
+        try:
+            settings[row["key"]] = json.loads(row["value"])
+        except (ValueError, TypeError):
+            settings[row["key"]] = row["value"]
+    
+    # Defaults falls nicht vorhanden
+    if "accounts" not in settings:
+        settings["accounts"] = ["-- Kein Konto --", "Privat"]
+    if "assets" not in settings:
+        settings["assets"] = ["-- Kein Asset --", "NQ", "ES"]
+    
+    return settings
+
+
+def save_setting(spreadsheet, key, value):
+    """Speichert einen einzelnen Setting-Wert: nur dessen Zeile wird geschrieben, neue Keys werden angehängt"""
+    settings_ws = spreadsheet.worksheet("Settings")
+    keys = settings_ws.col_values(1)
+    
+    if key in keys[1:]:
+        row = keys.index(key, 1) + 1
+        settings_ws.update(f'B{row}', [[encode_setting(value)]])
+    else:
+        settings_ws.update(f'A{len(keys)+1}:B{len(keys)+1}', [[key, encode_setting(value)]])
+
+
+def encode_setting(value):
+    """Listen und Dicts werden als JSON in der Zelle gespeichert"""
+    return json.dumps(value) if isinstance(value, (list, dict)) else value
+
+
+# --- CHECKLISTE ---
+
+def load_checklist_schema(spreadsheet):
+    """Lädt Checklist Schema aus Google Sheets"""
+    try:
+        checklist_ws = spreadsheet.worksheet("ChecklistSchema")
+        schema_json = checklist_ws.acell('A2').value
+        if schema_json:
+            return json.loads(schema_json)
+    except (gspread.WorksheetNotFound, ValueError):
+        pass
+    return get_default_checklist()
+
+
+def save_checklist_schema(spreadsheet, schema, versions=None):
+    """Speichert Checklist Schema in Google Sheets und gibt die aktuelle Checklist-Version zurück"""
+    checklist_ws = spreadsheet.worksheet("ChecklistSchema")
+    checklist_ws.update('A2', [[json.dumps(schema, ensure_ascii=False)]])
+    return register_checklist_version(spreadsheet, schema, versions)
+
+
+def get_versions_worksheet(spreadsheet):
+    """Holt das ChecklistVersions Sheet, legt es bei älteren Spreadsheets an"""
+    try:
+        return spreadsheet.worksheet("ChecklistVersions")
+    except gspread.WorksheetNotFound:
+        versions_ws = spreadsheet.add_worksheet(title="ChecklistVersions", rows=100, cols=2)
+        versions_ws.update('A1:B1', [["version", "keys"]])
+        return versions_ws
+
+
+def load_checklist_versions(spreadsheet):
+    """Lädt alle Checklist-Versionen: {version: [schlüssel, ...]}"""
+    versions = {}
+    for row in get_versions_worksheet(spreadsheet).get_all_records():
+        try:
+            # Doppelt vergebene Nummer (zwei Prozesse gleichzeitig): es gilt die erste Zeile
+            versions.setdefault(int(row["version"]), json.loads(row["keys"]))
+        except (KeyError, ValueError, TypeError):
+            pass
+    return versions
+
+
+def register_checklist_version(spreadsheet, schema, versions=None, attempts=3):
+    """Legt eine neue Checklist-Version an, falls sich die Schlüssel geändert haben. Gibt die aktuelle Version zurück.
+    
+    ``versions`` (z.B. aus einem Cache) wird vor dem Anlegen frisch gelesen und an Ort und Stelle
+    ergänzt. Legt ein anderer Prozess gleichzeitig dieselbe Nummer an, gilt die erste Zeile im
+    Sheet und die eigene Version wird mit der nächsten Nummer neu angelegt.
+    """
+    if versions is None:
+        versions = load_checklist_versions(spreadsheet)
+    
+    new_keys = next_version_keys(versions, schema)
+    if new_keys is None:
+        return max(versions)
+    
+    versions_ws = get_versions_worksheet(spreadsheet)
+    for _ in range(attempts):
+        # Gecachte Versionen können veraltet sein - die Nummer muss aus dem aktuellen Stand kommen
+        versions.update(load_checklist_versions(spreadsheet))
+        new_keys = next_version_keys(versions, schema)
+        if new_keys is None:
+            return max(versions)
+        
+        version = max(versions, default=0) + 1
+        versions_ws.append_row([version, json.dumps(new_keys)])
+        # Zurücklesen: nur wenn die erste Zeile mit dieser Nummer unsere ist, gehört sie uns
+        current = load_checklist_versions(spreadsheet)
+        versions.update(current)
+        if current.get(version) == new_keys:
+            return version
+    
+    raise RuntimeError("Checklist-Version konnte nicht angelegt werden (Sheet ändert sich gerade laufend)")
+
+
+def migrate_checklists_to_bitmask(spreadsheet, chunk_ranges=1000, attempts=3):
+    """Konvertiert alle JSON-Checklisten im Trades Sheet zu Bitsets (gebündelte Range-Updates). Gibt die Anzahl konvertierter Zeilen zurück.
+    
+    Geschrieben werden nur die konvertierten Zeilen, und nur in Blöcken, deren IDs und Checklisten
+    sich seit dem Lesen nicht geändert haben. Übersprungene Blöcke werden neu gelesen und nochmal versucht.
+    """
+    headers = ensure_trades_headers(spreadsheet)
+    trades_ws = spreadsheet.worksheet("Trades")
+    versions = load_checklist_versions(spreadsheet)
+    register_checklist_version(spreadsheet, load_checklist_schema(spreadsheet), versions)
+    
+    checklist_col = headers.index("checklist")
+    checklist_letter = column_letter(headers, "checklist")
+    version_letter = column_letter(headers, "checklist_version")
+    
+    converted = 0
+    for _ in range(attempts):
+        all_data = trades_ws.get_all_values()
+        encoded = {}  # zeilennummer -> (bitset, version)
+        for row_number, row in enumerate(all_data[1:], start=2):
+            checklist = row[checklist_col] if checklist_col < len(row) else ""
+            if checklist.startswith("0x"):
+                continue
+            decoded = decode_checklist(checklist, None, versions)
+            checked = {k for k, v in decoded.items() if v}
+            # Neueste Version die alle angehakten Punkte kennt - sonst bleibt die Zeile JSON (verlustfrei)
+            matching = [v for v, keys in versions.items() if checked <= set(keys)]
+            if matching:
+                version = max(matching)
+                encoded[row_number] = (encode_checklist(decoded, versions[version]), version)
+        
+        runs = contiguous_runs(encoded)
+        verified = unchanged_runs(trades_ws, headers, all_data, runs, ["checklist", "checklist_version"]) if runs else []
+        ranges = []
+        for first, last in verified:
+            block = [encoded[r] for r in range(first, last + 1)]
+            ranges.append({"range": f"{checklist_letter}{first}:{checklist_letter}{last}", "values": [[c] for c, _ in block]})
+            ranges.append({"range": f"{version_letter}{first}:{version_letter}{last}", "values": [[v] for _, v in block]})
+        
+        # Ein Batch-Request für viele Blöcke statt einem Request pro Zeile
+        for start in range(0, len(ranges), chunk_ranges):
+            trades_ws.batch_update(ranges[start:start + chunk_ranges])
+        converted += sum(last - first + 1 for first, last in verified)
+        if len(verified) == len(runs):
+            break
+    
+    return converted
+
+
+# --- TRADES ---
+
+def load_trade_records(spreadsheet):
+    """Lädt die rohen Zeilen des Trades Sheets"""
+    return spreadsheet.worksheet("Trades").get_all_records()
+
+
+def load_trades(spreadsheet, versions=None):
+    """Lädt Trades aus Google Sheets als DataFrame"""
+    records = load_trade_records(spreadsheet)
+    if versions is None or find_unknown_checklist_versions(records, versions):
+        # Neue Version aus einer anderen Session
+        versions = load_checklist_versions(spreadsheet)
+    return parse_trades(records, versions)
+
+
+def prepare_entry(entry_data, checklist_keys=None, checklist_version=None):
+    """Wandelt die Werte eines Trades in Sheet-Strings um (Checklist als Bitset, Bilder als JSON, ...)"""
+    # Checklist als Bitset über die aktuelle Schema-Version kodieren
+    if isinstance(entry_data.get("checklist"), dict) and checklist_keys is not None:
+        entry_data["checklist"] = encode_checklist(entry_data["checklist"], checklist_keys)
+        entry_data["checklist_version"] = checklist_version
+    elif isinstance(entry_data.get("checklist"), dict):
+        entry_data["checklist"] = json.dumps(entry_data["checklist"])
+    
+    # Images zu JSON konvertieren
+    if isinstance(entry_data.get("images"), list):
+        entry_data["images"] = json.dumps(entry_data["images"])
+    elif "images" not in entry_data:
+        entry_data["images"] = "[]"
+    
+    # Time zu String
+    if isinstance(entry_data.get("time"), time):
+        entry_data["time"] = entry_data["time"].strftime("%H:%M")
+    
+    # Date zu String
+    if hasattr(entry_data.get("date"), 'strftime'):
+        entry_data["date"] = entry_data["date"].strftime("%Y-%m-%d")
+    
+    # Reviewed zu String
+    entry_data["reviewed"] = str(entry_data.get("reviewed", False))
+    
+    # Created timestamp
+    if "created_at" not in entry_data:
+        entry_data["created_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    return entry_data
+
+
+def resolve_checklist_encoding(spreadsheet, schema=None, versions=None):
+    """Aktuelle Checklist-Version und ihre Schlüssel (legt bei Bedarf eine neue Version an)"""
+    if schema is None:
+        schema = load_checklist_schema(spreadsheet)
+    if versions is None:
+        versions = load_checklist_versions(spreadsheet)
+    version = register_checklist_version(spreadsheet, schema, versions)
+    return version, versions[version]
+
+
+# --- OPTIMISTIC LOCKING ---
+# Jede Zeile hat eine row_version. Ändern und Löschen prüfen zuerst, ob die Zeile noch die
+# Version hat, die der Aufrufer geladen hat (Compare-and-Swap), und erhöhen sie beim Schreiben.
+# Google Sheets kennt keine bedingten Writes - zwischen Prüfung und Schreiben bleibt ein Fenster
+# von einem API-Aufruf, statt wie bisher der ganzen Zeit zwischen Laden und Speichern.
+
+def parse_row_version(value):
+    """row_version einer Zeile als Zahl (leer bei alten Zeilen = 0)"""
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def locate_row(trades_ws, headers, entry_id, attempts=3):
+    """Sucht die Zeile eines Trades, gibt (zeilennummer, aktuelle Werte als Dict) oder (None, None) zurück"""
+    for _ in range(attempts):
+        # Nur die ID-Spalte laden statt des ganzen Sheets
+        ids = trades_ws.col_values(headers.index("id") + 1)
+        try:
+            row_number = ids.index(entry_id, 1) + 1
+        except ValueError:
+            return None, None
+        
+        values = trades_ws.row_values(row_number)
+        values = values + [""] * (len(headers) - len(values))
+        current = dict(zip(headers, values))
+        if current["id"] == entry_id:
+            return row_number, current
+        # Zeilen haben sich zwischen den beiden Aufrufen verschoben -> neu suchen
+    
+    # Sheet ändert sich gerade laufend - Stand unbekannt
+    raise ConflictError(entry_id, None, {})
+
+
+def check_row_version(trades_ws, headers, entry_id, expected_version):
+    """Compare-and-Swap Prüfung, gibt (zeilennummer, aktuelle Werte) zurück oder wirft ConflictError"""
+    row_number, current = locate_row(trades_ws, headers, entry_id)
+    if row_number is None:
+        raise ConflictError(entry_id, expected_version, None)
+    if expected_version is not None and parse_row_version(current.get("row_version")) != int(expected_version):
+        raise ConflictError(entry_id, expected_version, current)
+    return row_number, current
+
+
+def save_entry(spreadsheet, entry_data, mode="new", schema=None, versions=None, headers=None, expected_version=None):
+    """Speichert einen Trade in Google Sheets.
+    
+    Im Modus "edit" wird nur geschrieben, wenn die Zeile noch ``expected_version`` hat,
+    sonst kommt ein ConflictError. Ohne ``expected_version`` wird ungeprüft überschrieben.
+    """
+    trades_ws = spreadsheet.worksheet("Trades")
+    if headers is None:
+        headers = ensure_trades_headers(spreadsheet)
+    
+    version, keys = resolve_checklist_encoding(spreadsheet, schema, versions)
+    
+    if mode == "edit":
+        row_number, current = check_row_version(trades_ws, headers, entry_data["id"], expected_version)
+        
+        # Felder die nicht mitgegeben wurden (z.B. images) aus der aktuellen Zeile übernehmen
+        for h in headers:
+            entry_data.setdefault(h, current.get(h, ""))
+        prepare_entry(entry_data, keys, version)
+        entry_data["row_version"] = parse_row_version(current.get("row_version")) + 1
+        
+        new_row = [str(entry_data.get(h, "")) for h in headers]
+        trades_ws.update(f'A{row_number}:{gspread.utils.rowcol_to_a1(row_number, len(headers))}', [new_row])
+        return
+    
+    # Neue Zeile hinzufügen
+    prepare_entry(entry_data, keys, version)
+    entry_data.setdefault("row_version", 1)
+    new_row = [str(entry_data.get(h, "")) for h in headers]
+    trades_ws.append_row(new_row)
+
+
+def append_entries(spreadsheet, entries, schema=None, versions=None, headers=None, chunk_rows=500):
+    """Hängt viele Trades mit wenigen append_rows-Aufrufen an (z.B. für Importe)"""
+    trades_ws = spreadsheet.worksheet("Trades")
+    if headers is None:
+        headers = ensure_trades_headers(spreadsheet)
+    
+    version, keys = resolve_checklist_encoding(spreadsheet, schema, versions)
+    rows = []
+    for entry in entries:
+        prepare_entry(entry, keys, version)
+        entry.setdefault("row_version", 1)
+        rows.append([str(entry.get(h, "")) for h in headers])
+    
+    for start in range(0, len(rows), chunk_rows):
+        trades_ws.append_rows(rows[start:start + chunk_rows])
+    return len(rows)
+
+
+def delete_entry(spreadsheet, entry_id, expected_version=None, headers=None):
+    """Löscht einen Trade aus Google Sheets (nur wenn er noch ``expected_version`` hat)"""
+    trades_ws = spreadsheet.worksheet("Trades")
+    if headers is None:
+        headers = ensure_trades_headers(spreadsheet)
+    
+    try:
+        row_number, _ = check_row_version(trades_ws, headers, entry_id, expected_version)
+    except ConflictError as e:
+        if e.current is None:
+            # Schon gelöscht - Ziel erreicht
+            return
+        raise
+    trades_ws.delete_rows(row_number)
+
+
+def update_review_status(spreadsheet, trade_id, status, expected_version=None, headers=None):
+    """Aktualisiert den Review-Status eines Trades (nur wenn er noch ``expected_version`` hat)"""
+    trades_ws = spreadsheet.worksheet("Trades")
+    if headers is None:
+        headers = ensure_trades_headers(spreadsheet)
+    
+    row_number, current = check_row_version(trades_ws, headers, trade_id, expected_version)
+    reviewed_cell = gspread.utils.rowcol_to_a1(row_number, headers.index("reviewed") + 1)
+    version_cell = gspread.utils.rowcol_to_a1(row_number, headers.index("row_version") + 1)
+    
+    # Status und Version in einem Request
+    trades_ws.batch_update([
+        {"range": reviewed_cell, "values": [[str(status)]]},
+        {"range": version_cell, "values": [[parse_row_version(current.get("row_version")) + 1]]}
+    ])
+
+
+def bulk_update_entries(spreadsheet, changes=None, deletions=None, headers=None):
+    """Ändert und löscht viele Trades mit einem Download, einem Batch-Update und gebündelten Löschungen.
+    
+    ``changes`` ist {id: (erwartete_version, {feld: wert})}, ``deletions`` ist {id: erwartete_version}.
+    Jede Zeile wird einzeln per Compare-and-Swap geprüft: Trades mit Konflikt werden übersprungen,
+    alle anderen geschrieben. Direkt vor dem Batch-Update und vor jedem Löschblock werden ID- und
+    Versionsspalte neu gelesen. Zeilen, die sich seit dem Download verschoben oder geändert haben,
+    werden wie bei ``delete_entry`` einzeln gesucht und geprüft. Gibt (geändert, gelöscht,
+    [ConflictError, ...]) zurück.
+    """
+    trades_ws = spreadsheet.worksheet("Trades")
+    if headers is None:
+        headers = ensure_trades_headers(spreadsheet)
+    changes, deletions = changes or {}, deletions or {}
+    
+    # Ein Download für alle Prüfungen statt col_values + row_values pro Trade
+    all_data = trades_ws.get_all_values()
+    rows = {}
+    for row_number, values in enumerate(all_data[1:], start=2):
+        values = values + [""] * (len(headers) - len(values))
+        rows.setdefault(values[headers.index("id")], (row_number, dict(zip(headers, values))))
+    
+    def check(entry_id, expected_version):
+        row_number, current = rows.get(entry_id, (None, None))
+        if row_number is None:
+            raise ConflictError(entry_id, expected_version, None)
+        if expected_version is not None and parse_row_version(current.get("row_version")) != int(expected_version):
+            raise ConflictError(entry_id, expected_version, current)
+        return row_number, current
+    
+    conflicts, updates, delete_rows = [], [], {}
+    for entry_id, expected_version in deletions.items():
+        try:
+            row_number, _ = check(entry_id, expected_version)
+        except ConflictError as e:
+            # Schon gelöscht - Ziel erreicht
+            if e.current is not None:
+                conflicts.append(e)
+            continue
+        delete_rows[row_number] = entry_id
+    
+    update_rows = {}
+    for entry_id, (expected_version, fields) in changes.items():
+        if entry_id in deletions:
+            continue
+        try:
+            update_rows[check(entry_id, expected_version)[0]] = entry_id
+        except ConflictError as e:
+            conflicts.append(e)
+    
+    # Zeilen, die seit dem Download verschoben oder geändert wurden, einzeln neu suchen und prüfen
+    runs = [(r, r) for r in update_rows]
+    verified = {r for r, _ in unchanged_runs(trades_ws, headers, all_data, runs, ["row_version"])} if runs else set()
+    updated = 0
+    for row_number, entry_id in update_rows.items():
+        expected_version, fields = changes[entry_id]
+        try:
+            if row_number in verified:
+                current = rows[entry_id][1]
+            else:
+                row_number, current = check_row_version(trades_ws, headers, entry_id, expected_version)
+        except ConflictError as e:
+            conflicts.append(e)
+            continue
+        for field, value in fields.items():
+            updates.append({"range": gspread.utils.rowcol_to_a1(row_number, headers.index(field) + 1), "values": [[str(value)]]})
+        updates.append({
+            "range": gspread.utils.rowcol_to_a1(row_number, headers.index("row_version") + 1),
+            "values": [[parse_row_version(current.get("row_version")) + 1]]
+        })
+        updated += 1
+    
+    # Alle Zellen in einem Request, vor den Löschungen (solange die Zeilennummern noch stimmen)
+    if updates:
+        trades_ws.batch_update(updates)
+    
+    # Zusammenhängende Zeilen gemeinsam löschen, von unten nach oben. Jeder Block wird direkt
+    # vorher geprüft; hat er sich verschoben, wird jeder Trade darin einzeln gesucht und gelöscht
+    deleted = 0
+    for start, end in reversed(contiguous_runs(delete_rows)):
+        if unchanged_runs(trades_ws, headers, all_data, [(start, end)], ["row_version"]):
+            trades_ws.delete_rows(start, end)
+            deleted += end - start + 1
+            continue
+        for row_number in range(end, start - 1, -1):
+            entry_id = delete_rows[row_number]
+            try:
+                located, _ = check_row_version(trades_ws, headers, entry_id, deletions[entry_id])
+            except ConflictError as e:
+                if e.current is not None:
+                    conflicts.append(e)
+                continue
+            trades_ws.delete_rows(located)
+            deleted += 1
+    
+    return updated, deleted, conflicts
@@ -0,0 +1,116 @@
+"""Snapshot des Trades-DataFrames als Arrow-IPC-Datei für einen schnellen Start nach Neustarts
+
+pyarrow ist optional: ohne pyarrow wird kein Snapshot geschrieben und wie bisher
+beim Start aus Google Sheets geladen.
+"""
+import os
+import json
+import importlib
+import threading
+
+from .parsing import get_data_version
+
+SNAPSHOT_FILE = ".trades_snapshot.arrow"
+# Bei Änderungen am Aufbau des DataFrames erhöhen, alte Snapshots werden dann ignoriert
+SNAPSHOT_FORMAT = "1"
+
+_write_lock = threading.Lock()
+
+
+def snapshot_available():
+    """Snapshots brauchen das optionale Paket pyarrow"""
+    try:
+        importlib.import_module("pyarrow")
+        return True
+    except ImportError:
+        return False
+
+
+def save_snapshot(df, path=SNAPSHOT_FILE):
+    """Schreibt den DataFrame als unkomprimierte Arrow-IPC-Datei (memory-mapbar), gibt True bei Erfolg zurück"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return False
+    
+    # Nicht-tabellarische Spalten in Arrow-Typen überführen
+    frame = df.copy(deep=False)
+    if "checklist" in frame.columns:
+        frame["checklist"] = [json.dumps(c) if isinstance(c, dict) else str(c) for c in frame["checklist"]]
+    # Gemischte Spalten (gspread macht aus "5" eine Zahl, leere Zellen bleiben "") als Text speichern
+    for column in frame.columns:
+        if frame[column].dtype == object and column not in ("checklist", "tag_list", "date"):
+            frame[column] = frame[column].astype(str)
+    
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b"snapshot_format": SNAPSHOT_FORMAT.encode(),
+            b"data_version": get_data_version(df).encode(),
+        })
+        
+        # Atomar ersetzen, damit ein paralleler Start nie eine halbe Datei liest
+        with _write_lock:
+            with pa.OSFile(tmp_path, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+    except (pa.ArrowException, OSError):
+        # Snapshot ist nur ein Beschleuniger - ohne ihn wird beim nächsten Start normal geladen
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    return True
+
+
+def update_snapshot(df, path=SNAPSHOT_FILE, background=True):
+    """Schreibt den Snapshot nur, wenn sich die Datenversion geändert hat (optional in einem Hintergrund-Thread)"""
+    if df.empty or not snapshot_available() or read_snapshot_version(path) == get_data_version(df):
+        return False
+    if background:
+        # Der DataFrame wird nur gelesen, der Aufrufer muss nicht auf das Schreiben warten
+        threading.Thread(target=save_snapshot, args=(df, path), name="trades-snapshot", daemon=True).start()
+        return True
+    return save_snapshot(df, path)
+
+
+def read_snapshot_version(path=SNAPSHOT_FILE):
+    """Datenversion des Snapshots auf der Festplatte (ohne die Daten zu lesen) oder None"""
+    try:
+        import pyarrow as pa
+        with pa.memory_map(path, "r") as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except (ImportError, OSError, ValueError):
+        return None
+    if metadata.get(b"snapshot_format") != SNAPSHOT_FORMAT.encode():
+        return None
+    return metadata.get(b"data_version", b"").decode() or None
+
+
+def load_snapshot(path=SNAPSHOT_FILE):
+    """Liest den Snapshot per Memory-Map, gibt den DataFrame oder None (kein/veralteter/defekter Snapshot) zurück"""
+    try:
+        import pyarrow as pa
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+    except (ImportError, OSError, ValueError):
+        return None
+    
+    metadata = table.schema.metadata or {}
+    if metadata.get(b"snapshot_format") != SNAPSHOT_FORMAT.encode():
+        return None
+    
+    df = table.to_pandas()
+    if "checklist" in df.columns:
+        # Gleiche Checklisten kommen oft vor: jeden JSON-String nur einmal parsen, pro Zeile ein eigenes Dict
+        parsed = {}
+        df["checklist"] = [
+            dict(parsed[c] if c in parsed else parsed.setdefault(c, json.loads(c) if c.startswith("{") else {}))
+            for c in df["checklist"]
+        ]
+    if "tag_list" in df.columns:
+        df["tag_list"] = [list(tags) for tags in df["tag_list"]]
+    df.attrs["data_version"] = metadata.get(b"data_version", b"").decode()
+    return df